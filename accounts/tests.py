@@ -1,3 +1,33 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from exams.tests import QueryPlanMixin
+from .models import User
+
+
+class AccountViewsTests(QueryPlanMixin, TestCase):
+    def test_signup(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('signup'))
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('signup'), {
+                'username': 'new-student', 'email': 'student@example.com',
+                'password1': 'a-long-passphrase-42', 'password2': 'a-long-passphrase-42', 'is_student': 'on',
+            })
+        self.assertRedirects(response, reverse('login'))
+        self.assertTrue(User.objects.get(username='new-student').is_student)
+
+    def test_login_and_logout(self):
+        User.objects.create_user('student', password='a-long-passphrase-42', is_student=True)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('login'))
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('login'), {'username': 'student', 'password': 'a-long-passphrase-42'})
+        self.assertEqual(response.status_code, 302)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('logout'))
+
+    def test_questions(self):
+        user = User.objects.create_user('student', password='pass', is_student=True)
+        self.client.force_login(user)
+        self.get_with_plan_check(reverse('questions', args=[1]), 2)
@@ -3,6 +3,15 @@ ASGI config for algoproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through this module enables the ASGI profile (``ASGI_PROFILE=1``):
+exam taking, autosave and reports run as async views, so a slow database
+write does not hold a worker thread. Set ``EXAM_EVENTS=1`` to also serve
+the server-sent events stream of ``exams.events``. Each open event stream
+is an idle coroutine, so one process can hold thousands of examinees,
+e.g.::
+
+    EXAM_EVENTS=1 uvicorn algoproject.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +21,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'algoproject.settings')
+os.environ.setdefault('ASGI_PROFILE', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,19 @@
+"""
+URL configuration of the ASGI profile (``ASGI_PROFILE=1``): the same routes
+as ``algoproject.urls``, with the exam-taking and report views served by
+their async versions.
+"""
+from django.urls import include, path
+
+from . import urls
+
+ASYNC_APPS = {
+    'exams/': 'exams.async_urls',
+    'responses/': 'responses.async_urls',
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), include(ASYNC_APPS[str(pattern.pattern)])) if str(pattern.pattern) in ASYNC_APPS
+    else pattern
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,247 @@
+"""
+Per-request performance metrics.
+
+``algoproject.middleware.InstrumentationMiddleware`` records, per view
+name, the wall time, number and total time of database queries, template
+render time and response size of every request into in-process histograms.
+They are exposed in the Prometheus text format by ``metrics_view`` (to
+staff users and ``METRICS_TOKEN`` bearers) and, when
+``INSTRUMENTATION_DUMP_PATH`` is set, appended to that file as one JSON
+line per process every ``INSTRUMENTATION_DUMP_INTERVAL`` seconds. Queries
+slower than ``SLOW_QUERY_THRESHOLD`` seconds are logged with their SQL and
+view to the ``algoproject.slow_queries`` logger.
+
+Queries are timed by an ``execute_wrapper`` installed on every database
+connection; the request they belong to is tracked in a context variable,
+which also follows async views into the ORM's worker thread.
+"""
+import contextvars
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import Template
+
+slow_query_logger = logging.getLogger('algoproject.slow_queries')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Metric name -> (help text, buckets).
+METRICS = {
+    'request_duration_seconds': ('Wall time of the request.', DURATION_BUCKETS),
+    'db_queries': ('Database queries per request.', COUNT_BUCKETS),
+    'db_query_duration_seconds': ('Total database time per request.', DURATION_BUCKETS),
+    'template_render_seconds': ('Total template render time per request.', DURATION_BUCKETS),
+    'response_size_bytes': ('Size of non-streaming response bodies.', SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for upper, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield upper, total
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # (metric, view) -> Histogram
+        self.histograms = {}
+        # (view, status) -> count
+        self.requests = {}
+
+    def observe(self, view, status, values):
+        with self.lock:
+            self.requests[view, status] = self.requests.get((view, status), 0) + 1
+            for metric, value in values.items():
+                if value is None:
+                    continue
+                histogram = self.histograms.get((metric, view))
+                if histogram is None:
+                    histogram = self.histograms[metric, view] = Histogram(METRICS[metric][1])
+                histogram.observe(value)
+
+    def prometheus(self):
+        lines = ['# HELP requests_total Requests by view and status.', '# TYPE requests_total counter']
+        with self.lock:
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(f'requests_total{{view="{view}",status="{status}"}} {count}')
+            for metric, (help_text, _) in METRICS.items():
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+                for (name, view), histogram in sorted(self.histograms.items()):
+                    if name != metric:
+                        continue
+                    for upper, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{view="{view}",le="{upper}"}} {count}')
+                    lines.append(f'{metric}_sum{{view="{view}"}} {histogram.sum:.6f}')
+                    lines.append(f'{metric}_count{{view="{view}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': [
+                    {'view': view, 'status': status, 'count': count}
+                    for (view, status), count in sorted(self.requests.items())
+                ],
+                'histograms': [
+                    {
+                        'metric': metric, 'view': view, 'count': histogram.count, 'sum': histogram.sum,
+                        'buckets': list(histogram.buckets), 'counts': list(histogram.counts),
+                    }
+                    for (metric, view), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """Counters of the request being served."""
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+
+    @property
+    def view_name(self):
+        match = self.request.resolver_match
+        return match.view_name if match else 'unresolved'
+
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.query_time += elapsed
+        if elapsed >= settings.SLOW_QUERY_THRESHOLD:
+            slow_query_logger.warning('%.3fs in %s: %s', elapsed, metrics.view_name, sql)
+
+
+def _add_query_wrapper(connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+_original_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    metrics = current.get()
+    if metrics is None:
+        return _original_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        metrics.render_time += time.perf_counter() - started
+
+
+_installed = False
+
+
+def install():
+    """Hook query and template timing into Django (idempotent)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_add_query_wrapper)
+    for connection in connections.all(initialized_only=True):
+        _add_query_wrapper(connection)
+    Template.render = _timed_render
+
+
+def start(request):
+    metrics = RequestMetrics(request)
+    return metrics, current.set(metrics)
+
+
+def finish(metrics, token, response):
+    current.reset(token)
+    registry.observe(metrics.view_name, response.status_code, {
+        'request_duration_seconds': time.perf_counter() - metrics.started,
+        'db_queries': metrics.queries,
+        'db_query_duration_seconds': metrics.query_time,
+        'template_render_seconds': metrics.render_time,
+        'response_size_bytes': None if response.streaming else len(response.content),
+    })
+    maybe_dump()
+
+
+_last_dump = time.monotonic()
+_dump_lock = threading.Lock()
+
+
+def maybe_dump():
+    """Append a snapshot to ``INSTRUMENTATION_DUMP_PATH`` once per dump interval."""
+    global _last_dump
+    path = settings.INSTRUMENTATION_DUMP_PATH
+    if not path or time.monotonic() - _last_dump < settings.INSTRUMENTATION_DUMP_INTERVAL:
+        return
+    if not _dump_lock.acquire(blocking=False):
+        return
+    try:
+        _last_dump = time.monotonic()
+        line = json.dumps({'time': time.time(), 'pid': os.getpid(), **registry.snapshot()})
+        with open(path, 'a', encoding='utf-8') as dump:
+            dump.write(line + '\n')
+    finally:
+        _dump_lock.release()
+
+
+def _has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition; open to staff users and to scrapers sending
+    ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    if not request.user.is_staff and not _has_metrics_token(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+from . import instrumentation
+
+
+@sync_and_async_middleware
+def InstrumentationMiddleware(get_response):
+    """Record per-view request metrics, see ``algoproject.instrumentation``."""
+    if not settings.INSTRUMENTATION:
+        raise MiddlewareNotUsed
+    instrumentation.install()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics, token = instrumentation.start(request)
+            response = await get_response(request)
+            instrumentation.finish(metrics, token, response)
+            return response
+    else:
+        def middleware(request):
+            metrics, token = instrumentation.start(request)
+            response = get_response(request)
+            instrumentation.finish(metrics, token, response)
+            return response
+    return middleware
@@ -42,10 +42,14 @@ INSTALLED_APPS = [
     'responses',
     'analysis',
     'api',
+    'search',
+    'jobs',
+    'texts',
     'widget_tweaks',
 ]
 
 MIDDLEWARE = [
+    'algoproject.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +61,18 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'algoproject.urls'
 
+# ASGI profile, enabled by `algoproject.asgi`: the exam-taking, autosave and
+# report views are served by their async versions (see algoproject.asgi_urls).
+ASGI_PROFILE = os.environ.get('ASGI_PROFILE', '') == '1'
+if ASGI_PROFILE:
+    ROOT_URLCONF = 'algoproject.asgi_urls'
+
+# Server-sent exam events (ASGI profile only): exam start/end and
+# analysis-complete notifications, see exams.events.
+EXAM_EVENTS = os.environ.get('EXAM_EVENTS', '') == '1'
+EXAM_EVENTS_POLL_INTERVAL = 5
+EXAM_EVENTS_HEARTBEAT = 20
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -78,13 +94,125 @@ WSGI_APPLICATION = 'algoproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Database profile, chosen by DATABASE_PROFILE:
+#   sqlite      plain SQLite file (default)
+#   sqlite-wal  SQLite in WAL mode with tuned pragmas (algoproject.sqlite_wal),
+#               for concurrent readers and a queued writer
+#   postgres    PostgreSQL (POSTGRES_* variables) with persistent, health
+#               checked connections, or a psycopg pool with POSTGRES_POOL=1
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3')
+POSTGRES_POOL = os.environ.get('POSTGRES_POOL', '') == '1'
+
+DATABASE_PROFILES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': SQLITE_PATH,
+    },
+    'sqlite-wal': {
+        'ENGINE': 'algoproject.sqlite_wal',
+        'NAME': SQLITE_PATH,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 10000)),
+        },
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'algoproject'),
+        'USER': os.environ.get('POSTGRES_USER', 'algoproject'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Django's pool and persistent connections are mutually exclusive.
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL else int(os.environ.get('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 20)),
+                'timeout': 10,
+            },
+        } if POSTGRES_POOL else {},
+    },
 }
+DATABASES = {'default': DATABASE_PROFILES[DATABASE_PROFILE]}
+
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# EXAM_CACHE selects the backend used for exam payloads: "locmem" (per
+# process, default), "file" or "db" (shared between processes; run
+# `manage.py createcachetable` first).
+
+EXAM_CACHE = os.environ.get('EXAM_CACHE', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'algoproject',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('EXAM_CACHE_LOCATION', BASE_DIR / '.cache'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[EXAM_CACHE]}
+
+
+# Write-behind submissions: when enabled, submitted exam forms are appended
+# to a local WAL-mode SQLite queue and written to DATABASES by
+# `manage.py drain_submission_queue`.
+SUBMISSION_WRITE_BEHIND = os.environ.get('SUBMISSION_WRITE_BEHIND', '') == '1'
+SUBMISSION_QUEUE_PATH = BASE_DIR / 'submission_queue.sqlite3'
+
+# Answers of both exam views are stored in exams.Answer. Until the legacy
+# responses.StudentResponse rows are merged (`manage.py merge_responses`)
+# and dropped, reads of a student's saved answers also consult them.
+SUBMISSIONS_LEGACY_READS = os.environ.get('SUBMISSIONS_LEGACY_READS', '1') == '1'
+
+# Autosave: an answer is written at most once per AUTOSAVE_MIN_INTERVAL
+# seconds, and a student at most AUTOSAVE_MAX_WRITES_PER_MINUTE times a
+# minute; saves in between are coalesced in the cache.
+AUTOSAVE_MIN_INTERVAL = int(os.environ.get('AUTOSAVE_MIN_INTERVAL', 30))
+AUTOSAVE_MAX_WRITES_PER_MINUTE = int(os.environ.get('AUTOSAVE_MAX_WRITES_PER_MINUTE', 6))
+
+
+# Request instrumentation (algoproject.instrumentation): per-view histograms
+# served at /metrics/ to staff users and to scrapers that send
+# "Authorization: Bearer $METRICS_TOKEN", optionally dumped as JSONL.
+INSTRUMENTATION = os.environ.get('INSTRUMENTATION', '1') == '1'
+INSTRUMENTATION_DUMP_PATH = os.environ.get('INSTRUMENTATION_DUMP_PATH')
+INSTRUMENTATION_DUMP_INTERVAL = 60
+SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Background jobs (jobs app, `manage.py run_jobs`): workers poll every
+# JOBS_POLL_INTERVAL seconds; a failed job is retried after
+# JOBS_RETRY_DELAY seconds (doubling), a running job whose progress was not
+# reported for JOBS_STALE_AFTER seconds goes back to the queue. Export
+# files are written to JOBS_OUTPUT_DIR.
+JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 2))
+JOBS_RETRY_DELAY = int(os.environ.get('JOBS_RETRY_DELAY', 30))
+JOBS_STALE_AFTER = int(os.environ.get('JOBS_STALE_AFTER', 600))
+JOBS_PROGRESS_INTERVAL = 1
+JOBS_OUTPUT_DIR = Path(os.environ.get('JOBS_OUTPUT_DIR', BASE_DIR / 'job_output'))
+
+# Distinct texts whose normalization texts.cache keeps in memory per
+# process (shared by grading and the search index).
+TEXTS_CACHE_SIZE = int(os.environ.get('TEXTS_CACHE_SIZE', 20000))
+
+# Cross-exam fingerprint index (analysis.fingerprints, `manage.py
+# fingerprint_index`): lookups report answers of other exams at least
+# FINGERPRINT_THRESHOLD similar (changing it requires a rebuild); updates
+# compact the index once it has more than FINGERPRINT_MAX_SEGMENTS segments.
+FINGERPRINT_INDEX_DIR = Path(os.environ.get('FINGERPRINT_INDEX_DIR', BASE_DIR / 'fingerprints'))
+FINGERPRINT_THRESHOLD = float(os.environ.get('FINGERPRINT_THRESHOLD', 0.6))
+FINGERPRINT_MAX_SEGMENTS = int(os.environ.get('FINGERPRINT_MAX_SEGMENTS', 8))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,42 @@
+"""
+SQLite backend that applies concurrency pragmas to every new connection.
+
+Use ``'ENGINE': 'algoproject.sqlite_wal'``; these ``OPTIONS`` are turned
+into pragmas instead of being passed to ``sqlite3.connect``:
+
+* ``journal_mode`` (default ``WAL``): readers no longer block the writer
+  and the writer no longer blocks readers;
+* ``synchronous`` (default ``NORMAL``): in WAL mode, fsync only at
+  checkpoints; a power loss may drop the last commits but never corrupts
+  the database;
+* ``busy_timeout`` (milliseconds, default 5000): how long a writer waits
+  for the lock before failing with "database is locked";
+* ``mmap_size`` (bytes, default 256 MiB): read pages through a memory map;
+* ``cache_size`` (pages, or KiB when negative, default -65536).
+
+Combine with ``'transaction_mode': 'IMMEDIATE'`` so transactions take the
+write lock when they begin; a deferred transaction that upgrades to a
+write lock later fails at once instead of waiting for ``busy_timeout``.
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMA_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -65536,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {name: kwargs.pop(name, default) for name, default in PRAGMA_DEFAULTS.items()}
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
@@ -0,0 +1,101 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from exams.tests import create_exam
+from .instrumentation import registry
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True, is_staff=True)
+        cls.exam = create_exam(cls.instructor)
+
+    def setUp(self):
+        registry.reset()
+        self.client.force_login(self.instructor)
+
+    def test_metrics_per_view(self):
+        self.client.get(reverse('exams:my_exams'))
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('requests_total{view="exams:my_exams",status="200"} 1', metrics)
+        # Session, user and the exam list.
+        self.assertIn('db_queries_sum{view="exams:my_exams"} 3.000000', metrics)
+        self.assertIn('template_render_seconds_count{view="exams:my_exams"} 1', metrics)
+        self.assertIn('response_size_bytes_bucket{view="exams:my_exams",le="+Inf"} 1', metrics)
+
+    def test_metrics_are_private(self):
+        student = User.objects.create_user('student', password='pass', is_student=True)
+        self.client.force_login(student)
+        # Requests from the reverse proxy are not trusted by address.
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+        self.client.logout()
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_slow_query_log(self):
+        with self.assertLogs('algoproject.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('exams:my_exams'))
+        self.assertTrue(any('exams:my_exams' in line and 'exams_exam' in line for line in logs.output))
+
+    def test_jsonl_dump(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'metrics.jsonl'
+            with override_settings(INSTRUMENTATION_DUMP_PATH=path, INSTRUMENTATION_DUMP_INTERVAL=0):
+                self.client.get(reverse('exams:my_exams'))
+            snapshot = json.loads(path.read_text().splitlines()[-1])
+        self.assertIn({'view': 'exams:my_exams', 'status': 200, 'count': 1}, snapshot['requests'])
+
+
+class SqliteWalBackendTests(SimpleTestCase):
+    def connect(self, path, **options):
+        database = {'ENGINE': 'algoproject.sqlite_wal', 'NAME': path, 'OPTIONS': options}
+        # A handler of its own: the test databases are off limits here.
+        wrapper = ConnectionHandler({'default': database, 'wal': database})['wal']
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.connect(Path(directory) / 'db.sqlite3', busy_timeout=1234, transaction_mode='IMMEDIATE')
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+            self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 1234)
+            self.assertEqual(self.pragma(wrapper, 'cache_size'), -65536)
+            # The pragma options are not passed on to sqlite3.connect.
+            self.assertNotIn('busy_timeout', wrapper.get_connection_params())
+
+    def test_readers_and_writer_do_not_block_each_other(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'db.sqlite3'
+            writer, reader = self.connect(path, busy_timeout=0), self.connect(path, busy_timeout=0)
+            with writer.cursor() as write, reader.cursor() as read:
+                write.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+                write.execute('INSERT INTO item VALUES (1)')
+                read.execute('BEGIN')
+                read.execute('SELECT COUNT(*) FROM item')
+                self.assertEqual(read.fetchone()[0], 1)
+                # With a rollback journal this commit would fail on the reader's lock.
+                write.execute('INSERT INTO item VALUES (2)')
+                read.execute('SELECT COUNT(*) FROM item')
+                self.assertEqual(read.fetchone()[0], 1)
+                read.execute('COMMIT')
+                read.execute('SELECT COUNT(*) FROM item')
+                self.assertEqual(read.fetchone()[0], 2)
@@ -3,12 +3,17 @@ from django.urls import path, include
 from django.shortcuts import redirect
 from django.urls import path, include
 
+from .instrumentation import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     path('accounts/', include('accounts.urls')),
     path('', lambda request: redirect('signup')), 
     path('responses/', include('responses.urls')),
     path('exams/', include('exams.urls')),
+    path('api/', include('api.urls')),
+    path('jobs/', include('jobs.urls')),
  # ریدایرکت صفحه‌ی اصلی به signup
 ]
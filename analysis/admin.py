@@ -1,10 +1,54 @@
 from django.contrib import admin
-from .models import AnalysisResult
+from django.urls import reverse
+from django.utils.html import format_html
+
+from exams.paginators import EstimatedCountPaginator
+from .models import AnalysisResult, SimilarPair, StudentRisk
+
 
 class AnalysisResultAdmin(admin.ModelAdmin):
-    list_display = ('id', 'exam', 'timestamp', 'algorithm_version')
+    list_display = ('id', 'exam', 'timestamp', 'algorithm_version', 'pair_count', 'links')
     list_filter = ('timestamp', 'algorithm_version')
     search_fields = ('exam__title', 'algorithm_version')
     ordering = ('-timestamp',)
+
+    @admin.display(description='جفت‌ها')
+    def pair_count(self, obj):
+        return obj.result_json.get('summary', {}).get('pairs')
+
+    @admin.display(description='جزئیات')
+    def links(self, obj):
+        return format_html(
+            '<a href="{}?result={}">جفت‌های مشابه</a> | <a href="{}?result={}">دانشجویان</a>',
+            reverse('admin:analysis_similarpair_changelist'), obj.id,
+            reverse('admin:analysis_studentrisk_changelist'), obj.id,
+        )
 admin.site.register(AnalysisResult, AnalysisResultAdmin)
-#check git
\ No newline at end of file
+
+
+class SimilarPairAdmin(admin.ModelAdmin):
+    # Opened from a result (?result=<id>): the most similar pairs first, by
+    # the (result, -similarity, id) index.
+    list_display = ('result', 'question', 'user_a', 'user_b', 'similarity', 'suspicious', 'answer_a', 'answer_b')
+    list_select_related = ('result__exam', 'question__exam', 'user_a', 'user_b')
+    list_filter = ('suspicious',)
+    raw_id_fields = ('result', 'question', 'user_a', 'user_b')
+    ordering = ('-similarity', 'id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+admin.site.register(SimilarPair, SimilarPairAdmin)
+
+
+class StudentRiskAdmin(admin.ModelAdmin):
+    list_display = (
+        'result', 'user', 'risk', 'max_similarity', 'pairs', 'suspicious_pairs', 'completion_seconds',
+        'fast_answers', 'simultaneous_identical',
+    )
+    list_select_related = ('result__exam', 'user')
+    list_filter = ('risk',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('result', 'user')
+    ordering = ('-max_similarity', 'id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+admin.site.register(StudentRisk, StudentRiskAdmin)
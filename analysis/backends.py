@@ -0,0 +1,39 @@
+"""
+Similarity backend registry.
+
+This module and the backends deliberately import no Django models, so
+that analysis worker processes can load them without configuring Django.
+The one setting they depend on, the size of the ``texts.cache``
+normalization cache, is set by the pool initializer
+(``analysis.parallel``).
+"""
+
+BACKENDS = ('minhash', 'tfidf')
+
+
+def get_backend(name):
+    """
+    Return the backend module for ``name``. A backend exposes
+    ``ALGORITHM_VERSION``, ``compare_answers(answers, minimum_similarity_threshold, **options)``
+    and ``parameters(minimum_similarity_threshold, **options)``.
+    """
+    if name == 'minhash':
+        from . import minhash
+        return minhash
+    if name == 'tfidf':
+        # Imported lazily: numpy and scipy are only needed for this backend.
+        from . import tfidf
+        return tfidf
+    raise ValueError(f"Unknown analysis backend {name!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def compare_question(backend, question_id, answers, minimum_similarity_threshold, options):
+    """
+    Compare one question's ``answers`` (``(answer_id, user_id, text)`` tuples)
+    and return ``(question_id, answer_count, owners, candidate_count, pairs)``,
+    where ``owners`` only covers the answers that appear in ``pairs``.
+    """
+    candidate_count, pairs = get_backend(backend).compare_answers(answers, minimum_similarity_threshold, **options)
+    paired = {answer_id for a, b, _ in pairs for answer_id in (a, b)}
+    owners = {answer_id: user_id for answer_id, user_id, _ in answers if answer_id in paired}
+    return question_id, len(answers), owners, candidate_count, pairs
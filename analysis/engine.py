@@ -0,0 +1,232 @@
+"""
+Exam-wide answer similarity analysis.
+
+Answers are compared only within the same question, by one of the
+backends in ``BACKENDS``:
+
+``minhash``
+    The MinHash/LSH index proposes candidate pairs, which are then scored
+    exactly (Jaccard similarity of character shingles), so the cost grows
+    with the number of answers plus the number of near-duplicates rather
+    than with the square of the class size.
+``tfidf``
+    Character n-gram TF-IDF vectors compared by cosine similarity with
+    blocked sparse matrix products. Requires numpy and scipy.
+
+A result is stored as rows: one ``SimilarPair`` per similar pair and one
+``StudentRisk`` per student in a pair, indexed so that reports page
+through the most similar pairs and students of a result without reading
+the rest. ``AnalysisResult.result_json`` only keeps the parameters and
+the totals (overall and per question).
+
+Before the text comparison, the timing stage (``analysis.timing``)
+derives signals from the submission times alone; a student's risk level
+is the higher of the text similarity and the timing risks.
+"""
+import logging
+import time
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from exams.models import Answer
+from .backends import BACKENDS, compare_question, get_backend
+from .models import AnalysisResult, SimilarPair, StudentRisk
+from .parallel import compare_questions
+
+logger = logging.getLogger(__name__)
+
+SAVE_BATCH_SIZE = 2000
+RISK_ORDER = [level for level, _ in AnalysisResult.RISK_LEVELS]
+
+
+def default_thresholds():
+    return (
+        AnalysisResult._meta.get_field('minimum_similarity_threshold').default,
+        AnalysisResult._meta.get_field('suspicious_threshold').default,
+    )
+
+
+def load_question_answers(exam, chunk_size=2000):
+    """Yield ``(question_id, [(answer_id, user_id, answer_text), ...])`` for ``exam``."""
+    rows = (
+        Answer.objects.filter(question__exam=exam)
+        .order_by('question_id', 'id')
+        .values_list('question_id', 'id', 'user_id', 'answer_text')
+        .iterator(chunk_size=chunk_size)
+    )
+    for question_id, group in groupby(rows, key=itemgetter(0)):
+        yield question_id, [row[1:] for row in group]
+
+
+def with_progress(question_answers, progress, total):
+    """
+    Pass ``question_answers`` through, calling ``progress(done, total)`` as
+    questions are taken. Questions without answers are never yielded, so
+    the last call reports ``total`` whatever the count.
+    """
+    for done, item in enumerate(question_answers):
+        progress(done, total)
+        yield item
+    progress(total, total)
+
+
+def risk_level(similarity, minimum_similarity_threshold, suspicious_threshold):
+    if similarity >= suspicious_threshold:
+        return 'HIGH'
+    if similarity >= (minimum_similarity_threshold + suspicious_threshold) / 2:
+        return 'MEDIUM'
+    return 'LOW'
+
+
+def combined_risk(*levels):
+    """The highest of the risk ``levels``, ignoring ``None``."""
+    return max((level for level in levels if level), key=RISK_ORDER.index, default='LOW')
+
+
+def timing_stage(exam):
+    """The ``analysis.timing`` signals of ``exam``, or ``None`` without numpy."""
+    try:
+        from .timing import exam_signals
+    except ImproperlyConfigured:
+        logger.warning('Skipping the timing stage of exam %s', exam.id, exc_info=True)
+        return None
+    return exam_signals(exam)
+
+
+def build_result(question_outputs, minimum_similarity_threshold, suspicious_threshold, parameters, elapsed,
+                 timing=None):
+    """
+    Assemble a result from per-question outputs: ``(result_json, pairs,
+    students)``, the ``AnalysisResult.result_json`` summary and the unsaved
+    ``SimilarPair`` and ``StudentRisk`` rows (see ``save_result``).
+
+    ``question_outputs`` is an iterable of
+    ``(question_id, answer_count, owners, candidate_count, pairs)`` where
+    ``owners`` maps the answer ids appearing in ``pairs`` to user ids.
+    ``timing`` (``analysis.timing.TimingSignals``) adds the timing signals
+    of the students in pairs and of the students they flag.
+    """
+    questions = {}
+    pair_rows = []
+    students = {}
+    totals = {'questions': 0, 'answers': 0, 'candidate_pairs': 0, 'pairs': 0, 'suspicious_pairs': 0}
+
+    for question_id, answer_count, owners, candidate_count, pairs in question_outputs:
+        for a, b, similarity in pairs:
+            similarity = round(similarity, 4)
+            suspicious = similarity >= suspicious_threshold
+            user_a, user_b = owners[a], owners[b]
+            pair_rows.append(SimilarPair(
+                question_id=question_id, answer_a=a, answer_b=b, user_a_id=user_a, user_b_id=user_b,
+                similarity=similarity, suspicious=suspicious,
+            ))
+            for user_id in (user_a, user_b):
+                stats = students.get(user_id)
+                if stats is None:
+                    stats = students[user_id] = StudentRisk(user_id=user_id)
+                stats.max_similarity = max(stats.max_similarity, similarity)
+                stats.pairs += 1
+                stats.suspicious_pairs += suspicious
+            totals['suspicious_pairs'] += suspicious
+
+        questions[str(question_id)] = {
+            'answers': answer_count,
+            'candidate_pairs': candidate_count,
+            'pairs': len(pairs),
+        }
+        totals['questions'] += 1
+        totals['answers'] += answer_count
+        totals['candidate_pairs'] += candidate_count
+        totals['pairs'] += len(pairs)
+
+    timing_risks = {}
+    if timing is not None:
+        for user_id, signals in timing.students.items():
+            stats = students.get(user_id)
+            if stats is None:
+                if signals.risk is None:
+                    continue
+                stats = students[user_id] = StudentRisk(user_id=user_id)
+            stats.completion_seconds = signals.completion_seconds
+            stats.expected_seconds = signals.expected_seconds
+            stats.fast_answers = signals.fast_answers
+            stats.simultaneous_identical = signals.simultaneous_identical
+            timing_risks[user_id] = signals.risk
+        totals['timing'] = timing.summary()
+
+    for user_id, stats in students.items():
+        text_risk = risk_level(stats.max_similarity, minimum_similarity_threshold, suspicious_threshold)
+        stats.risk = combined_risk(text_risk if stats.pairs else None, timing_risks.get(user_id))
+
+    totals['elapsed_seconds'] = round(elapsed, 3)
+    result_json = {
+        'parameters': parameters,
+        'summary': totals,
+        'questions': questions,
+    }
+    return result_json, pair_rows, list(students.values())
+
+
+def save_result(result, pairs, students):
+    """Write ``result`` with its ``pairs`` and ``students`` rows in one transaction."""
+    with transaction.atomic():
+        result.save()
+        for row in pairs + students:
+            row.result = result
+        SimilarPair.objects.bulk_create(pairs, batch_size=SAVE_BATCH_SIZE)
+        StudentRisk.objects.bulk_create(students, batch_size=SAVE_BATCH_SIZE)
+    return result
+
+
+def analyze_exam(exam, minimum_similarity_threshold=None, suspicious_threshold=None, save=True,
+                 backend='minhash', workers=1, progress=None, timing=True, **options):
+    """
+    Run similarity analysis over every question of ``exam``.
+
+    ``options`` are passed through to the backend (e.g. ``num_perm`` for
+    ``minhash`` or ``block_size`` for ``tfidf``). With ``workers`` greater
+    than one, questions are compared in a process pool (``workers=None``
+    uses every CPU). ``progress``, if given, is called with the number of
+    questions taken so far and the total (e.g. ``Job.report_progress``).
+    ``timing`` runs the timing stage first.
+    Returns the ``AnalysisResult``; it is only written to the database when
+    ``save`` is true.
+    """
+    default_minimum, default_suspicious = default_thresholds()
+    if minimum_similarity_threshold is None:
+        minimum_similarity_threshold = default_minimum
+    if suspicious_threshold is None:
+        suspicious_threshold = default_suspicious
+
+    engine = get_backend(backend)
+    started = time.perf_counter()
+    signals = timing_stage(exam) if timing else None
+    question_answers = load_question_answers(exam)
+    if progress is not None:
+        question_answers = with_progress(question_answers, progress, exam.questions.count())
+    if workers == 1:
+        outputs = [
+            compare_question(backend, question_id, answers, minimum_similarity_threshold, options)
+            for question_id, answers in question_answers
+        ]
+    else:
+        outputs = compare_questions(question_answers, backend, minimum_similarity_threshold, options, workers)
+
+    parameters = dict(engine.parameters(minimum_similarity_threshold, **options), backend=backend, workers=workers)
+    result_json, pairs, students = build_result(
+        outputs, minimum_similarity_threshold, suspicious_threshold, parameters, time.perf_counter() - started,
+        signals,
+    )
+    result = AnalysisResult(
+        exam=exam,
+        result_json=result_json,
+        algorithm_version=engine.ALGORITHM_VERSION,
+        minimum_similarity_threshold=minimum_similarity_threshold,
+        suspicious_threshold=suspicious_threshold,
+    )
+    if save:
+        save_result(result, pairs, students)
+    return result
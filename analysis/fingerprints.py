@@ -0,0 +1,412 @@
+"""
+On-disk fingerprint index of all answers, for cross-exam plagiarism lookups.
+
+Similarity analysis (``analysis.engine``) compares the answers of one
+exam with each other. This index keeps a compact fingerprint of every
+answer ever submitted, so that an answer can be checked against the
+answers of other exams and earlier terms in milliseconds, without
+reading their texts.
+
+A fingerprint is the MinHash signature (``analysis.minhash``) of the
+answer's character shingles, with ``NUM_PERM`` values, kept as:
+
+- ``bands`` LSH band keys, the CRC32 of ``rows`` consecutive signature
+  values: answers more similar than the index threshold share a key
+  with high probability;
+- a sketch of the low byte of every value (b-bit MinHash): the bytes of
+  two answers with Jaccard similarity ``J`` agree at a fraction
+  ``J + (1 - J) / 256`` of the positions, which estimates ``J`` for the
+  candidates found by the band keys.
+
+64-bit SimHash fingerprints were tried first and rejected: on short
+answers, the Hamming distances of near-duplicates and of unrelated
+answers to the same question overlap.
+
+Layout of ``FINGERPRINT_INDEX_DIR``::
+
+    manifest.json   parameters, live segments, answers indexed so far
+    seg-000001/     a segment, written once and never modified:
+        ids.npy       answer ids (int64), sorted
+        records.npy   (exam, question, user, submitted) of every answer
+                      (int64, submission time in microseconds)
+        sketches.npy  uint8 [answers, NUM_PERM]
+        keys.npy      uint32 [bands, answers], every band sorted
+        rows.npy      uint32 [bands, answers], the answer of every key
+
+Segments are opened as numpy memory maps; a lookup binary-searches the
+keys of every band and reads the few matching rows, so the index is
+never loaded in memory. ``update`` appends a segment with the answers
+submitted since the previous update; an answer submitted again gets a
+new record, which supersedes its records in older segments (answers
+submitted just before the previous update started, or still in the
+write-behind queue then, are read again, and skipped when their record
+is current). Past
+``FINGERPRINT_MAX_SEGMENTS`` segments, ``compact`` merges them into one,
+dropping superseded records and deleted answers. Writers hold a lock
+file; readers never lock: a segment is renamed into place complete and
+the manifest is replaced atomically.
+"""
+import json
+import os
+import shutil
+import zlib
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+try:
+    import numpy as np
+except ImportError as exc:
+    raise ImproperlyConfigured('The fingerprint index requires numpy.') from exc
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writer is assumed.
+    fcntl = None
+
+from exams import submission_queue
+from exams.models import Answer
+from .minhash import DEFAULT_SHINGLE_SIZE, choose_bands, shingles, signature
+
+FORMAT_VERSION = 1
+NUM_PERM = 64
+# Shorter answers (a number, a word or two) match by chance.
+MIN_SHINGLES = 20
+# Answers per segment written by ``update``.
+SEGMENT_SIZE = 100000
+CHUNK_SIZE = 5000
+# Answers saved while an update runs may carry an earlier submission time.
+OVERLAP = timedelta(minutes=1)
+SEGMENT_FILES = ('ids', 'records', 'sketches', 'keys', 'rows')
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+Match = namedtuple('Match', ['answer_id', 'exam_id', 'question_id', 'user_id', 'similarity'])
+
+_indexes = {}
+
+
+def fingerprint(text, bands, rows, num_perm=NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE):
+    """``(band keys, sketch)`` of ``text``, or ``None`` when it is too short to fingerprint."""
+    shingle_set = shingles(text, shingle_size)
+    if len(shingle_set) < MIN_SHINGLES:
+        return None
+    sig = signature(shingle_set, num_perm)
+    keys = [zlib.crc32(array('q', sig[band * rows:(band + 1) * rows]).tobytes()) for band in range(bands)]
+    return keys, bytes(value & 0xFF for value in sig)
+
+
+def estimate_similarity(equal):
+    """Jaccard similarity estimated from the fraction of equal sketch bytes."""
+    return np.clip((equal - 1 / 256) / (1 - 1 / 256), 0.0, 1.0)
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        for name in SEGMENT_FILES:
+            setattr(self, name, np.load(path / f'{name}.npy', mmap_mode='r'))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidates(self, keys):
+        """Rows sharing a band key with ``keys``."""
+        found = []
+        for band, key in enumerate(keys):
+            band_keys = self.keys[band]
+            low, high = np.searchsorted(band_keys, key, 'left'), np.searchsorted(band_keys, key, 'right')
+            if high > low:
+                found.append(self.rows[band, low:high])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.uint32)
+
+    def contains(self, answer_ids):
+        """Mask of the ``answer_ids`` this segment has a record of."""
+        positions = np.searchsorted(self.ids, answer_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == answer_ids[found]
+        return found
+
+    def record_keys(self):
+        """The band keys in row order (``keys`` is sorted per band)."""
+        keys = np.empty(self.keys.shape, dtype=np.uint32)
+        for band in range(len(keys)):
+            keys[band, self.rows[band]] = self.keys[band]
+        return keys
+
+
+def _write_segment(path, ids, records, sketches, keys):
+    """Write a segment to ``path`` through a temporary directory renamed into place."""
+    order = np.argsort(ids, kind='stable')
+    ids, records, sketches, keys = ids[order], records[order], sketches[order], keys[:, order]
+    rows = np.argsort(keys, axis=1, kind='stable').astype(np.uint32)
+    arrays = {
+        'ids': ids, 'records': records, 'sketches': sketches,
+        'keys': np.take_along_axis(keys, rows.astype(np.intp), axis=1), 'rows': rows,
+    }
+    temporary = path.with_name(f'.{path.name}.tmp')
+    shutil.rmtree(temporary, ignore_errors=True)
+    temporary.mkdir()
+    for name, values in arrays.items():
+        np.save(temporary / f'{name}.npy', np.ascontiguousarray(values))
+    os.rename(temporary, path)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _microseconds(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _answer_rows(answers, skip=()):
+    """
+    ``(id, exam, question, user, submitted, text)`` of ``answers`` except
+    the ids in ``skip``, read ``CHUNK_SIZE`` at a time by primary key.
+    """
+    # The ids first: no read cursor stays open for the whole update, which
+    # would hold off the writers of other workers on SQLite.
+    answer_ids = [answer_id for answer_id in answers.order_by('id').values_list('id', flat=True)
+                  if answer_id not in skip]
+    for ids in _chunks(answer_ids, CHUNK_SIZE):
+        rows = Answer.objects.filter(id__in=ids).values_list(
+            'id', 'question__exam_id', 'question_id', 'user_id', 'submitted_at', 'answer_text',
+        )
+        for answer_id, exam_id, question_id, user_id, submitted_at, text in rows:
+            yield answer_id, exam_id, question_id, user_id, _microseconds(submitted_at), text
+
+
+class FingerprintIndex:
+    def __init__(self, path=None):
+        self.path = Path(path or settings.FINGERPRINT_INDEX_DIR)
+        self._segments = {}
+
+    @property
+    def manifest_path(self):
+        return self.path / 'manifest.json'
+
+    def manifest(self):
+        """The current manifest, or ``None`` before the first update."""
+        # Read on every call (a few hundred bytes): a writer may have replaced it.
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def segments(self, manifest=None):
+        """The live segments, oldest first."""
+        manifest = manifest or self.manifest()
+        names = manifest['segments'] if manifest else []
+        self._segments = {
+            name: self._segments[name] if name in self._segments else Segment(self.path / name) for name in names
+        }
+        return list(self._segments.values())
+
+    def __len__(self):
+        return sum(map(len, self.segments()))
+
+    def lookup(self, text, exclude_exam=None, exclude_answer=None, min_similarity=None, limit=20):
+        """
+        The indexed answers similar to ``text`` as ``Match`` tuples, most
+        similar first: at least ``min_similarity`` (the index threshold by
+        default) by the sketch estimate.
+        """
+        manifest = self.manifest()
+        if not manifest:
+            return []
+        fingerprinted = fingerprint(text, manifest['bands'], manifest['rows'], manifest['num_perm'],
+                                    manifest['shingle_size'])
+        if fingerprinted is None:
+            return []
+        keys, sketch = fingerprinted
+        keys = np.asarray(keys, dtype=np.uint32)
+        sketch = np.frombuffer(sketch, dtype=np.uint8)
+        if min_similarity is None:
+            min_similarity = manifest['threshold']
+
+        try:
+            segments = self.segments(manifest)
+        except FileNotFoundError:
+            # A compaction replaced the segments after the manifest was read.
+            manifest = self.manifest()
+            segments = self.segments(manifest)
+
+        matches = {}
+        newer = []
+        for segment in reversed(segments):
+            rows = segment.candidates(keys)
+            if rows.size:
+                ids = segment.ids[rows]
+                superseded = np.zeros(len(ids), dtype=bool)
+                for other in newer:
+                    superseded |= other.contains(ids)
+                rows, ids = rows[~superseded], ids[~superseded]
+                similarities = estimate_similarity((segment.sketches[rows] == sketch).mean(axis=1))
+                for answer_id, (exam_id, question_id, user_id, _), similarity in zip(
+                        ids.tolist(), segment.records[rows].tolist(), similarities.tolist()):
+                    if similarity >= min_similarity and exam_id != exclude_exam and answer_id != exclude_answer:
+                        matches[answer_id] = Match(answer_id, exam_id, question_id, user_id, round(similarity, 4))
+            newer.append(segment)
+        return sorted(matches.values(), key=lambda match: (-match.similarity, match.answer_id))[:limit]
+
+    def lookup_answer(self, answer, **kwargs):
+        """Answers of other exams similar to ``answer``."""
+        kwargs.setdefault('exclude_exam', answer.question.exam_id)
+        return self.lookup(answer.answer_text, exclude_answer=answer.id, **kwargs)
+
+    @contextmanager
+    def _writing(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / 'lock', 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _new_manifest(self, threshold=None):
+        threshold = settings.FINGERPRINT_THRESHOLD if threshold is None else threshold
+        bands, rows = choose_bands(NUM_PERM, threshold)
+        return {
+            'version': FORMAT_VERSION, 'num_perm': NUM_PERM, 'shingle_size': DEFAULT_SHINGLE_SIZE,
+            'threshold': threshold, 'bands': bands, 'rows': rows,
+            'segments': [], 'next_segment': 1, 'indexed_until': None,
+        }
+
+    def _write_manifest(self, manifest):
+        temporary = self.manifest_path.with_name('manifest.json.tmp')
+        temporary.write_text(json.dumps(manifest, indent=2))
+        os.replace(temporary, self.manifest_path)
+
+    def _add_segment(self, manifest, ids, records, sketches, keys):
+        name = f"seg-{manifest['next_segment']:06d}"
+        _write_segment(self.path / name, ids, records, sketches, keys)
+        manifest['next_segment'] += 1
+        manifest['segments'].append(name)
+        self._write_manifest(manifest)
+
+    def _index(self, manifest, answers, progress=None):
+        """Fingerprint ``answers`` (rows of ``_answer_rows``) into new segments."""
+        bands, rows = manifest['bands'], manifest['rows']
+        added = 0
+        for chunk in _chunks(answers, SEGMENT_SIZE):
+            ids, records, sketches, keys = array('q'), array('q'), bytearray(), array('I')
+            for answer_id, exam_id, question_id, user_id, submitted, text in chunk:
+                fingerprinted = fingerprint(text, bands, rows, manifest['num_perm'], manifest['shingle_size'])
+                if fingerprinted is not None:
+                    ids.append(answer_id)
+                    records.extend((exam_id, question_id, user_id, submitted))
+                    sketches += fingerprinted[1]
+                    keys.extend(fingerprinted[0])
+            if ids:
+                self._add_segment(
+                    manifest,
+                    np.frombuffer(ids, dtype=np.int64),
+                    np.frombuffer(records, dtype=np.int64).reshape(-1, 4),
+                    np.frombuffer(bytes(sketches), dtype=np.uint8).reshape(-1, manifest['num_perm']),
+                    np.frombuffer(keys, dtype=np.uint32).reshape(-1, bands).T,
+                )
+            added += len(ids)
+            if progress:
+                progress(added)
+        return added
+
+    def update(self, progress=None):
+        """
+        Index the answers submitted since the previous update, compacting
+        when there are too many segments. ``progress(indexed)`` is called
+        after every segment. Returns the number of answers indexed.
+        """
+        with self._writing():
+            manifest = self.manifest() or self._new_manifest()
+            started = timezone.now()
+            # Answers still in the write-behind queue will carry their enqueue time.
+            indexed_until = submission_queue.complete_until(started)
+            answers = Answer.objects.filter(submitted_at__lte=started)
+            current = set()
+            if manifest['indexed_until']:
+                previous = parse_datetime(manifest['indexed_until'])
+                answers = answers.filter(submitted_at__gt=previous - OVERLAP)
+                # The window may start before answers indexed by the previous update.
+                overlap = dict(answers.values_list('id', 'submitted_at'))
+                versions = self._versions(manifest, overlap)
+                current = {answer_id for answer_id, submitted_at in overlap.items()
+                           if versions.get(answer_id) == _microseconds(submitted_at)}
+            added = self._index(manifest, _answer_rows(answers, skip=current), progress)
+            manifest['indexed_until'] = indexed_until.isoformat()
+            self._write_manifest(manifest)
+            if len(manifest['segments']) > settings.FINGERPRINT_MAX_SEGMENTS:
+                self._compact(manifest)
+        return added
+
+    def _versions(self, manifest, answer_ids):
+        """``{answer id: submission time}`` of the newest records of ``answer_ids``."""
+        answer_ids = np.asarray(sorted(answer_ids), dtype=np.int64)
+        versions = {}
+        for segment in reversed(self.segments(manifest)):
+            found = segment.contains(answer_ids)
+            positions = np.searchsorted(segment.ids, answer_ids[found])
+            for answer_id, submitted in zip(answer_ids[found].tolist(), segment.records[positions, 3].tolist()):
+                versions.setdefault(answer_id, submitted)
+        return versions
+
+    def rebuild(self, threshold=None, progress=None):
+        """Drop the index and fingerprint every answer again (after changing ``FINGERPRINT_THRESHOLD``)."""
+        with self._writing():
+            old = self.manifest()
+            manifest = self._new_manifest(threshold)
+            if old:
+                # Segment names are never reused: readers may still map the old ones.
+                manifest['next_segment'] = old['next_segment']
+            self._write_manifest(manifest)
+            for name in old['segments'] if old else []:
+                shutil.rmtree(self.path / name, ignore_errors=True)
+        return self.update(progress)
+
+    def compact(self):
+        """Merge all segments into one. Returns the number of records kept."""
+        with self._writing():
+            manifest = self.manifest()
+            if not manifest or not manifest['segments']:
+                return 0
+            return self._compact(manifest)
+
+    def _compact(self, manifest):
+        # Newest segment first, so that np.unique keeps every answer's newest record.
+        segments = [Segment(self.path / name) for name in reversed(manifest['segments'])]
+        ids = np.concatenate([segment.ids for segment in segments])
+        ids, first = np.unique(ids, return_index=True)
+        existing = set()
+        for chunk in _chunks(ids.tolist(), CHUNK_SIZE):
+            existing.update(Answer.objects.filter(id__in=chunk).values_list('id', flat=True))
+        kept = first[np.fromiter((answer_id in existing for answer_id in ids.tolist()), dtype=bool, count=len(ids))]
+        old = manifest['segments']
+        manifest['segments'] = []
+        self._add_segment(
+            manifest,
+            np.concatenate([segment.ids for segment in segments])[kept],
+            np.concatenate([segment.records for segment in segments])[kept],
+            np.concatenate([segment.sketches for segment in segments])[kept],
+            np.concatenate([segment.record_keys() for segment in segments], axis=1)[:, kept],
+        )
+        del segments
+        for name in old:
+            self._segments.pop(name, None)
+            shutil.rmtree(self.path / name, ignore_errors=True)
+        return len(kept)
+
+
+def get_index():
+    """The index at ``FINGERPRINT_INDEX_DIR``, shared by the process so that its segments stay mapped."""
+    path = Path(settings.FINGERPRINT_INDEX_DIR)
+    if path not in _indexes:
+        _indexes[path] = FingerprintIndex(path)
+    return _indexes[path]
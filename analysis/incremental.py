@@ -0,0 +1,269 @@
+"""
+Incremental MinHash analysis.
+
+Every run stores an ``AnswerSketch`` (shingle hashes and MinHash signature)
+for the answers it reads. The next run with the same thresholds and
+parameters starts from the newest matching ``AnalysisResult``:
+
+* only answers submitted after that result's snapshot (or lacking a current
+  sketch) are shingled again;
+* their signatures are looked up in LSH buckets built from the stored
+  signatures of the affected questions, and only pairs touching a changed
+  answer are scored;
+* pairs between unchanged answers are carried over from the previous result.
+
+The first run (or a run with different parameters) rescans every answer.
+"""
+import time
+from array import array
+from collections import defaultdict
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from exams import submission_queue
+from exams.models import Answer
+from .engine import build_result, default_thresholds, save_result, timing_stage, with_progress
+from .minhash import (
+    ALGORITHM_VERSION, DEFAULT_NUM_PERM, DEFAULT_SHINGLE_SIZE, band_keys, choose_bands, jaccard, parameters,
+    shingles, signature,
+)
+from .models import AnalysisResult, AnswerSketch
+
+SKETCH_BATCH_SIZE = 1000
+
+
+def sketch_version(num_perm, shingle_size):
+    return f'{ALGORITHM_VERSION}/{num_perm}/{shingle_size}'
+
+
+def pack_shingles(shingle_set):
+    return array('I', sorted(shingle_set)).tobytes()
+
+
+def unpack_shingles(data):
+    values = array('I')
+    values.frombytes(bytes(data))
+    return frozenset(values)
+
+
+def pack_signature(sig):
+    return array('q', sig).tobytes() if sig else b''
+
+
+def unpack_signature(data):
+    values = array('q')
+    values.frombytes(bytes(data))
+    return tuple(values)
+
+
+def previous_result(exam, minimum_similarity_threshold, suspicious_threshold, num_perm, shingle_size):
+    """Newest result of ``exam`` that an incremental run can build on, or ``None``."""
+    candidates = AnalysisResult.objects.filter(
+        exam=exam,
+        algorithm_version=ALGORITHM_VERSION,
+        minimum_similarity_threshold=minimum_similarity_threshold,
+        suspicious_threshold=suspicious_threshold,
+    )
+    for result in candidates[:5]:
+        params = result.result_json.get('parameters', {})
+        if params.get('num_perm') == num_perm and params.get('shingle_size') == shingle_size:
+            return result
+    return None
+
+
+def _snapshot_of(result):
+    # Answers written while a run was in progress are newer than its start,
+    # not its save time, so the start time is what the next run compares to.
+    snapshot = result.result_json.get('parameters', {}).get('snapshot_at')
+    return parse_datetime(snapshot) if snapshot else result.timestamp
+
+
+def _sketch_changed(exam, since, version, num_perm, shingle_size, heartbeat=None):
+    """
+    Shingle and store the answers changed since ``since``; return them
+    grouped by question. ``heartbeat()`` is called after every stored batch.
+    """
+    answers = Answer.objects.filter(question__exam=exam)
+    if since is not None:
+        answers = answers.filter(
+            Q(submitted_at__gt=since) | Q(sketch__isnull=True) | ~Q(sketch__sketch_version=version)
+        )
+    rows = answers.order_by().values_list('question_id', 'id', 'user_id', 'answer_text').iterator(
+        chunk_size=SKETCH_BATCH_SIZE,
+    )
+
+    changed = defaultdict(dict)
+    batch = []
+    for question_id, answer_id, user_id, text in rows:
+        shingle_set = shingles(text, shingle_size)
+        sig = signature(shingle_set, num_perm)
+        changed[question_id][answer_id] = (user_id, shingle_set, sig)
+        batch.append(AnswerSketch(
+            answer_id=answer_id, question_id=question_id, user_id=user_id, sketch_version=version,
+            shingles=pack_shingles(shingle_set), signature=pack_signature(sig),
+        ))
+        if len(batch) >= SKETCH_BATCH_SIZE:
+            _store_sketches(batch)
+            batch = []
+            if heartbeat:
+                heartbeat()
+    if batch:
+        _store_sketches(batch)
+    return changed
+
+
+def _store_sketches(batch):
+    AnswerSketch.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['answer'],
+        update_fields=['question', 'user', 'sketch_version', 'shingles', 'signature', 'computed_at'],
+    )
+
+
+def _compare_changed(question_id, changed, version, minimum_similarity_threshold, num_perm):
+    """
+    Score every pair of ``question_id`` that involves a changed answer.
+    Returns ``(candidate_count, pairs, owners)``.
+    """
+    bands, rows = choose_bands(num_perm, minimum_similarity_threshold)
+    owners = {answer_id: user_id for answer_id, (user_id, _, _) in changed.items()}
+
+    buckets = [defaultdict(list) for _ in range(bands)]
+    stored = (
+        AnswerSketch.objects.filter(question_id=question_id, sketch_version=version)
+        .exclude(signature=b'')
+        .values_list('answer_id', 'user_id', 'signature')
+        .iterator(chunk_size=SKETCH_BATCH_SIZE)
+    )
+    for answer_id, user_id, packed in stored:
+        owners.setdefault(answer_id, user_id)
+        for band, key in enumerate(band_keys(unpack_signature(packed), bands, rows)):
+            buckets[band][key].append(answer_id)
+
+    candidates = set()
+    for answer_id, (_, _, sig) in changed.items():
+        if sig is None:
+            continue
+        for band, key in enumerate(band_keys(sig, bands, rows)):
+            for other in buckets[band].get(key, ()):
+                if other != answer_id and owners[other] != owners[answer_id]:
+                    candidates.add((min(answer_id, other), max(answer_id, other)))
+
+    shingle_sets = {answer_id: shingle_set for answer_id, (_, shingle_set, _) in changed.items()}
+    partners = sorted({answer_id for pair in candidates for answer_id in pair} - shingle_sets.keys())
+    for start in range(0, len(partners), SKETCH_BATCH_SIZE):
+        for answer_id, packed in AnswerSketch.objects.filter(
+            answer_id__in=partners[start:start + SKETCH_BATCH_SIZE],
+        ).values_list('answer_id', 'shingles'):
+            shingle_sets[answer_id] = unpack_shingles(packed)
+
+    pairs = []
+    for a, b in candidates:
+        similarity = jaccard(shingle_sets[a], shingle_sets[b])
+        if similarity >= minimum_similarity_threshold:
+            pairs.append((a, b, similarity))
+    return len(candidates), pairs, owners
+
+
+def _carried_pairs(base, changed_ids):
+    """Pairs of ``base`` whose answers are unchanged and still exist, by question."""
+    carried = defaultdict(list)
+    if base is None:
+        return carried
+    rows = base.pairs.order_by().values_list(
+        'question_id', 'answer_a', 'answer_b', 'user_a_id', 'user_b_id', 'similarity',
+    )
+    kept = [row for row in rows.iterator(chunk_size=SKETCH_BATCH_SIZE)
+            if row[1] not in changed_ids and row[2] not in changed_ids]
+
+    referenced = sorted({answer_id for row in kept for answer_id in row[1:3]})
+    existing = set()
+    for start in range(0, len(referenced), SKETCH_BATCH_SIZE):
+        existing.update(Answer.objects.filter(
+            id__in=referenced[start:start + SKETCH_BATCH_SIZE],
+        ).values_list('id', flat=True))
+
+    for question_id, *pair in kept:
+        if pair[0] in existing and pair[1] in existing:
+            carried[question_id].append(pair)
+    return carried
+
+
+def analyze_exam_incremental(exam, minimum_similarity_threshold=None, suspicious_threshold=None, save=True,
+                             num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE, timing=True, progress=None):
+    """
+    MinHash analysis of ``exam`` that reuses the previous compatible result
+    and the stored sketches. Produces the same pairs as a full
+    ``analyze_exam(exam, backend='minhash')`` run. The timing stage, which
+    is cheap, always reads every answer again. ``progress`` is called as in
+    ``analyze_exam``, and also while the changed answers are sketched.
+    """
+    default_minimum, default_suspicious = default_thresholds()
+    if minimum_similarity_threshold is None:
+        minimum_similarity_threshold = default_minimum
+    if suspicious_threshold is None:
+        suspicious_threshold = default_suspicious
+
+    started = time.perf_counter()
+    # Answers still in the write-behind queue will carry their enqueue time.
+    snapshot_at = submission_queue.complete_until(timezone.now())
+    version = sketch_version(num_perm, shingle_size)
+    base = previous_result(exam, minimum_similarity_threshold, suspicious_threshold, num_perm, shingle_size)
+    signals = timing_stage(exam) if timing else None
+
+    answer_counts = dict(
+        Answer.objects.filter(question__exam=exam).order_by()
+        .values_list('question_id').annotate(count=Count('id'))
+    )
+    question_counts = sorted(answer_counts.items())
+    heartbeat = None
+    if progress is not None:
+        # Sketching the changed answers (every answer on a first run) comes before any question is done.
+        def heartbeat():
+            progress(0, len(answer_counts))
+        question_counts = with_progress(question_counts, progress, len(answer_counts))
+
+    changed = _sketch_changed(
+        exam, _snapshot_of(base) if base else None, version, num_perm, shingle_size, heartbeat,
+    )
+    changed_ids = {answer_id for answers in changed.values() for answer_id in answers}
+    carried = _carried_pairs(base, changed_ids)
+
+    outputs = []
+    for question_id, answer_count in question_counts:
+        candidate_count, pairs, owners = 0, [], {}
+        if question_id in changed:
+            candidate_count, pairs, owners = _compare_changed(
+                question_id, changed[question_id], version, minimum_similarity_threshold, num_perm,
+            )
+        for answer_a, answer_b, user_a, user_b, similarity in carried.get(question_id, ()):
+            owners[answer_a] = user_a
+            owners[answer_b] = user_b
+            pairs.append((answer_a, answer_b, similarity))
+        outputs.append((question_id, answer_count, owners, candidate_count, pairs))
+
+    params = dict(
+        parameters(minimum_similarity_threshold, num_perm, shingle_size),
+        backend='minhash',
+        incremental=True,
+        base_result=base.pk if base else None,
+        rescanned_answers=len(changed_ids),
+        snapshot_at=snapshot_at.isoformat(),
+    )
+    result_json, pairs, students = build_result(
+        outputs, minimum_similarity_threshold, suspicious_threshold, params, time.perf_counter() - started,
+        signals,
+    )
+    result = AnalysisResult(
+        exam=exam,
+        result_json=result_json,
+        algorithm_version=ALGORITHM_VERSION,
+        minimum_similarity_threshold=minimum_similarity_threshold,
+        suspicious_threshold=suspicious_threshold,
+    )
+    if save:
+        save_result(result, pairs, students)
+    return result
@@ -0,0 +1,99 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.engine import BACKENDS, analyze_exam
+from analysis.incremental import analyze_exam_incremental
+from exams.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Run answer similarity analysis for an exam and store an AnalysisResult.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--min-threshold', type=float, dest='minimum_similarity_threshold')
+        parser.add_argument('--suspicious-threshold', type=float, dest='suspicious_threshold')
+        parser.add_argument('--backend', choices=BACKENDS, default='minhash')
+        parser.add_argument('--block-size', type=int, help='Rows per sparse product block (tfidf backend).')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Compare questions in this many processes (0 uses every CPU).',
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only rescan answers submitted since the previous result (minhash backend).',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Print the summary without saving a result.')
+        parser.add_argument(
+            '--screen', action='store_true',
+            help='Only run the timing stage and print the flagged students, without comparing texts.',
+        )
+        parser.add_argument('--no-timing', action='store_false', dest='timing', help='Skip the timing stage.')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(pk=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist")
+
+        if options['screen']:
+            self._screen(exam)
+            return
+
+        thresholds = {
+            'minimum_similarity_threshold': options['minimum_similarity_threshold'],
+            'suspicious_threshold': options['suspicious_threshold'],
+            'timing': options['timing'],
+        }
+        if options['incremental']:
+            if options['backend'] != 'minhash':
+                raise CommandError('--incremental is only supported by the minhash backend')
+            if options['workers'] != 1:
+                raise CommandError('--incremental runs in a single process')
+            result = analyze_exam_incremental(exam, save=not options['dry_run'], **thresholds)
+        else:
+            backend_options = {}
+            if options['block_size']:
+                if options['backend'] != 'tfidf':
+                    raise CommandError('--block-size only applies to the tfidf backend')
+                backend_options['block_size'] = options['block_size']
+            try:
+                result = analyze_exam(
+                    exam,
+                    save=not options['dry_run'],
+                    backend=options['backend'],
+                    workers=options['workers'] or None,
+                    **thresholds,
+                    **backend_options,
+                )
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+        self._report(result)
+
+    def _screen(self, exam):
+        try:
+            from analysis.timing import screen_exam
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        summary, flagged = screen_exam(exam)
+        self.stdout.write(
+            f"{summary['students']} students, {summary['flagged_students']} flagged: "
+            f"{summary['fast_completion']} finished too fast, {summary['fast_answers']} fast answers, "
+            f"{summary['identical_pairs']} near-simultaneous identical answers ({summary['elapsed_seconds']}s)"
+        )
+        for user_id, timing in sorted(flagged.items(), key=lambda item: item[1].completion_seconds):
+            self.stdout.write(
+                f'  user {user_id}: {timing.risk}, {timing.answers} answers in {timing.completion_seconds:.0f}s '
+                f'(needs {timing.expected_seconds:.0f}s), {timing.fast_answers} fast, '
+                f'{timing.simultaneous_identical} identical'
+            )
+
+    def _report(self, result):
+        summary = result.result_json['summary']
+        self.stdout.write(
+            f"{summary['answers']} answers in {summary['questions']} questions, "
+            f"{summary['candidate_pairs']} candidate pairs, {summary['pairs']} similar pairs, "
+            f"{summary['suspicious_pairs']} suspicious ({summary['elapsed_seconds']}s)"
+        )
+        if result.pk:
+            self.stdout.write(self.style.SUCCESS(f'Saved AnalysisResult {result.pk} ({result.algorithm_version})'))
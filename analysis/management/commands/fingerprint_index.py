@@ -0,0 +1,66 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import Answer
+
+
+class Command(BaseCommand):
+    help = 'Maintain the cross-exam fingerprint index, or look up the answers of other exams similar to an answer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['update', 'compact', 'rebuild', 'lookup', 'stats'])
+        parser.add_argument('answer_ids', nargs='*', type=int, help='Answers to look up (lookup).')
+        parser.add_argument('--threshold', type=float, help='Index threshold (rebuild) or minimum similarity (lookup).')
+        parser.add_argument('--limit', type=int, default=20, help='Matches per answer (lookup).')
+        parser.add_argument('--background', action='store_true', help='Queue the update for run_jobs workers (update).')
+
+    def handle(self, *args, **options):
+        try:
+            from analysis.fingerprints import get_index
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        index = get_index()
+        action = options['action']
+        started = time.perf_counter()
+        if action == 'update' and options['background']:
+            from analysis.tasks import enqueue_fingerprint_update
+            self.stdout.write(f'Queued job {enqueue_fingerprint_update().id}')
+            return
+        if action == 'update':
+            self.stdout.write(f'Indexed {index.update()} answers')
+        elif action == 'rebuild':
+            self.stdout.write(f"Indexed {index.rebuild(options['threshold'])} answers")
+        elif action == 'compact':
+            self.stdout.write(f'Kept {index.compact()} answers')
+        elif action == 'lookup':
+            self._lookup(index, options)
+        self._stats(index, time.perf_counter() - started)
+
+    def _lookup(self, index, options):
+        if not options['answer_ids']:
+            raise CommandError('lookup needs answer ids')
+        for answer in Answer.objects.filter(id__in=options['answer_ids']).select_related('question'):
+            started = time.perf_counter()
+            matches = index.lookup_answer(answer, min_similarity=options['threshold'], limit=options['limit'])
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f'Answer {answer.id} (exam {answer.question.exam_id}): {len(matches)} matches in {elapsed:.1f} ms')
+            for match in matches:
+                self.stdout.write(
+                    f'  answer {match.answer_id} exam {match.exam_id} question {match.question_id} '
+                    f'user {match.user_id}: {match.similarity:.2f}'
+                )
+
+    def _stats(self, index, elapsed):
+        manifest = index.manifest()
+        if manifest is None:
+            self.stdout.write('The index is empty; run `manage.py fingerprint_index update`.')
+            return
+        segments = index.segments(manifest)
+        size = sum(path.stat().st_size for segment in segments for path in segment.path.iterdir())
+        self.stdout.write(
+            f"{sum(map(len, segments))} answers in {len(segments)} segments, {size / 2 ** 20:.1f} MiB "
+            f"(threshold {manifest['threshold']}, {manifest['bands']} bands of {manifest['rows']} rows), "
+            f"indexed until {manifest['indexed_until']} ({elapsed:.2f}s)"
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0001_initial'),
+        ('exams', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='analysisresult',
+            options={'ordering': ['-timestamp']},
+        ),
+        migrations.CreateModel(
+            name='AnswerSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sketch_version', models.CharField(max_length=50)),
+                ('shingles', models.BinaryField()),
+                ('signature', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('answer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sketch', to='exams.answer')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exams.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'sketch_version'], name='analysis_an_questio_db46f8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def _existing(model, ids):
+    ids = sorted(ids)
+    existing = set()
+    for start in range(0, len(ids), BATCH_SIZE):
+        existing.update(model.objects.filter(id__in=ids[start:start + BATCH_SIZE]).values_list('id', flat=True))
+    return existing
+
+
+def split_results(apps, schema_editor):
+    """Move the pairs and students of every stored result_json into rows."""
+    AnalysisResult = apps.get_model('analysis', 'AnalysisResult')
+    SimilarPair = apps.get_model('analysis', 'SimilarPair')
+    StudentRisk = apps.get_model('analysis', 'StudentRisk')
+    Question = apps.get_model('exams', 'Question')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    # One result at a time: a result_json can be several megabytes.
+    for result_id in list(AnalysisResult.objects.values_list('id', flat=True)):
+        result = AnalysisResult.objects.get(id=result_id)
+        data = result.result_json or {}
+        questions = data.get('questions') or {}
+        pairs = [
+            (int(question_id), pair)
+            for question_id, question in questions.items() if isinstance(question.get('pairs'), list)
+            for pair in question['pairs']
+        ]
+        students = data.pop('students', None) or {}
+        # Rows of questions and students deleted since the analysis are dropped.
+        question_ids = _existing(Question, {question_id for question_id, _ in pairs})
+        user_ids = _existing(User, {int(user_id) for user_id in students} | {
+            pair[key] for _, pair in pairs for key in ('user_a', 'user_b')
+        })
+        SimilarPair.objects.bulk_create(
+            [
+                SimilarPair(
+                    result=result, question_id=question_id, answer_a=pair['answer_a'], answer_b=pair['answer_b'],
+                    user_a_id=pair['user_a'], user_b_id=pair['user_b'], similarity=pair['similarity'],
+                    suspicious=pair['suspicious'],
+                )
+                for question_id, pair in pairs
+                if question_id in question_ids and pair['user_a'] in user_ids and pair['user_b'] in user_ids
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        StudentRisk.objects.bulk_create(
+            [
+                StudentRisk(
+                    result=result, user_id=int(user_id), max_similarity=stats['max_similarity'],
+                    pairs=stats['pairs'], suspicious_pairs=stats['suspicious_pairs'], risk=stats.get('risk', 'LOW'),
+                )
+                for user_id, stats in students.items() if int(user_id) in user_ids
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        for question in questions.values():
+            if isinstance(question.get('pairs'), list):
+                question['pairs'] = len(question['pairs'])
+        result.result_json = data
+        result.save(update_fields=['result_json'])
+
+
+def join_results(apps, schema_editor):
+    """Put the rows back into result_json."""
+    AnalysisResult = apps.get_model('analysis', 'AnalysisResult')
+    for result_id in list(AnalysisResult.objects.values_list('id', flat=True)):
+        result = AnalysisResult.objects.get(id=result_id)
+        data = result.result_json or {}
+        questions = data.setdefault('questions', {})
+        for question in questions.values():
+            question['pairs'] = []
+        for pair in result.pairs.order_by('-similarity', 'id').values(
+            'question_id', 'answer_a', 'answer_b', 'user_a_id', 'user_b_id', 'similarity', 'suspicious',
+        ):
+            questions.setdefault(str(pair['question_id']), {'answers': 0, 'candidate_pairs': 0, 'pairs': []})
+            questions[str(pair['question_id'])]['pairs'].append({
+                'answer_a': pair['answer_a'], 'answer_b': pair['answer_b'],
+                'user_a': pair['user_a_id'], 'user_b': pair['user_b_id'],
+                'similarity': pair['similarity'], 'suspicious': pair['suspicious'],
+            })
+        data['students'] = {
+            str(student['user_id']): {
+                'max_similarity': student['max_similarity'], 'pairs': student['pairs'],
+                'suspicious_pairs': student['suspicious_pairs'], 'risk': student['risk'],
+            }
+            for student in result.students.values('user_id', 'max_similarity', 'pairs', 'suspicious_pairs', 'risk')
+        }
+        result.result_json = data
+        result.save(update_fields=['result_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0002_alter_analysisresult_options_answersketch'),
+        ('exams', '0005_question_grading'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer_a', models.BigIntegerField()),
+                ('answer_b', models.BigIntegerField()),
+                ('similarity', models.FloatField()),
+                ('suspicious', models.BooleanField()),
+                ('question', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='exams.question')),
+                ('result', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='pairs', to='analysis.analysisresult')),
+                ('user_a', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-similarity', 'id'],
+                'indexes': [models.Index(fields=['result', '-similarity', 'id'], name='analysis_pair_top_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentRisk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_similarity', models.FloatField()),
+                ('pairs', models.IntegerField()),
+                ('suspicious_pairs', models.IntegerField()),
+                ('risk', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High')], max_length=10)),
+                ('result', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='students', to='analysis.analysisresult')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-max_similarity', 'id'],
+                'indexes': [models.Index(fields=['result', '-max_similarity', 'id'], name='analysis_student_top_idx')],
+                'unique_together': {('result', 'user')},
+            },
+        ),
+        migrations.RunPython(split_results, join_results),
+    ]
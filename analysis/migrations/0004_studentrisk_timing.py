@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0003_similarpair_studentrisk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentrisk',
+            name='completion_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentrisk',
+            name='expected_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentrisk',
+            name='fast_answers',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentrisk',
+            name='simultaneous_identical',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='studentrisk',
+            name='max_similarity',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AlterField(
+            model_name='studentrisk',
+            name='pairs',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='studentrisk',
+            name='suspicious_pairs',
+            field=models.IntegerField(default=0),
+        ),
+    ]
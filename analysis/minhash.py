@@ -0,0 +1,149 @@
+"""
+Shingling, MinHash signatures and LSH banding for near-duplicate answers.
+
+Signatures use one-permutation hashing: every shingle is hashed once and
+dropped into one of ``num_perm`` bins, keeping the minimum per bin. Empty
+bins borrow from the next non-empty bin (rotation densification), so a
+signature costs O(shingles) instead of O(shingles * num_perm) and needs
+nothing beyond the standard library.
+
+Texts are shingled after the Persian normalization shared with search and
+grading (``texts.cache``), so letter and digit variants do not hide a
+copied answer.
+"""
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+
+from texts.cache import normalized
+
+ALGORITHM_VERSION = 'minhash-lsh-2'
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_NUM_PERM = 128
+
+
+def normalize_text(text):
+    """The words of ``text`` after the shared Persian normalization, space separated."""
+    return ' '.join(normalized(text).words)
+
+
+def shingles(text, size=DEFAULT_SHINGLE_SIZE):
+    """Return the set of 32-bit hashes of the character ``size``-grams of ``text``."""
+    text = normalize_text(text)
+    if not text:
+        return frozenset()
+    if len(text) <= size:
+        return frozenset((zlib.crc32(text.encode('utf-8')),))
+    encoded = [text[i:i + size].encode('utf-8') for i in range(len(text) - size + 1)]
+    return frozenset(map(zlib.crc32, encoded))
+
+
+def signature(shingle_set, num_perm=DEFAULT_NUM_PERM):
+    """One-permutation MinHash signature of a shingle set, or ``None`` when empty."""
+    if not shingle_set:
+        return None
+    bins = [None] * num_perm
+    for value in shingle_set:
+        index, rest = value % num_perm, value // num_perm
+        current = bins[index]
+        if current is None or rest < current:
+            bins[index] = rest
+    # Rotation densification: an empty bin takes the value of the next
+    # non-empty bin, offset so that borrowed values never equal native ones.
+    for index in range(num_perm):
+        if bins[index] is None:
+            step = 1
+            while bins[(index + step) % num_perm] is None:
+                step += 1
+            bins[index] = -(bins[(index + step) % num_perm] * num_perm + step)
+    return tuple(bins)
+
+
+def _integrate(f, low, high, steps=100):
+    width = (high - low) / steps
+    return sum(f(low + (i + 0.5) * width) for i in range(steps)) * width
+
+
+@lru_cache(maxsize=None)
+def choose_bands(num_perm, threshold):
+    """
+    Pick ``(bands, rows)`` with ``bands * rows <= num_perm`` minimising the
+    probability mass of false candidates below ``threshold`` plus missed
+    pairs above it, i.e. the LSH S-curve that best approximates a step at
+    ``threshold``.
+    """
+    best, best_error = (num_perm, 1), None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive = _integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+            false_negative = _integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+            error = false_positive + false_negative
+            if best_error is None or error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+
+def band_keys(sig, bands, rows):
+    return [sig[band * rows:(band + 1) * rows] for band in range(bands)]
+
+
+def candidate_pairs(signatures, bands, rows):
+    """
+    Group ``{key: signature}`` by LSH band and return the set of key pairs
+    that share at least one band bucket. Keys must be orderable.
+    """
+    pairs = set()
+    for band in range(bands):
+        start = band * rows
+        buckets = defaultdict(list)
+        for key, sig in signatures.items():
+            buckets[sig[start:start + rows]].append(key)
+        for members in buckets.values():
+            if len(members) > 1:
+                pairs.update(combinations(sorted(members), 2))
+    return pairs
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+def compare_answers(answers, minimum_similarity_threshold,
+                    num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE):
+    """
+    Compare the answers of one question.
+
+    ``answers`` is a list of ``(answer_id, user_id, answer_text)``. Returns
+    ``(candidate_count, pairs)`` where ``pairs`` is a list of
+    ``(answer_id_a, answer_id_b, similarity)`` at or above the threshold.
+    Answers by the same user are never paired.
+    """
+    owners = {}
+    shingle_sets = {}
+    for answer_id, user_id, text in answers:
+        shingle_set = shingles(text, shingle_size)
+        if shingle_set:
+            owners[answer_id] = user_id
+            shingle_sets[answer_id] = shingle_set
+
+    signatures = {answer_id: signature(s, num_perm) for answer_id, s in shingle_sets.items()}
+    bands, rows = choose_bands(num_perm, minimum_similarity_threshold)
+    candidates = candidate_pairs(signatures, bands, rows)
+
+    pairs = []
+    for a, b in candidates:
+        if owners[a] == owners[b]:
+            continue
+        similarity = jaccard(shingle_sets[a], shingle_sets[b])
+        if similarity >= minimum_similarity_threshold:
+            pairs.append((a, b, similarity))
+    return len(candidates), pairs
+
+
+def parameters(minimum_similarity_threshold, num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE):
+    bands, rows = choose_bands(num_perm, minimum_similarity_threshold)
+    return {'num_perm': num_perm, 'bands': bands, 'rows': rows, 'shingle_size': shingle_size}
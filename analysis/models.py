@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.db import models
 from django.urls import reverse
 
-from exams.models import Exam
+from exams.models import Answer, Exam, Question
 
 
 class AnalysisResult(models.Model):
@@ -13,6 +14,8 @@ class AnalysisResult(models.Model):
 
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Parameters and totals; the pairs and students are in SimilarPair and
+    # StudentRisk (analysis.engine.save_result).
     result_json = models.JSONField()
     algorithm_version = models.CharField(max_length=50)
     minimum_similarity_threshold = models.FloatField(default=0.3)
@@ -25,4 +28,76 @@ class AnalysisResult(models.Model):
         return f"Analysis for {self.exam.title if self.exam else 'Unknown Exam'} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
     def get_absolute_url(self):
-        return reverse('analysis:result_detail', args=[str(self.id)])
\ No newline at end of file
+        return reverse('analysis:result_detail', args=[str(self.id)])
+
+
+class SimilarPair(models.Model):
+    """
+    Two answers of one question found similar by an analysis run. Answer
+    ids are kept as plain numbers: the result records the exam as it was
+    analyzed and outlives answers deleted since.
+    """
+    result = models.ForeignKey(AnalysisResult, on_delete=models.CASCADE, related_name='pairs', db_index=False)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, db_index=False)
+    answer_a = models.BigIntegerField()
+    answer_b = models.BigIntegerField()
+    user_a = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', db_index=False)
+    user_b = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', db_index=False)
+    similarity = models.FloatField()
+    suspicious = models.BooleanField()
+
+    class Meta:
+        ordering = ['-similarity', 'id']
+        indexes = [
+            # The most similar pairs of a result, page by page.
+            models.Index(fields=['result', '-similarity', 'id'], name='analysis_pair_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.answer_a} ~ {self.answer_b}: {self.similarity}"
+
+
+class StudentRisk(models.Model):
+    """
+    Per-student aggregate of one result: the student's similar pairs and
+    timing signals (``analysis.timing``), combined into ``risk``.
+    """
+    result = models.ForeignKey(AnalysisResult, on_delete=models.CASCADE, related_name='students', db_index=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    max_similarity = models.FloatField(default=0.0)
+    pairs = models.IntegerField(default=0)
+    suspicious_pairs = models.IntegerField(default=0)
+    # Seconds from the exam start to the last submission, and needed to read and type the answers.
+    completion_seconds = models.FloatField(null=True, blank=True)
+    expected_seconds = models.FloatField(null=True, blank=True)
+    fast_answers = models.IntegerField(default=0)
+    simultaneous_identical = models.IntegerField(default=0)
+    risk = models.CharField(max_length=10, choices=AnalysisResult.RISK_LEVELS)
+
+    class Meta:
+        ordering = ['-max_similarity', 'id']
+        unique_together = ['result', 'user']
+        indexes = [models.Index(fields=['result', '-max_similarity', 'id'], name='analysis_student_top_idx')]
+
+    def __str__(self):
+        return f"{self.user_id} ({self.risk})"
+
+
+class AnswerSketch(models.Model):
+    """
+    Stored MinHash sketch of one answer, so that incremental analysis runs
+    only re-shingle answers submitted since the previous result.
+    """
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE, related_name='sketch')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    sketch_version = models.CharField(max_length=50)
+    shingles = models.BinaryField()  # sorted uint32 shingle hashes
+    signature = models.BinaryField()  # int64 MinHash values, empty for blank answers
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['question', 'sketch_version'])]
+
+    def __str__(self):
+        return f"Sketch of answer {self.answer_id} ({self.sketch_version})"
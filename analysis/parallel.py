@@ -0,0 +1,44 @@
+"""
+Process-pool fan-out of per-question similarity work.
+
+Questions are independent, so each one is shipped to a worker as a plain
+list of ``(answer_id, user_id, answer_text)`` tuples and the partial
+outputs are merged by the caller. At most ``2 * workers`` questions are in
+flight at a time, which keeps the parent's memory bounded while the
+answer iterator streams from the database. Workers never read Django's
+settings: the size of their normalization cache (``texts.cache``) is
+passed to them when they start.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from texts import cache as texts_cache
+from .backends import compare_question
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def compare_questions(question_answers, backend, minimum_similarity_threshold, options, workers=None):
+    """
+    Run ``compare_question`` for every ``(question_id, answers)`` in
+    ``question_answers`` on a pool of ``workers`` processes. Returns the
+    outputs sorted by question id.
+    """
+    workers = workers or default_workers()
+    outputs = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=texts_cache.configure, initargs=(texts_cache.max_size(),),
+    ) as pool:
+        pending = set()
+        for question_id, answers in question_answers:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                outputs.extend(future.result() for future in done)
+            pending.add(pool.submit(
+                compare_question, backend, question_id, answers, minimum_similarity_threshold, options,
+            ))
+        outputs.extend(future.result() for future in wait(pending).done)
+    outputs.sort(key=lambda output: output[0])
+    return outputs
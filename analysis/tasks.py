@@ -0,0 +1,47 @@
+"""Background analysis runs (``jobs`` app, ``manage.py run_jobs``)."""
+from exams.models import Exam
+from jobs.queue import enqueue
+from jobs.registry import task
+from . import engine
+from .incremental import analyze_exam_incremental
+
+ANALYZE_EXAM = 'analysis.analyze_exam'
+
+
+def enqueue_analysis(exam, user, backend='minhash', incremental=False):
+    """Queue an analysis of ``exam``, or return the one already queued or running."""
+    return enqueue(
+        ANALYZE_EXAM, {'exam_id': exam.id, 'backend': backend, 'incremental': incremental}, user=user, unique=True,
+    )
+
+
+@task(ANALYZE_EXAM, max_attempts=2)
+def analyze_exam(job, exam_id, backend='minhash', incremental=False, minimum_similarity_threshold=None,
+                 suspicious_threshold=None):
+    exam = Exam.objects.get(id=exam_id)
+    thresholds = {
+        'minimum_similarity_threshold': minimum_similarity_threshold,
+        'suspicious_threshold': suspicious_threshold,
+    }
+    if incremental:
+        result = analyze_exam_incremental(exam, progress=job.report_progress, **thresholds)
+    else:
+        result = engine.analyze_exam(exam, backend=backend, progress=job.report_progress, **thresholds)
+    return {'analysis_result': result.pk, 'summary': result.result_json['summary']}
+
+
+UPDATE_FINGERPRINTS = 'analysis.update_fingerprints'
+
+
+def enqueue_fingerprint_update(user=None):
+    """Queue an update of the cross-exam fingerprint index, or return the one already queued or running."""
+    return enqueue(UPDATE_FINGERPRINTS, user=user, unique=True)
+
+
+@task(UPDATE_FINGERPRINTS, max_attempts=2)
+def update_fingerprints(job):
+    # Imported lazily: the index needs numpy.
+    from .fingerprints import get_index
+    index = get_index()
+    indexed = index.update(progress=lambda done: job.report_progress(done, message='fingerprinting'))
+    return {'indexed': indexed, 'segments': len(index.segments())}
@@ -1,3 +1,413 @@
-from django.test import TestCase
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from itertools import combinations
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from exams import submission_queue
+from exams.models import Answer, Exam
+from exams.submissions import save_answer_rows, save_answers
+from exams.tests import create_exam
+from . import minhash
+from .engine import analyze_exam
+from .fingerprints import FingerprintIndex, get_index
+from .incremental import analyze_exam_incremental
+from .models import AnalysisResult
+from .timing import exam_signals, timing_signals
+
+ORIGINAL = 'الگوریتم دایکسترا کوتاه‌ترین مسیر را از یک راس مبدا به همه راس‌های دیگر گراف با وزن نامنفی پیدا می‌کند'
+COPIED = 'الگوريتم دايكسترا کوتاه‌ترین مسیر را از یک راس مبدا به همه راس‌های دیگر گراف با وزن مثبت پیدا می‌کند'
+OTHER = 'در مرتب‌سازی ادغامی آرایه به دو نیمه تقسیم می‌شود و هر نیمه جداگانه مرتب و سپس ادغام می‌شود'
+
+
+def generated_answers(count=40, variants=5, seed=7):
+    """``(answer_id, user_id, text)`` rows: ``variants`` base answers, each copied with a few words changed."""
+    rng = random.Random(seed)
+    words = [f'واژه{i}' for i in range(60)]
+    bases = [rng.sample(words, 20) for _ in range(variants)]
+    answers = []
+    for answer_id in range(count):
+        text = list(bases[answer_id % variants])
+        for _ in range(rng.randrange(8)):
+            text[rng.randrange(len(text))] = rng.choice(words)
+        answers.append((answer_id, answer_id, ' '.join(text)))
+    return answers
+
+
+def exact_pairs(answers, threshold, similarity):
+    """Every pair of different users at or above ``threshold``, compared one by one."""
+    return {
+        (a, b): value
+        for (a, user_a, text_a), (b, user_b, text_b) in combinations(answers, 2)
+        if user_a != user_b and (value := similarity(text_a, text_b)) >= threshold
+    }
+
+
+class MinHashTests(SimpleTestCase):
+    def test_shingles_follow_normalization(self):
+        self.assertEqual(minhash.shingles('مي‌روم به كتابخانه'), minhash.shingles('میروم به کتابخانه'))
+        self.assertEqual(minhash.shingles(''), frozenset())
+        self.assertEqual(len(minhash.shingles('کتاب')), 1)
+
+    def test_signature_estimates_jaccard(self):
+        original, copied = minhash.shingles(ORIGINAL), minhash.shingles(COPIED)
+        a, b = minhash.signature(original), minhash.signature(copied)
+        self.assertEqual(len(a), minhash.DEFAULT_NUM_PERM)
+        self.assertEqual(minhash.signature(original), a)
+        self.assertIsNone(minhash.signature(frozenset()))
+        estimate = sum(x == y for x, y in zip(a, b)) / len(a)
+        self.assertAlmostEqual(estimate, minhash.jaccard(original, copied), delta=0.1)
+
+    def test_bands_fit_the_signature(self):
+        for threshold in (0.3, 0.5, 0.8):
+            bands, rows = minhash.choose_bands(minhash.DEFAULT_NUM_PERM, threshold)
+            self.assertLessEqual(bands * rows, minhash.DEFAULT_NUM_PERM)
+        # A higher threshold needs more agreeing rows per band.
+        self.assertLess(minhash.choose_bands(128, 0.5)[1], minhash.choose_bands(128, 0.8)[1])
+
+    def test_matches_exhaustive_comparison(self):
+        answers = generated_answers()
+        exact = exact_pairs(
+            answers, 0.5, lambda a, b: minhash.jaccard(minhash.shingles(a), minhash.shingles(b)),
+        )
+        candidates, pairs = minhash.compare_answers(answers, 0.5)
+        self.assertEqual({(a, b): similarity for a, b, similarity in pairs}, exact)
+        # The index proposed far fewer pairs than all of them.
+        self.assertLess(candidates, len(answers) * (len(answers) - 1) // 2 * 0.6)
+
+    def test_answers_of_one_user_are_not_paired(self):
+        answers = [(1, 10, ORIGINAL), (2, 10, COPIED), (3, 11, COPIED), (4, 12, OTHER), (5, 13, '')]
+        _, pairs = minhash.compare_answers(answers, 0.5)
+        self.assertEqual(sorted((a, b) for a, b, _ in pairs), [(1, 3), (2, 3)])
+
+
+class TfidfTests(SimpleTestCase):
+    def setUp(self):
+        try:
+            from . import tfidf
+        except ImproperlyConfigured:
+            self.skipTest('numpy and scipy are not installed')
+        self.tfidf = tfidf
+
+    def test_rows_are_unit_vectors(self):
+        counts = [self.tfidf.ngram_counts(text, n_features=4096) for text in (ORIGINAL, COPIED, OTHER)]
+        matrix = self.tfidf.tfidf_matrix(counts, n_features=4096)
+        self.assertEqual(matrix.shape, (3, 4096))
+        for norm in (matrix.multiply(matrix)).sum(axis=1).A1:
+            self.assertAlmostEqual(norm, 1.0, places=5)
+
+    def test_blocks_match_dense_cosine(self):
+        answers = generated_answers() + [(40, 40, ORIGINAL), (41, 41, ORIGINAL), (42, 40, COPIED)]
+        counts = [self.tfidf.ngram_counts(text, n_features=4096) for _, _, text in answers]
+        dense = self.tfidf.tfidf_matrix(counts, n_features=4096).toarray()
+        exact = exact_pairs(
+            [(index, user_id, index) for index, (_, user_id, _) in enumerate(answers)], 0.6,
+            lambda a, b: min(float(dense[a] @ dense[b]), 1.0),
+        )
+        _, pairs = self.tfidf.compare_answers(answers, 0.6, block_size=7, n_features=4096)
+        found = {(a, b): similarity for a, b, similarity in pairs}
+        self.assertEqual(found.keys(), exact.keys())
+        for key, similarity in found.items():
+            self.assertAlmostEqual(similarity, exact[key], places=5)
+        self.assertAlmostEqual(found[40, 41], 1.0, places=5)
+        # The copy is by the author of the original.
+        self.assertNotIn((40, 42), found)
+
+
+class FingerprintIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.students = [User.objects.create_user(f's{i}', password='pass', is_student=True) for i in range(3)]
+        cls.old_exam = create_exam(cls.instructor, questions=1)
+        cls.new_exam = create_exam(cls.instructor, questions=1)
+        old_question, new_question = cls.old_exam.questions.get(), cls.new_exam.questions.get()
+        save_answer_rows({
+            (cls.students[0].id, old_question.id): ORIGINAL,
+            (cls.students[1].id, old_question.id): OTHER,
+            (cls.students[2].id, old_question.id): '۴۲',
+            (cls.students[2].id, new_question.id): COPIED,
+        })
+        cls.original = Answer.objects.get(user=cls.students[0], question=old_question)
+        cls.copied = Answer.objects.get(user=cls.students[2], question=new_question)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(FINGERPRINT_INDEX_DIR=Path(directory.name), FINGERPRINT_MAX_SEGMENTS=2))
+        self.index = FingerprintIndex()
+
+    def test_lookup_finds_answers_of_other_exams(self):
+        self.assertEqual(self.index.lookup(ORIGINAL), [])
+        # The short answer is not fingerprinted.
+        self.assertEqual(self.index.update(), 3)
+        self.assertEqual(self.index.update(), 0)
+        [match] = self.index.lookup_answer(self.copied)
+        self.assertEqual(
+            (match.answer_id, match.exam_id, match.user_id), (self.original.id, self.old_exam.id, self.students[0].id),
+        )
+        self.assertGreater(match.similarity, 0.6)
+        self.assertEqual(self.index.lookup(OTHER, exclude_exam=self.new_exam.id)[0].similarity, 1.0)
+        self.assertEqual(self.index.lookup(OTHER, exclude_exam=self.old_exam.id), [])
+
+    def test_resubmitted_answers_supersede_and_compaction(self):
+        self.index.update()
+        save_answer_rows({(self.students[0].id, self.original.question_id): OTHER})
+        self.assertEqual(self.index.update(), 1)
+        self.assertEqual(len(self.index.segments()), 2)
+        self.assertEqual(self.index.lookup_answer(self.copied), [])
+        self.assertEqual({match.answer_id for match in self.index.lookup(OTHER)}, {self.original.id, self.original.id + 1})
+
+        Answer.objects.filter(id=self.copied.id).delete()
+        save_answer_rows({(self.students[1].id, self.original.question_id): ORIGINAL})
+        # A third segment exceeds FINGERPRINT_MAX_SEGMENTS: the update compacts.
+        self.assertEqual(self.index.update(), 1)
+        [segment] = self.index.segments()
+        self.assertEqual(segment.ids.tolist(), sorted([self.original.id, self.original.id + 1]))
+        self.assertEqual([match.user_id for match in self.index.lookup(COPIED)], [self.students[1].id])
+
+    def test_api_matches(self):
+        get_index().update()
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('api:answer_matches', args=[self.copied.id]))
+        self.assertEqual(response.json()['matches'][0]['answer_id'], self.original.id)
+
+        other = User.objects.create_user('other', password='pass', is_instructor=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('api:answer_matches', args=[self.copied.id])).status_code, 404)
+
+
+class ResultStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.students = [User.objects.create_user(f's{i}', password='pass', is_student=True) for i in range(4)]
+        cls.exam = create_exam(cls.instructor, questions=2)
+        first, second = cls.exam.questions.all()
+        save_answer_rows({
+            (cls.students[0].id, first.id): ORIGINAL,
+            (cls.students[1].id, first.id): COPIED,
+            (cls.students[2].id, first.id): ORIGINAL,
+            (cls.students[3].id, first.id): OTHER,
+            (cls.students[0].id, second.id): OTHER,
+            (cls.students[3].id, second.id): OTHER,
+        })
+
+    def test_pairs_and_students_are_rows(self):
+        result = analyze_exam(self.exam)
+        self.assertEqual(set(result.result_json), {'parameters', 'summary', 'questions'})
+        self.assertEqual(result.result_json['summary']['pairs'], 4)
+        self.assertEqual(sorted(question['pairs'] for question in result.result_json['questions'].values()), [1, 3])
+        similarities = list(result.pairs.values_list('similarity', flat=True))
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+        self.assertEqual(similarities[:2], [1.0, 1.0])
+        self.assertEqual(
+            dict(result.students.values_list('user_id', 'pairs')),
+            {self.students[0].id: 3, self.students[1].id: 2, self.students[2].id: 2, self.students[3].id: 1},
+        )
+        self.assertEqual(result.students.get(user=self.students[3]).risk, 'HIGH')
+
+        incremental = analyze_exam_incremental(self.exam)
+        self.assertEqual(incremental.pairs.count(), 4)
+        rerun = analyze_exam_incremental(self.exam)
+        self.assertEqual(rerun.result_json['parameters']['rescanned_answers'], 0)
+        self.assertEqual(
+            sorted(rerun.pairs.values_list('answer_a', 'answer_b', 'similarity')),
+            sorted(result.pairs.values_list('answer_a', 'answer_b', 'similarity')),
+        )
+
+    def test_process_pool_matches_one_worker(self):
+        serial = analyze_exam(self.exam)
+        pooled = analyze_exam(self.exam, workers=2)
+        self.assertEqual(pooled.result_json['parameters']['workers'], 2)
+        self.assertEqual(pooled.result_json['questions'], serial.result_json['questions'])
+        self.assertEqual(
+            sorted(pooled.pairs.values_list('question_id', 'answer_a', 'answer_b', 'similarity')),
+            sorted(serial.pairs.values_list('question_id', 'answer_a', 'answer_b', 'similarity')),
+        )
+
+    def test_workers_do_not_read_django_settings(self):
+        # What a spawned worker runs: a fresh interpreter without DJANGO_SETTINGS_MODULE.
+        code = (
+            'from texts import cache\n'
+            'cache.configure(10)\n'
+            'from analysis.backends import compare_question\n'
+            'from django.conf import settings\n'
+            f'print(compare_question("minhash", 1, [(1, 1, {ORIGINAL!r}), (2, 2, {COPIED!r})], 0.5, {{}})[4])\n'
+            'assert not settings.configured\n'
+        )
+        environment = {name: value for name, value in os.environ.items() if name != 'DJANGO_SETTINGS_MODULE'}
+        worker = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=environment, capture_output=True, text=True,
+        )
+        self.assertEqual(worker.returncode, 0, worker.stderr)
+        self.assertTrue(worker.stdout.startswith('[(1, 2, '))
+
+    def test_api_pages_through_pairs(self):
+        result = analyze_exam(self.exam)
+        self.client.force_login(self.instructor)
+        url = reverse('api:exam_analysis', args=[self.exam.id])
+        page = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual((page['id'], len(page['pairs']), len(page['students'])), (result.id, 3, 3))
+        self.assertNotIn('students', page['result'])
+        rest = self.client.get(url, {'offset': 3, 'limit': 3}).json()
+        self.assertEqual(len(rest['pairs']), 1)
+        self.assertEqual(
+            [pair['similarity'] for pair in page['pairs'] + rest['pairs']],
+            list(result.pairs.values_list('similarity', flat=True)),
+        )
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, 400)
+        self.assertEqual(AnalysisResult.objects.get().students.count(), 4)
+
+
+class IncrementalAnalysisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.students = [User.objects.create_user(f's{i}', password='pass', is_student=True) for i in range(12)]
+        cls.exam = create_exam(cls.instructor, questions=2)
+        cls.questions = list(cls.exam.questions.order_by('id'))
+        texts = [text for _, _, text in generated_answers(count=24, variants=4)]
+        save_answer_rows({
+            (student.id, question.id): texts[i * 2 + j]
+            for i, student in enumerate(cls.students) for j, question in enumerate(cls.questions)
+        })
+
+    def pairs(self, result):
+        return sorted(result.pairs.values_list('question_id', 'answer_a', 'answer_b', 'similarity'))
+
+    def risks(self, result):
+        return sorted(result.students.values_list('user_id', 'pairs', 'suspicious_pairs', 'max_similarity', 'risk'))
+
+    def assert_same_as_full(self, incremental):
+        full = analyze_exam(self.exam)
+        self.assertEqual(self.pairs(incremental), self.pairs(full))
+        self.assertEqual(self.risks(incremental), self.risks(full))
+        self.assertEqual(incremental.result_json['summary']['pairs'], full.result_json['summary']['pairs'])
+
+    def test_incremental_runs_equal_full_runs(self):
+        first = analyze_exam_incremental(self.exam)
+        self.assertEqual(first.result_json['parameters']['rescanned_answers'], 24)
+        self.assertGreater(first.pairs.count(), 0)
+        self.assert_same_as_full(first)
+
+        question = self.questions[0]
+        copied = Answer.objects.get(user=self.students[0], question=question).answer_text
+        newcomer = User.objects.create_user('newcomer', password='pass', is_student=True)
+        save_answer_rows({
+            # A changed answer, a copy written after the last run and a new student.
+            (self.students[1].id, question.id): ORIGINAL,
+            (self.students[2].id, question.id): copied,
+            (newcomer.id, question.id): COPIED,
+        })
+        Answer.objects.filter(user=self.students[3]).delete()
+
+        second = analyze_exam_incremental(self.exam)
+        self.assertIsNotNone(second.result_json['parameters']['base_result'])
+        self.assertEqual(second.result_json['parameters']['rescanned_answers'], 3)
+        self.assertIn(
+            (question.id, *sorted(Answer.objects.filter(question=question, answer_text__in=[ORIGINAL, COPIED])
+                                  .values_list('id', flat=True)), 0.8252),
+            self.pairs(second),
+        )
+        self.assert_same_as_full(second)
+
+    def test_answers_drained_after_a_run_are_rescanned(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(
+            SUBMISSION_WRITE_BEHIND=True, SUBMISSION_QUEUE_PATH=Path(directory.name) / 'queue.sqlite3',
+        ))
+        self.addCleanup(lambda: submission_queue._connection().close())
+        self.addCleanup(setattr, submission_queue._local, 'connection', None)
+
+        analyze_exam_incremental(self.exam)
+        submission_queue.enqueue('answer', self.students[1].id, {self.questions[0].id: ORIGINAL})
+        # The queued answer is stamped with its enqueue time, before this run started.
+        self.assertEqual(analyze_exam_incremental(self.exam).result_json['parameters']['rescanned_answers'], 0)
+        submission_queue.drain()
+        rerun = analyze_exam_incremental(self.exam)
+        self.assertEqual(rerun.result_json['parameters']['rescanned_answers'], 1)
+        self.assert_same_as_full(rerun)
+
+    def test_other_parameters_rescan_everything(self):
+        analyze_exam_incremental(self.exam)
+        rerun = analyze_exam_incremental(self.exam, minimum_similarity_threshold=0.6)
+        self.assertIsNone(rerun.result_json['parameters']['base_result'])
+        self.assertEqual(rerun.result_json['parameters']['rescanned_answers'], 24)
+
+
+class TimingTests(TestCase):
+    def rows(self, *answers):
+        start = timezone.now()
+        return [
+            (user_id, question_id, start + timedelta(seconds=seconds), len(text), hash(text))
+            for user_id, question_id, seconds, text in answers
+        ], start
+
+    def test_signals(self):
+        long_answer = 'x' * 100  # 20 seconds to type, plus 4 to read the question
+        rows, start = self.rows(
+            # Student 1 answers both questions at a plausible pace.
+            (1, 10, 60, long_answer), (1, 11, 120, 'y' * 100),
+            # Student 2 submits the whole exam at once after 10 seconds.
+            (2, 10, 10, 'z' * 100), (2, 11, 10, 'w' * 100),
+            # Students 3 and 4 submit the same answer 30 seconds apart, at a plausible pace.
+            (3, 10, 600, long_answer + '!'), (4, 10, 630, long_answer + '!'),
+            # Student 5 answers in time but submits one answer too soon after another.
+            (5, 10, 100, 'a' * 100), (5, 11, 105, 'b' * 100), (5, 12, 300, 'c' * 100),
+            # Student 6 submits the whole exam after an hour, answers stamped microseconds apart.
+            *((6, question, 3600 + i / 1e6, 'd' * 100) for i, question in enumerate((10, 11, 12))),
+        )
+        signals = timing_signals(rows, start, {10: 100, 11: 100, 12: 100})
+        students = signals.students
+        self.assertEqual((students[1].answers, students[1].completion_seconds), (2, 120.0))
+        self.assertEqual([students[user].risk for user in range(1, 7)], [None, 'HIGH', 'HIGH', 'HIGH', None, None])
+        self.assertTrue(students[2].fast_completion)
+        self.assertEqual((students[2].fast_answers, students[2].expected_seconds), (2, 48.0))
+        self.assertEqual((students[3].simultaneous_identical, students[4].simultaneous_identical), (1, 1))
+        self.assertEqual((students[5].fast_answers, students[6].fast_answers), (1, 0))
+        self.assertEqual(signals.identical_pairs, 1)
+        self.assertEqual(signals.summary()['flagged_students'], 3)
+
+    def test_submitted_form_is_one_step(self):
+        instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        student = User.objects.create_user('student', password='pass', is_student=True)
+        exam = create_exam(instructor, questions=10)
+        Exam.objects.filter(id=exam.id).update(start_time=timezone.now() - timedelta(hours=1))
+        exam.refresh_from_db()
+        save_answers(student, {question.id: f'پاسخ کامل به {question.text} ' * 5 for question in exam.questions.all()})
+        timing = exam_signals(exam).students[student.id]
+        self.assertEqual((timing.answers, timing.fast_answers, timing.risk), (10, 0, None))
+
+    def test_combined_with_text_similarity(self):
+        instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        students = [User.objects.create_user(f's{i}', password='pass', is_student=True) for i in range(3)]
+        exam = create_exam(instructor, questions=1)
+        question = exam.questions.get()
+        save_answer_rows({
+            (students[0].id, question.id): ORIGINAL,
+            (students[1].id, question.id): COPIED,
+            (students[2].id, question.id): OTHER,
+        })
+        # Students 0 and 1 answered after two minutes, student 2 right at the start.
+        Answer.objects.exclude(user=students[2]).update(submitted_at=exam.start_time + timedelta(minutes=2))
+        Answer.objects.filter(user=students[2]).update(submitted_at=exam.start_time + timedelta(seconds=1))
+
+        result = analyze_exam(exam, suspicious_threshold=0.95)
+        self.assertEqual(result.result_json['summary']['timing']['flagged_students'], 1)
+        risks = {student.user_id: (student.pairs, student.risk) for student in result.students.all()}
+        self.assertEqual(
+            risks, {students[0].id: (1, 'MEDIUM'), students[1].id: (1, 'MEDIUM'), students[2].id: (0, 'HIGH')},
+        )
+        self.assertEqual(result.students.get(user=students[2]).completion_seconds, 1.0)
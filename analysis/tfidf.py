@@ -0,0 +1,103 @@
+"""
+Character n-gram TF-IDF backend for answer similarity.
+
+All answers of a question become one sparse TF-IDF matrix (n-grams are
+hashed into a fixed number of columns, so no vocabulary is kept in
+memory). Cosine similarities are computed ``block_size`` rows at a time
+against the rows that follow them, and every block is thresholded before
+the next one is produced, so peak memory is bounded by one
+``block_size x answers`` slice of the similarity matrix.
+"""
+import zlib
+from collections import Counter
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError as exc:
+    raise ImproperlyConfigured('The tfidf analysis backend requires numpy and scipy.') from exc
+
+from .minhash import normalize_text
+
+ALGORITHM_VERSION = 'tfidf-cosine-2'
+DEFAULT_NGRAM_SIZE = 4
+DEFAULT_BLOCK_SIZE = 512
+DEFAULT_FEATURES = 2 ** 20
+
+
+def ngram_counts(text, ngram_size=DEFAULT_NGRAM_SIZE, n_features=DEFAULT_FEATURES):
+    text = normalize_text(text)
+    if len(text) <= ngram_size:
+        grams = [text] if text else []
+    else:
+        grams = [text[i:i + ngram_size] for i in range(len(text) - ngram_size + 1)]
+    return Counter(zlib.crc32(gram.encode('utf-8')) % n_features for gram in grams)
+
+
+def tfidf_matrix(counts, n_features=DEFAULT_FEATURES):
+    """
+    Build an L2-normalised CSR TF-IDF matrix from a list of n-gram
+    ``Counter`` objects, one per row. Every row must be non-empty.
+    """
+    indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in counts], out=indptr[1:])
+    indices = np.fromiter((k for c in counts for k in c.keys()), dtype=np.int32, count=indptr[-1])
+    data = np.fromiter((v for c in counts for v in c.values()), dtype=np.float32, count=indptr[-1])
+
+    # Sublinear term frequency and smoothed inverse document frequency.
+    data = 1.0 + np.log(data)
+    document_frequency = np.bincount(indices, minlength=n_features)
+    idf = np.log((1.0 + len(counts)) / (1.0 + document_frequency)) + 1.0
+    data *= idf[indices].astype(np.float32)
+
+    row_ids = np.repeat(np.arange(len(counts)), np.diff(indptr))
+    norms = np.sqrt(np.bincount(row_ids, weights=data.astype(np.float64) ** 2, minlength=len(counts)))
+    data /= norms[row_ids].astype(np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(counts), n_features))
+
+
+def compare_answers(answers, minimum_similarity_threshold, ngram_size=DEFAULT_NGRAM_SIZE,
+                    block_size=DEFAULT_BLOCK_SIZE, n_features=DEFAULT_FEATURES):
+    """
+    Compare the answers of one question; same contract as
+    ``analysis.minhash.compare_answers``. The candidate count is the number
+    of non-zero similarities that were evaluated.
+    """
+    answer_ids, owners, counts = [], [], []
+    for answer_id, user_id, text in answers:
+        row = ngram_counts(text, ngram_size, n_features)
+        if row:
+            answer_ids.append(answer_id)
+            owners.append(user_id)
+            counts.append(row)
+    if len(counts) < 2:
+        return 0, []
+
+    matrix = tfidf_matrix(counts, n_features)
+    answer_ids = np.asarray(answer_ids)
+    owners = np.asarray(owners)
+
+    candidate_count = 0
+    pairs = []
+    for start in range(0, len(counts), block_size):
+        # Only the upper triangle is needed: compare the block with itself
+        # and every later row.
+        block = (matrix[start:start + block_size] @ matrix[start:].T).tocoo()
+        rows = block.row + start
+        cols = block.col + start
+        upper = cols > rows
+        candidate_count += int(upper.sum())
+        keep = upper & (block.data >= minimum_similarity_threshold) & (owners[rows] != owners[cols])
+        pairs.extend(zip(
+            answer_ids[rows[keep]].tolist(),
+            answer_ids[cols[keep]].tolist(),
+            np.minimum(block.data[keep], 1.0).tolist(),
+        ))
+    return candidate_count, pairs
+
+
+def parameters(minimum_similarity_threshold, ngram_size=DEFAULT_NGRAM_SIZE,
+               block_size=DEFAULT_BLOCK_SIZE, n_features=DEFAULT_FEATURES):
+    return {'ngram_size': ngram_size, 'block_size': block_size, 'n_features': n_features}
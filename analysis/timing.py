@@ -0,0 +1,215 @@
+"""
+Time-behaviour signals from submission timestamps.
+
+Text comparison is the expensive stage of an analysis. This stage reads,
+for every answer of an exam, ``(user, question, submitted_at)`` and the
+answer text, which it reduces at once to its length and CRC32, and
+derives in one vectorized pass over these tuples, per student:
+
+``fast_answers``
+    The student's timing sequence is their submissions in time order;
+    answers saved together (a whole exam submitted at once) are one step.
+    A submission stamps all its answers with one time, but answers written
+    before it did are apart by microseconds, so answers saved within
+    ``STEP_SECONDS`` of the previous one join its step. An answer is fast when its step came sooner after the
+    previous one (the exam start for the first) than ``FAST_FRACTION`` of
+    the time needed to read its question and type it, at
+    ``READING_RATE`` and ``TYPING_RATE`` characters per second. Answers
+    saved before the exam start have no reference and are never fast.
+``fast_completion``
+    The student's last submission came sooner after the exam start than
+    ``FAST_FRACTION`` of the time needed for all their answers.
+``simultaneous_identical``
+    Answers of at least ``MIN_IDENTICAL_LENGTH`` characters identical to
+    another student's answer to the same question and submitted within
+    ``SIMULTANEOUS_SECONDS`` of it.
+
+``StudentTiming.risk`` turns the signals into one of the
+``AnalysisResult.RISK_LEVELS``: high for identical answers or a fast
+completion, medium when at least ``FAST_ANSWERS_SHARE`` of the answers
+are fast (a single fast answer is often one revisited late).
+``analysis.engine`` combines it with the student's text similarity
+risk. The pass keeps no text beyond its hash and needs no pairwise
+comparison, so ``screen_exam`` runs it alone to pick the exams worth the
+text comparison: it still reads every answer text once, as an analysis
+does, but skips the shingling and comparison. The exam start stands in
+for each student's start: a late start only makes a student look slower.
+"""
+import time
+import zlib
+from array import array
+from collections import namedtuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.functions import Length
+
+try:
+    import numpy as np
+except ImportError as exc:
+    raise ImproperlyConfigured('Timing analysis requires numpy.') from exc
+
+from exams.models import Answer, Question
+
+# Characters per second of a fast reader and a fast typist.
+READING_RATE = 25
+TYPING_RATE = 5
+FAST_FRACTION = 0.5
+FAST_ANSWERS_SHARE = 0.5
+SIMULTANEOUS_SECONDS = 60
+STEP_SECONDS = 1.0
+MIN_IDENTICAL_LENGTH = 20
+# Identical submissions compared with each one, in time order.
+MAX_NEIGHBOURS = 50
+CHUNK_SIZE = 5000
+
+
+class StudentTiming(namedtuple('StudentTiming', [
+        'answers', 'completion_seconds', 'expected_seconds', 'fast_answers', 'simultaneous_identical'])):
+    __slots__ = ()
+
+    @property
+    def fast_completion(self):
+        return 0 <= self.completion_seconds < FAST_FRACTION * self.expected_seconds
+
+    @property
+    def risk(self):
+        """Risk level of the signals, ``None`` when none is raised."""
+        if self.simultaneous_identical or self.fast_completion:
+            return 'HIGH'
+        if self.fast_answers >= max(FAST_ANSWERS_SHARE * self.answers, 1):
+            return 'MEDIUM'
+        return None
+
+
+class TimingSignals(namedtuple('TimingSignals', ['students', 'identical_pairs', 'elapsed_seconds'])):
+    """``students`` maps user ids to ``StudentTiming``."""
+    __slots__ = ()
+
+    def flagged(self):
+        return {user_id: timing for user_id, timing in self.students.items() if timing.risk}
+
+    def summary(self):
+        students = self.students.values()
+        return {
+            'students': len(self.students),
+            'flagged_students': len(self.flagged()),
+            'fast_completion': sum(timing.fast_completion for timing in students),
+            'fast_answers': sum(timing.fast_answers for timing in students),
+            'identical_pairs': self.identical_pairs,
+            'elapsed_seconds': round(self.elapsed_seconds, 3),
+        }
+
+
+def answer_rows(exam, chunk_size=CHUNK_SIZE):
+    """
+    ``(user, question, submitted_at, length, crc32)`` of every answer of
+    ``exam``, from its stripped text; the texts are read in chunks and
+    dropped once hashed.
+    """
+    rows = (
+        Answer.objects.filter(question__exam=exam).order_by()
+        .values_list('user_id', 'question_id', 'submitted_at', 'answer_text')
+        .iterator(chunk_size=chunk_size)
+    )
+    for user_id, question_id, submitted_at, text in rows:
+        text = text.strip()
+        yield user_id, question_id, submitted_at, len(text), zlib.crc32(text.encode('utf-8'))
+
+
+def _identical_pairs(users, questions, seconds, lengths, hashes):
+    """``(a, b)`` row indexes of near-simultaneous identical answers of different students."""
+    rows = np.flatnonzero(lengths >= MIN_IDENTICAL_LENGTH)
+    rows = rows[np.lexsort((seconds[rows], hashes[rows], lengths[rows], questions[rows]))]
+    key = np.stack([questions[rows], lengths[rows], hashes[rows]], axis=1)
+    found_a, found_b = [], []
+    # Identical answers are adjacent and in time order: compare every row with
+    # the k-th next one until no row has an identical answer within the window.
+    for k in range(1, min(MAX_NEIGHBOURS, len(rows) - 1) + 1):
+        near = (key[k:] == key[:-k]).all(axis=1) & (seconds[rows[k:]] - seconds[rows[:-k]] <= SIMULTANEOUS_SECONDS)
+        if not near.any():
+            break
+        near &= users[rows[k:]] != users[rows[:-k]]
+        found_a.append(rows[:-k][near])
+        found_b.append(rows[k:][near])
+    if not found_a:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(found_a), np.concatenate(found_b)
+
+
+def timing_signals(rows, start_time, question_lengths):
+    """
+    ``TimingSignals`` of ``rows`` (``(user, question, submitted_at,
+    answer length, answer crc32)`` tuples, e.g. ``answer_rows``), given the
+    exam's ``start_time`` and ``{question_id: text length}``.
+    """
+    started = time.perf_counter()
+    users, questions, seconds, lengths, hashes = array('q'), array('q'), array('d'), array('q'), array('q')
+    for user_id, question_id, submitted_at, length, answer_hash in rows:
+        users.append(user_id)
+        questions.append(question_id)
+        seconds.append((submitted_at - start_time).total_seconds())
+        lengths.append(length)
+        hashes.append(answer_hash)
+    if not users:
+        return TimingSignals({}, 0, time.perf_counter() - started)
+    users, questions, seconds, lengths, hashes = (
+        np.frombuffer(values, dtype=np.float64 if values.typecode == 'd' else np.int64)
+        for values in (users, questions, seconds, lengths, hashes)
+    )
+    question_ids, question_index = np.unique(questions, return_inverse=True)
+    question_chars = np.array([question_lengths.get(question_id, 0) for question_id in question_ids.tolist()])
+    expected = question_chars[question_index] / READING_RATE + lengths / TYPING_RATE
+
+    # Timing sequences: every student's answers in time order, grouped
+    # into steps of answers saved together; a step is done at its last answer.
+    order = np.lexsort((seconds, users))
+    sorted_users, sorted_seconds = users[order], seconds[order]
+    new_step = np.ones(len(order), dtype=bool)
+    new_step[1:] = (sorted_users[1:] != sorted_users[:-1]) | (np.diff(sorted_seconds) > STEP_SECONDS)
+    step = np.cumsum(new_step) - 1
+    step_users = sorted_users[new_step]
+    step_seconds = sorted_seconds[np.append(np.flatnonzero(new_step)[1:] - 1, len(order) - 1)]
+    step_sizes = np.bincount(step)
+    step_expected = np.bincount(step, weights=expected[order])
+    first = np.ones(len(step_users), dtype=bool)
+    first[1:] = step_users[1:] != step_users[:-1]
+    previous = np.concatenate([[0.0], step_seconds[:-1]])
+    previous[first] = 0.0
+    fast_steps = (step_seconds - previous < FAST_FRACTION * step_expected) & (step_seconds >= 0)
+
+    student_ids, student = np.unique(step_users, return_inverse=True)
+    answers = np.bincount(student, weights=step_sizes)
+    fast_answers = np.bincount(student, weights=step_sizes * fast_steps)
+    expected_seconds = np.bincount(student, weights=step_expected)
+    last = np.append(np.flatnonzero(first)[1:] - 1, len(step_users) - 1)
+    completion_seconds = step_seconds[last]
+
+    pair_a, pair_b = _identical_pairs(users, questions, seconds, lengths, hashes)
+    identical = np.bincount(
+        np.searchsorted(student_ids, np.concatenate([users[pair_a], users[pair_b]])), minlength=len(student_ids),
+    )
+    students = {
+        user_id: StudentTiming(int(count), round(completion, 3), round(expected_time, 3), int(fast), int(same))
+        for user_id, count, completion, expected_time, fast, same in zip(
+            student_ids.tolist(), answers.tolist(), completion_seconds.tolist(), expected_seconds.tolist(),
+            fast_answers.tolist(), identical.tolist(),
+        )
+    }
+    return TimingSignals(students, len(pair_a), time.perf_counter() - started)
+
+
+def exam_signals(exam):
+    """``TimingSignals`` of the answers of ``exam``."""
+    question_lengths = dict(
+        Question.objects.filter(exam=exam).annotate(length=Length('text')).values_list('id', 'length')
+    )
+    return timing_signals(answer_rows(exam), exam.start_time, question_lengths)
+
+
+def screen_exam(exam):
+    """
+    Run the timing stage alone: ``(summary, flagged)``, the counts of
+    ``TimingSignals.summary`` and the flagged students' ``StudentTiming``.
+    """
+    signals = exam_signals(exam)
+    return signals.summary(), signals.flagged()
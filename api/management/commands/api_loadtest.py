@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure in-process requests per second of the JSON API against the HTML exam views '
+        'for an existing exam and user.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--username', required=True, help='User to send the requests as.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(user)
+        exam_id = options['exam_id']
+        api_url = reverse('api:exam_questions', args=[exam_id])
+        etag = client.get(api_url).get('ETag', '')
+
+        cases = [
+            ('HTML questions_view', reverse('exams:exam_detail', args=[exam_id]), {}),
+            ('HTML take_exam', reverse('response:take_exam', args=[exam_id]), {}),
+            ('API questions', api_url, {}),
+            ('API questions (If-None-Match)', api_url, {'HTTP_IF_NONE_MATCH': etag}),
+        ]
+        for name, url, headers in cases:
+            client.get(url, **headers)  # warm caches
+            sent = 0
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                response = client.get(url, **headers)
+                sent += len(response.content)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:32} {options["requests"] / elapsed:8.1f} req/s  '
+                f'{elapsed / options["requests"] * 1000:6.2f} ms/req  '
+                f'{sent / options["requests"]:8.0f} bytes/resp  (status {response.status_code})'
+            )
@@ -1,3 +1,105 @@
+import json
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from analysis.models import AnalysisResult
+from exams.models import Answer
+from exams.tests import create_exam
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor)
+        cls.questions = list(cls.exam.questions.all())
+
+    def setUp(self):
+        cache.clear()
+
+    def put_json(self, url, data):
+        return self.client.put(url, json.dumps(data), content_type='application/json')
+
+    def test_requires_authentication(self):
+        response = self.client.get(reverse('api:exam_questions', args=[self.exam.id]))
+        self.assertEqual(response.status_code, 401)
+
+    def test_questions_conditional_get(self):
+        self.client.force_login(self.student)
+        url = reverse('api:exam_questions', args=[self.exam.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q['id'] for q in response.json()['questions']], [q.id for q in self.questions])
+        etag = response['ETag']
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.questions[0].text = 'ویرایش'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_batched_submission_and_autosave(self):
+        self.client.force_login(self.student)
+        response = self.put_json(
+            reverse('api:submit_answers', args=[self.exam.id]),
+            {'answers': {str(q.id): f'پاسخ {q.id}' for q in self.questions}},
+        )
+        self.assertEqual(response.json(), {'saved': 3})
+
+        # The answer was just written, so the autosave is held back until flushed.
+        question = self.questions[1]
+        url = reverse('api:autosave_answer', args=[self.exam.id, question.id])
+        response = self.put_json(url, {'answer_text': 'ذخیره خودکار'})
+        self.assertEqual(response.json(), {'status': 'pending'})
+        response = self.put_json(url, {'answer_text': 'ذخیره خودکار', 'flush': True})
+        self.assertEqual(response.json(), {'status': 'saved'})
+        self.assertEqual(Answer.objects.get(user=self.student, question=question).answer_text, 'ذخیره خودکار')
+
+    def test_blank_answers_are_not_saved(self):
+        self.client.force_login(self.student)
+        question = self.questions[0]
+        url = reverse('api:autosave_answer', args=[self.exam.id, question.id])
+        for text in ('', '   ', '\n\t'):
+            response = self.put_json(url, {'answer_text': text, 'flush': True})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'answer_text must not be blank'})
+        answers = {str(q.id): 'پاسخ' for q in self.questions}
+        answers[str(question.id)] = ' '
+        response = self.put_json(reverse('api:submit_answers', args=[self.exam.id]), {'answers': answers})
+        self.assertEqual(response.json(), {'saved': 2})
+        self.assertFalse(Answer.objects.filter(question=question).exists())
+
+    def test_submission_rejects_foreign_questions(self):
+        self.client.force_login(self.student)
+        response = self.put_json(reverse('api:submit_answers', args=[self.exam.id]), {'answers': {'999': 'x'}})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Answer.objects.exists())
+
+    def test_report_and_analysis_are_instructor_only(self):
+        AnalysisResult.objects.create(exam=self.exam, result_json={'summary': {}}, algorithm_version='test')
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('api:exam_report', args=[self.exam.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api:exam_analysis', args=[self.exam.id])).status_code, 404)
 
-# Create your tests here.
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('api:exam_report', args=[self.exam.id]))
+        self.assertEqual(len(response.json()['questions']), 3)
+        self.assertEqual(
+            self.client.get(reverse('api:exam_report', args=[self.exam.id]), HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code,
+            304,
+        )
+        response = self.client.get(reverse('api:exam_analysis', args=[self.exam.id]))
+        self.assertEqual(response.json()['algorithm_version'], 'test')
+        self.assertEqual(
+            self.client.get(reverse('api:exam_analysis', args=[self.exam.id]), HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code,
+            304,
+        )
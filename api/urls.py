@@ -0,0 +1,17 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('exams/<int:exam_id>/questions/', views.exam_questions, name='exam_questions'),
+    path('exams/<int:exam_id>/answers/', views.submit_exam_answers, name='submit_answers'),
+    path('exams/<int:exam_id>/answers/<int:question_id>/', views.autosave_answer, name='autosave_answer'),
+    path('exams/<int:exam_id>/report/', views.exam_report, name='exam_report'),
+    path('exams/<int:exam_id>/analysis/', views.exam_analysis, name='exam_analysis'),
+    path('exams/<int:exam_id>/analysis/run/', views.start_analysis, name='start_analysis'),
+    path('exams/<int:exam_id>/report/export/', views.start_export, name='start_export'),
+    path('answers/<int:answer_id>/matches/', views.answer_matches, name='answer_matches'),
+    path('jobs/<int:job_id>/', views.job_status, name='job'),
+    path('jobs/<int:job_id>/cancel/', views.cancel_job, name='cancel_job'),
+]
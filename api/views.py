@@ -1,3 +1,330 @@
-from django.shortcuts import render
+"""
+JSON API for the exam front end.
 
-# Create your views here.
+Responses are compact JSON (no whitespace, UTF-8 text rather than
+``\\u`` escapes). Read endpoints send an ``ETag`` and answer conditional
+requests with ``304 Not Modified``. Where the ETag can be derived without
+building the body (exam version token, analysis result id) it is checked
+before any payload work is done.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition, require_GET, require_http_methods
+
+from analysis.backends import BACKENDS
+from analysis.models import AnalysisResult
+from analysis.tasks import enqueue_analysis
+from exams import autosave, reports
+from exams.cache import exam_version, get_exam_payload_or_404
+from exams.models import Answer, Exam
+from exams.submissions import submit_answers
+from exams.tasks import enqueue_export
+from jobs import queue
+from jobs.views import get_user_job_or_404
+
+JSON_DUMPS_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+ANALYSIS_PAGE_SIZE = 50
+MAX_ANALYSIS_PAGE_SIZE = 500
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Authentication required', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params=JSON_DUMPS_PARAMS)
+
+
+def error_response(message, status=400):
+    return json_response({'error': message}, status=status)
+
+
+def conditional_json_response(request, data):
+    """JSON response whose ETag is a hash of the body; ``304`` if the client already has it."""
+    body = json.dumps(data, cls=DjangoJSONEncoder, **JSON_DUMPS_PARAMS).encode('utf-8')
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def parse_json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _questions_etag(request, exam_id):
+    return f'exam-{exam_id}-{exam_version(exam_id)}'
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_questions_etag)
+def exam_questions(request, exam_id):
+    exam = get_exam_payload_or_404(exam_id)
+    return json_response({
+        'id': exam['id'],
+        'title': exam['title'],
+        'description': exam['description'],
+        'start_time': exam['start_time'],
+        'end_time': exam['end_time'],
+        'questions': exam['questions'],
+    })
+
+
+def _clean_answers(exam, answers):
+    """
+    Validate ``{question_id: text}`` from a request body against the exam's
+    questions. Blank answers are left out, as in submitted forms.
+    """
+    if not isinstance(answers, dict):
+        return None
+    question_ids = {question['id'] for question in exam['questions']}
+    cleaned = {}
+    for question_id, text in answers.items():
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            return None
+        if question_id not in question_ids or not isinstance(text, str):
+            return None
+        if text and not text.isspace():
+            cleaned[question_id] = text
+    return cleaned
+
+
+@require_http_methods(['PUT'])
+@api_login_required
+def submit_exam_answers(request, exam_id):
+    """Batched submission: ``{"answers": {"<question_id>": "<text>", ...}}``."""
+    exam = get_exam_payload_or_404(exam_id)
+    body = parse_json_body(request)
+    answers = _clean_answers(exam, body.get('answers') if isinstance(body, dict) else None)
+    if answers is None:
+        return error_response('Expected {"answers": {"<question_id>": "<text>"}} for questions of this exam')
+    submit_answers(request.user, answers)
+    autosave.mark_saved('answer', request.user.pk, answers)
+    return json_response({'saved': len(answers)})
+
+
+@require_http_methods(['PUT'])
+@api_login_required
+def autosave_answer(request, exam_id, question_id):
+    """
+    Debounced autosave of one answer: ``{"answer_text": "<text>", "flush": false}``.
+    Responds with the autosave status (``saved``, ``pending`` or ``unchanged``).
+    """
+    exam = get_exam_payload_or_404(exam_id)
+    body = parse_json_body(request)
+    text = body.get('answer_text') if isinstance(body, dict) else None
+    answers = _clean_answers(exam, {question_id: text})
+    if answers is None:
+        return error_response('Expected {"answer_text": "<text>"} for a question of this exam')
+    if not answers:
+        return error_response('answer_text must not be blank')
+    status = autosave.autosave(
+        request.user, question_id, text, flush=bool(body.get('flush')),
+        question_ids=[question['id'] for question in exam['questions']],
+    )
+    return json_response({'status': status})
+
+
+@require_GET
+@api_login_required
+def exam_report(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    return conditional_json_response(request, {
+        'exam': exam.id,
+        'questions': [
+            {
+                'id': stats.question_id,
+                'submissions': stats.submissions,
+                'graded': stats.graded,
+                'correct': stats.correct,
+                'mean_score': stats.mean_score,
+                'length_histogram': stats.length_histogram,
+            }
+            for stats in reports.question_stats(exam)
+        ],
+        'students': [
+            [summary.user_id, summary.user.username, summary.total_score, summary.answered, summary.last_submitted]
+            for summary in reports.student_totals(exam)
+        ],
+        'student_columns': ['user_id', 'username', 'total_score', 'answered', 'last_submitted'],
+    })
+
+
+def _latest_analysis(request, exam_id):
+    return (
+        AnalysisResult.objects.filter(exam_id=exam_id, exam__created_by=request.user)
+        .order_by('-timestamp').values_list('id', flat=True).first()
+    )
+
+
+def _analysis_etag(request, exam_id):
+    result_id = _latest_analysis(request, exam_id)
+    return f'analysis-{result_id}' if result_id else None
+
+
+def _page(request):
+    """``(offset, limit)`` of the query string, or ``None`` when they are not valid."""
+    try:
+        offset = int(request.GET.get('offset', 0))
+        limit = int(request.GET.get('limit', ANALYSIS_PAGE_SIZE))
+    except ValueError:
+        return None
+    if offset < 0 or not 0 < limit <= MAX_ANALYSIS_PAGE_SIZE:
+        return None
+    return offset, limit
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_analysis_etag)
+def exam_analysis(request, exam_id):
+    """
+    The newest analysis of the exam: its summary and a page
+    (``?offset=0&limit=50``) of the most similar pairs and of the students
+    with the most similar answers.
+    """
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    result = AnalysisResult.objects.filter(exam=exam).order_by('-timestamp').first()
+    if result is None:
+        return error_response('No analysis has been run for this exam', status=404)
+    page = _page(request)
+    if page is None:
+        return error_response(f'offset must be at least 0 and limit between 1 and {MAX_ANALYSIS_PAGE_SIZE}')
+    offset, limit = page
+    pairs = result.pairs.values_list(
+        'question_id', 'answer_a', 'answer_b', 'user_a_id', 'user_b_id', 'similarity', 'suspicious',
+    )[offset:offset + limit]
+    students = result.students.values(
+        'user_id', 'max_similarity', 'pairs', 'suspicious_pairs', 'completion_seconds', 'expected_seconds',
+        'fast_answers', 'simultaneous_identical', 'risk',
+    )[offset:offset + limit]
+    return json_response({
+        'id': result.id,
+        'exam': exam.id,
+        'timestamp': result.timestamp,
+        'algorithm_version': result.algorithm_version,
+        'minimum_similarity_threshold': result.minimum_similarity_threshold,
+        'suspicious_threshold': result.suspicious_threshold,
+        'result': result.result_json,
+        'offset': offset,
+        'limit': limit,
+        'pairs': [
+            {
+                'question': question_id, 'answer_a': answer_a, 'answer_b': answer_b, 'user_a': user_a,
+                'user_b': user_b, 'similarity': similarity, 'suspicious': suspicious,
+            }
+            for question_id, answer_a, answer_b, user_a, user_b, similarity, suspicious in pairs
+        ],
+        'students': [{'user': student.pop('user_id'), **student} for student in students],
+    })
+
+
+@require_GET
+@api_login_required
+def answer_matches(request, answer_id):
+    """Answers of other exams similar to one of the instructor's answers (the fingerprint index)."""
+    # Imported lazily: the index needs numpy.
+    from analysis.fingerprints import get_index
+
+    answer = get_object_or_404(
+        Answer.objects.select_related('question'), id=answer_id, question__exam__created_by=request.user,
+    )
+    return json_response({
+        'answer': answer.id,
+        'exam': answer.question.exam_id,
+        'matches': [match._asdict() for match in get_index().lookup_answer(answer)],
+    })
+
+
+def job_payload(job):
+    result = job.result
+    if result and 'file' in result:
+        result = dict(result, download_url=reverse('jobs:download', args=[job.id]))
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'finished': job.is_finished,
+        'cancel_requested': job.cancel_requested,
+        'attempts': job.attempts,
+        'progress': {
+            'done': job.progress_done,
+            'total': job.progress_total,
+            'percent': job.percent,
+            'message': job.progress_message,
+        },
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'result': result,
+        # Only the exception line; the traceback stays in the admin.
+        'error': job.error.strip().splitlines()[-1] if job.error and job.status == job.FAILED else None,
+    }
+
+
+def job_accepted(job):
+    response = json_response(job_payload(job), status=202)
+    response['Location'] = reverse('api:job', args=[job.id])
+    return response
+
+
+@require_http_methods(['POST'])
+@api_login_required
+def start_analysis(request, exam_id):
+    """Queue a similarity analysis: ``{"backend": "minhash", "incremental": false}`` (both optional)."""
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    body = parse_json_body(request)
+    if not isinstance(body, dict):
+        return error_response('Expected a JSON object')
+    backend = body.get('backend', 'minhash')
+    incremental = bool(body.get('incremental'))
+    if backend not in BACKENDS or (incremental and backend != 'minhash'):
+        return error_response(f'backend must be one of {sorted(BACKENDS)}; incremental requires minhash')
+    return job_accepted(enqueue_analysis(exam, request.user, backend=backend, incremental=incremental))
+
+
+@require_http_methods(['POST'])
+@api_login_required
+def start_export(request, exam_id):
+    """Queue an answer export: ``{"format": "csv"}`` or ``"jsonl"``."""
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    body = parse_json_body(request)
+    fmt = body.get('format') if isinstance(body, dict) else None
+    if fmt not in reports.EXPORT_FORMATS:
+        return error_response(f'format must be one of {sorted(reports.EXPORT_FORMATS)}')
+    return job_accepted(enqueue_export(exam, fmt, request.user))
+
+
+@require_GET
+@api_login_required
+def job_status(request, job_id):
+    return json_response(job_payload(get_user_job_or_404(request.user, job_id)))
+
+
+@require_http_methods(['POST'])
+@api_login_required
+def cancel_job(request, job_id):
+    job = get_user_job_or_404(request.user, job_id)
+    queue.cancel(job)
+    job.refresh_from_db()
+    return json_response(job_payload(job))
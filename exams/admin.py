@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Exam, Question
+from django.db.models import Count
+
+from search.models import SearchDocument
+from search.query import matching_ids
+from . import tasks
+from .models import Answer, Exam, ExamStudentSummary, Question, QuestionStats
+from .paginators import EstimatedCountPaginator
 
 
 class QuestionInline(admin.TabularInline):
@@ -11,14 +17,19 @@ class QuestionInline(admin.TabularInline):
 
 class ExamAdmin(admin.ModelAdmin):
     list_display = ('title', 'start_time', 'end_time', 'created_by', 'question_count')
+    list_select_related = ('created_by',)
     search_fields = ('title', 'description')
     inlines = [QuestionInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(question_count=Count('questions'))
+
     # اضافه کردن تعداد سوالات به لیست نمایش
     def question_count(self, obj):
-        return obj.questions.count()
+        return obj.question_count
 
     question_count.short_description = 'تعداد سوالات'
+    question_count.admin_order_field = 'question_count'
 
     # ذخیره سازنده آزمون به صورت خودکار
     def save_model(self, request, obj, form, change):
@@ -31,9 +42,21 @@ admin.site.register(Exam, ExamAdmin)
 
 
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('text', 'exam', 'short_text')
-    search_fields = ('text', 'exam__title')
+    list_display = ('text', 'exam', 'short_text', 'grading_rule')
+    list_select_related = ('exam',)
+    list_filter = ('grading_rule',)
+    actions = ['regrade_answers']
+    search_fields = ('exam__title',)
     raw_id_fields = ('exam',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            # متن سوال از نمایه‌ی جستجوی متن کامل خوانده می‌شود.
+            results |= queryset.filter(pk__in=matching_ids(search_term, SearchDocument.QUESTION))
+        return results, may_have_duplicates
 
     # نمایش متن کوتاه برای سوالات طولانی
     def short_text(self, obj):
@@ -41,5 +64,54 @@ class QuestionAdmin(admin.ModelAdmin):
 
     short_text.short_description = 'متن کوتاه'
 
+    # تصحیح دوباره‌ی پاسخ‌ها در پس‌زمینه، یک کار برای هر سوال
+    @admin.action(description='تصحیح دوباره‌ی پاسخ‌ها')
+    def regrade_answers(self, request, queryset):
+        jobs = tasks.enqueue_grading(queryset.values_list('id', flat=True), user=request.user)
+        self.message_user(request, f'{len(jobs)} کار تصحیح در صف قرار گرفت.')
+
+
+admin.site.register(Question, QuestionAdmin)
+
+
+class AnswerAdmin(admin.ModelAdmin):
+    list_display = ('user', 'question', 'source', 'is_correct', 'score', 'is_flagged', 'submitted_at')
+    list_filter = ('source', 'is_correct', 'is_flagged', 'submitted_at')
+    list_select_related = ('user', 'question__exam')
+    search_fields = ('^user__username',)
+    search_help_text = 'نام کاربری دانشجو یا متن پاسخ'
+    raw_id_fields = ('user', 'question')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(pk__in=matching_ids(search_term, SearchDocument.ANSWER))
+        return results, may_have_duplicates
+
+
+admin.site.register(Answer, AnswerAdmin)
+
+
+class ExamStudentSummaryAdmin(admin.ModelAdmin):
+    list_display = ('exam', 'user', 'total_score', 'answered', 'last_submitted')
+    list_select_related = ('exam', 'user')
+    list_filter = ('exam',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('exam', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(ExamStudentSummary, ExamStudentSummaryAdmin)
+
+
+class QuestionStatsAdmin(admin.ModelAdmin):
+    list_display = ('question', 'submissions', 'graded', 'correct', 'total_score', 'dirty_at', 'computed_at')
+    list_select_related = ('question__exam',)
+    list_filter = ('exam',)
+    raw_id_fields = ('question', 'exam')
+
 
-admin.site.register(Question, QuestionAdmin)
\ No newline at end of file
+admin.site.register(QuestionStats, QuestionStatsAdmin)
@@ -0,0 +1,20 @@
+"""``exams.urls`` with the async views and the event stream of the ASGI profile."""
+from django.urls import path
+
+from . import async_views, events, urls
+
+app_name = 'exams'
+
+ASYNC_VIEWS = {
+    'exam_detail': async_views.questions_view,
+    'exam_report': async_views.exam_report,
+    'autosave': async_views.autosave_view,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS
+    else pattern
+    for pattern in urls.urlpatterns
+] + [
+    path('exam/<int:exam_id>/events/', events.exam_events, name='exam_events'),
+]
@@ -0,0 +1,103 @@
+"""
+Async versions of the exam-taking, autosave and report views, routed by the
+ASGI profile (``algoproject.asgi_urls``).
+
+Database work goes through the async ORM, so a slow write suspends the
+request instead of holding a worker thread. Templates are rendered through
+``sync_to_async`` because template tags (the user menu) may still run
+synchronous queries.
+"""
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from . import autosave, reports
+from .cache import aget_exam_payload_or_404
+from .models import Exam
+from .submissions import asaved_answers, asubmit_answers, collect_answers, log_submission, prefill
+
+arender = sync_to_async(render)
+
+
+async def request_user(request):
+    """Resolve ``request.user`` without a synchronous query, and keep it for the templates."""
+    request.user = await request.auser()
+    return request.user
+
+
+def events_url(exam_id):
+    return reverse('exams:exam_events', args=[exam_id]) if settings.EXAM_EVENTS else None
+
+
+async def autosave_response(request, exam, target):
+    """Async version of ``views.autosave_response``."""
+    user = await request_user(request)
+    try:
+        question_id = int(request.POST.get('question_id', ''))
+    except ValueError:
+        return HttpResponseBadRequest('question_id is required')
+    question_ids = [question['id'] for question in exam['questions']]
+    if question_id not in question_ids:
+        return HttpResponseBadRequest('Unknown question')
+    status = await sync_to_async(autosave.autosave)(
+        user, question_id, request.POST.get('answer_text', ''),
+        target=target, flush=bool(request.POST.get('flush')), question_ids=question_ids,
+    )
+    return JsonResponse({'status': status})
+
+
+@login_required
+async def questions_view(request, exam_id):
+    user = await request_user(request)
+    exam = await aget_exam_payload_or_404(exam_id)
+    questions = sorted(exam['questions'], key=itemgetter('id'))
+    question_ids = [question['id'] for question in questions]
+
+    if request.method == 'POST':
+        answers = collect_answers(question_ids, request.POST)
+        await asubmit_answers(user, answers)
+        await sync_to_async(autosave.mark_saved)('answer', user.pk, answers)
+        log_submission('questions_view', user, answers)
+        return redirect('exams:thank_you')
+    await sync_to_async(autosave.flush_pending)(user, question_ids, 'answer')
+    answered_questions = await asaved_answers(user.pk, question_ids)
+    return await arender(request, 'exams/questions.html', {
+        'exam': exam,
+        'questions': prefill(questions, answered_questions),
+        'events_url': events_url(exam['id']),
+    })
+
+
+@login_required
+@require_POST
+async def autosave_view(request, exam_id):
+    return await autosave_response(request, await aget_exam_payload_or_404(exam_id), 'answer')
+
+
+@login_required
+async def exam_report(request, exam_id):
+    user = await request_user(request)
+    exam = await aget_object_or_404(Exam, id=exam_id, created_by=user)
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+    query = request.GET.get('q', '').strip()
+    if query:
+        answers, next_after = await sync_to_async(reports.search_answers)(exam, query), None
+    else:
+        answers, next_after = await reports.aanswer_page(exam, after)
+    return await arender(request, 'exams/exam_report.html', {
+        'exam': exam,
+        'query': query,
+        'answers': answers,
+        'next_after': next_after,
+        'question_stats': await sync_to_async(reports.question_stats)(exam),
+        'student_totals': [summary async for summary in reports.student_totals(exam)],
+    })
@@ -0,0 +1,131 @@
+"""
+Debounced autosave of single answers.
+
+Each (target, user, question) keeps a small state in the cache: a hash of
+the text last written to the database, when that happened, and the newest
+text not yet written. Every state has its own key, so concurrent saves of
+different answers never overwrite each other; the pending answers of a
+student are found by reading the states of the exam's questions. An
+autosave
+
+* is dropped when the text equals what was last written;
+* otherwise becomes the pending text of that answer, and
+* writes all of the student's pending answers in one batch when the
+  previous write of this answer is at least ``AUTOSAVE_MIN_INTERVAL``
+  seconds old and the student has used fewer than
+  ``AUTOSAVE_MAX_WRITES_PER_MINUTE`` batches in the current minute.
+
+So database writes per student per minute are bounded however often the
+client saves. Pending text is also written by ``flush_pending`` (called
+when the student reloads the exam page, or when the client sends
+``flush``), and is superseded by the final form submission. The cache may
+be local to a process, so the client keeps every answer it was told is
+pending and sends it again with ``flush`` on ``pagehide``
+(``templates/autosave.html``): the text travels with the request and does
+not depend on the state held by the process that saw it first.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+# Autosave target -> function storing ``{question_id: text}`` for a user.
+WRITERS = {
+    'answer': 'exams.submissions.submit_answers',
+    'response': 'responses.submissions.submit_responses',
+}
+
+STATE_TIMEOUT = 6 * 60 * 60
+
+
+def min_interval():
+    return getattr(settings, 'AUTOSAVE_MIN_INTERVAL', 30)
+
+
+def max_writes_per_minute():
+    return getattr(settings, 'AUTOSAVE_MAX_WRITES_PER_MINUTE', 6)
+
+
+def _text_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _state_key(target, user_id, question_id):
+    return f'autosave:{target}:{user_id}:{question_id}'
+
+
+def _take_write_slot(target, user_id):
+    """Count a write against ``user_id``'s budget for this minute; ``False`` when it is used up."""
+    key = f'autosave:{target}:{user_id}:writes:{int(time.time() // 60)}'
+    cache.add(key, 0, 120)
+    try:
+        return cache.incr(key) <= max_writes_per_minute()
+    except ValueError:
+        # The counter expired between add() and incr().
+        return True
+
+
+def _write(target, user, answers):
+    import_string(WRITERS[target])(user, answers)
+    mark_saved(target, user.pk, answers)
+
+
+def mark_saved(target, user_id, answers):
+    """Record that ``answers`` (``{question_id: text}``) were just written for ``user_id``."""
+    now = time.time()
+    cache.set_many(
+        {
+            _state_key(target, user_id, question_id): {'hash': _text_hash(text), 'saved_at': now, 'pending': None}
+            for question_id, text in answers.items()
+        },
+        STATE_TIMEOUT,
+    )
+
+
+def autosave(user, question_id, text, target='answer', flush=False, question_ids=()):
+    """
+    Autosave ``text`` as ``user``'s answer to ``question_id``. Returns
+    ``'unchanged'``, ``'saved'`` or ``'pending'`` (coalesced until a later
+    write). A write also takes the pending answers to ``question_ids`` (the
+    other questions of the exam). ``flush`` writes regardless of the
+    interval and the per-minute budget. Blank text is ignored, as in
+    submitted forms.
+    """
+    if not text or text.isspace():
+        return 'unchanged'
+    key = _state_key(target, user.pk, question_id)
+    state = cache.get(key) or {'hash': None, 'saved_at': 0.0, 'pending': None}
+    if _text_hash(text) == state['hash']:
+        if state['pending'] is not None:
+            # Edited and then reverted before the pending text was written.
+            state['pending'] = None
+            cache.set(key, state, STATE_TIMEOUT)
+        return 'unchanged'
+
+    state['pending'] = text
+    cache.set(key, state, STATE_TIMEOUT)
+
+    due = time.time() - state['saved_at'] >= min_interval()
+    if flush or (due and _take_write_slot(target, user.pk)):
+        # This answer is written from the request, whatever the cache holds meanwhile.
+        flush_pending(user, set(question_ids) - {question_id}, target, {question_id: text})
+        return 'saved'
+    return 'pending'
+
+
+def flush_pending(user, question_ids, target='answer', answers=None):
+    """
+    Write the pending autosaves of ``user`` to ``question_ids`` for
+    ``target``, with ``answers`` (``{question_id: text}``), in one batch.
+    Returns the number of answers written.
+    """
+    answers = dict(answers or {})
+    keys = {_state_key(target, user.pk, question_id): question_id for question_id in question_ids}
+    for key, state in cache.get_many(keys).items():
+        if state['pending'] is not None:
+            answers.setdefault(keys[key], state['pending'])
+    if answers:
+        _write(target, user, answers)
+    return len(answers)
@@ -0,0 +1,113 @@
+"""
+Versioned cache of exam question sets.
+
+The serialized exam and its questions are cached under a key that embeds a
+per-exam version token. Saving or deleting an ``Exam`` or ``Question``
+replaces the token once the transaction commits (see ``exams.signals``),
+so stale payloads are never read again and simply expire.
+
+``bulk_create``/``update`` on questions bypass the signals; call
+``invalidate_exam`` after such writes have committed.
+"""
+import time
+
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import Exam
+
+PAYLOAD_TIMEOUT = 60 * 60
+
+
+def _version_key(exam_id):
+    return f'exam:{exam_id}:version'
+
+
+def exam_version(exam_id):
+    # A fresh token (rather than a counter) keeps keys unique even if the
+    # version entry itself is evicted.
+    return cache.get_or_set(_version_key(exam_id), time.time_ns, None)
+
+
+async def aexam_version(exam_id):
+    version = await cache.aget(_version_key(exam_id))
+    if version is None:
+        await cache.aadd(_version_key(exam_id), time.time_ns(), None)
+        version = await cache.aget(_version_key(exam_id))
+    return version
+
+
+def invalidate_exam(exam_id):
+    cache.set(_version_key(exam_id), time.time_ns(), None)
+
+
+def serialize_exam(exam):
+    return {
+        'id': exam.id,
+        'title': exam.title,
+        'description': exam.description,
+        'start_time': exam.start_time,
+        'end_time': exam.end_time,
+        'created_by_id': exam.created_by_id,
+        'questions': list(
+            exam.questions.order_by('order', 'id').values('id', 'text', 'points', 'order')
+        ),
+    }
+
+
+async def aserialize_exam(exam):
+    return {
+        'id': exam.id,
+        'title': exam.title,
+        'description': exam.description,
+        'start_time': exam.start_time,
+        'end_time': exam.end_time,
+        'created_by_id': exam.created_by_id,
+        'questions': [
+            question async for question in
+            exam.questions.order_by('order', 'id').values('id', 'text', 'points', 'order')
+        ],
+    }
+
+
+def exam_payload(exam_id):
+    """
+    Return the cached payload of exam ``exam_id`` (a dict with the exam
+    fields and a ``questions`` list of dicts), or ``None`` if it does not exist.
+    """
+    key = f'exam:{exam_id}:v{exam_version(exam_id)}:payload'
+    payload = cache.get(key)
+    if payload is None:
+        exam = Exam.objects.filter(id=exam_id).first()
+        if exam is None:
+            return None
+        payload = serialize_exam(exam)
+        cache.set(key, payload, PAYLOAD_TIMEOUT)
+    return payload
+
+
+def get_exam_payload_or_404(exam_id):
+    payload = exam_payload(exam_id)
+    if payload is None:
+        raise Http404('Exam not found')
+    return payload
+
+
+async def aexam_payload(exam_id):
+    """Async version of ``exam_payload``."""
+    key = f'exam:{exam_id}:v{await aexam_version(exam_id)}:payload'
+    payload = await cache.aget(key)
+    if payload is None:
+        exam = await Exam.objects.filter(id=exam_id).afirst()
+        if exam is None:
+            return None
+        payload = await aserialize_exam(exam)
+        await cache.aset(key, payload, PAYLOAD_TIMEOUT)
+    return payload
+
+
+async def aget_exam_payload_or_404(exam_id):
+    payload = await aexam_payload(exam_id)
+    if payload is None:
+        raise Http404('Exam not found')
+    return payload
@@ -0,0 +1,154 @@
+"""
+Server-sent events for exam pages (ASGI profile, ``EXAM_EVENTS=1``).
+
+A client of ``exam_events`` first receives an ``exam-state`` event, then
+``exam-start`` and ``exam-end`` when the exam window opens and closes and,
+for the exam's instructor, ``analysis-complete`` when a new
+``AnalysisResult`` is stored (the analysis usually runs in another process,
+e.g. ``manage.py analyze_exam``).
+
+Every connection is an async generator waiting on its own queue, so idle
+examinees hold no thread. One watcher task per exam and process polls the
+database every ``EXAM_EVENTS_POLL_INTERVAL`` seconds and fans the events
+out to the connected clients, so the polling cost does not grow with the
+number of clients. A failed poll (the database briefly unavailable, say)
+is logged and retried at the next interval, and a watcher that stopped
+anyway is started again by the next client.
+"""
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+
+from analysis.models import AnalysisResult
+from .cache import aget_exam_payload_or_404
+from .models import Exam
+
+logger = logging.getLogger(__name__)
+
+# Events only sent to the exam's instructor.
+INSTRUCTOR_EVENTS = {'analysis-complete'}
+# ``ExamChannel.result_id`` before the first poll.
+UNKNOWN = object()
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def exam_state(start_time, end_time, now=None):
+    now = now or timezone.now()
+    return {'started': now >= start_time, 'ended': now >= end_time, 'start_time': start_time, 'end_time': end_time}
+
+
+async def latest_result_id(exam_id):
+    return await (
+        AnalysisResult.objects.filter(exam_id=exam_id).order_by('-timestamp')
+        .values_list('id', flat=True).afirst()
+    )
+
+
+class ExamChannel:
+    """Fan-out of one exam's events to the clients connected to this process."""
+
+    def __init__(self, exam_id, state):
+        self.exam_id = exam_id
+        # Exam state and newest analysis result last seen by the watcher.
+        self.state = state
+        self.result_id = UNKNOWN
+        self.queues = set()
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self.queues.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.watch())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+        if not self.queues:
+            if self.task is not None:
+                self.task.cancel()
+            if _channels.get(self.exam_id) is self:
+                del _channels[self.exam_id]
+
+    def publish(self, event, data):
+        message = (event, format_event(event, data))
+        for queue in self.queues:
+            queue.put_nowait(message)
+
+    async def poll(self):
+        """Publish what changed since the previous poll; ``False`` once the exam is deleted."""
+        times = await Exam.objects.filter(id=self.exam_id).values_list('start_time', 'end_time').afirst()
+        if times is None:
+            return False
+        state = exam_state(*times)
+        if state['started'] and not self.state['started']:
+            self.publish('exam-start', state)
+        if state['ended'] and not self.state['ended']:
+            self.publish('exam-end', state)
+        self.state = state
+
+        latest = await latest_result_id(self.exam_id)
+        if self.result_id is not UNKNOWN and latest is not None and latest != self.result_id:
+            self.publish('analysis-complete', {'exam': self.exam_id, 'result': latest})
+        self.result_id = latest
+        return True
+
+    async def watch(self):
+        while True:
+            try:
+                if not await self.poll():
+                    return
+            except Exception:
+                logger.exception('Polling the events of exam %s failed; retrying', self.exam_id)
+            await asyncio.sleep(settings.EXAM_EVENTS_POLL_INTERVAL)
+
+
+# Exam id -> channel with connected clients in this process.
+_channels = {}
+
+
+async def stream(exam_id, state, instructor):
+    channel = _channels.get(exam_id)
+    if channel is None:
+        channel = _channels[exam_id] = ExamChannel(exam_id, state)
+    queue = channel.subscribe()
+    try:
+        yield format_event('exam-state', channel.state)
+        while True:
+            try:
+                event, message = await asyncio.wait_for(queue.get(), settings.EXAM_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comment line, keeps proxies from closing an idle connection.
+                yield ': keepalive\n\n'
+                continue
+            if event in INSTRUCTOR_EVENTS and not instructor:
+                continue
+            yield message
+    finally:
+        channel.unsubscribe(queue)
+
+
+@login_required
+async def exam_events(request, exam_id):
+    if not settings.EXAM_EVENTS:
+        raise Http404('Exam events are disabled')
+    user = await request.auser()
+    exam = await aget_exam_payload_or_404(exam_id)
+    state = exam_state(exam['start_time'], exam['end_time'])
+    response = StreamingHttpResponse(
+        stream(exam['id'], state, instructor=exam['created_by_id'] == user.pk),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
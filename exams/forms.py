@@ -13,9 +13,11 @@ class ExamForm(forms.ModelForm):
 class QuestionForm(forms.ModelForm):
     class Meta:
         model = Question
-        fields = ['text', 'points', 'order']
+        fields = ['text', 'points', 'order', 'grading_rule', 'reference_answer']
         widgets = {
             'text': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'points': forms.NumberInput(attrs={'class': 'form-control'}),
             'order': forms.NumberInput(attrs={'class': 'form-control'}),
+            'grading_rule': forms.Select(attrs={'class': 'form-control'}),
+            'reference_answer': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
         }
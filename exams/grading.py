@@ -0,0 +1,263 @@
+"""
+Automatic grading of answers.
+
+Every ``Question`` has a ``grading_rule`` applied to its
+``reference_answer``:
+
+``exact``
+    The answer equals the reference, ignoring surrounding whitespace.
+``normalized``
+    The answers have the same words after ``texts.normalization``
+    (Persian letter and digit variants, case, punctuation and spacing).
+``regex``
+    The normalized answer fully matches the reference pattern
+    (case-insensitive).
+``numeric``
+    The first number in the answer is within ``tolerance`` of the
+    reference (relative to it with ``"relative": true``).
+``keywords``
+    The reference lists one keyword or phrase per line (or separated by
+    commas); the answer's coverage is the fraction it contains.
+
+A rule yields a fraction between 0 and 1 (0 or 1 except for
+``keywords``). The answer is correct when it reaches ``min_coverage``
+(default 1) and then scores the question's points; with ``"partial":
+true`` an incorrect answer scores the fraction of the points instead.
+
+Rules are compiled once per distinct (rule, reference, options, points)
+and the compiled graders are shared by every answer to the question.
+Submissions are graded as they are written (``exams.submissions``);
+``grade_questions`` grades the answers stored otherwise (merged, bulk
+loaded) and re-grades a question after its rule changed, reading the
+answers in chunks and writing only the grades that changed. A rule gives
+few distinct grades (at most ``points + 1``), so the answers sharing a
+grade are updated by one ``UPDATE ... WHERE id IN (...)``; Django's
+``bulk_update`` builds a ``CASE`` branch per row and was an order of
+magnitude slower on 100k answers. A rule change
+queues the re-grade as one background job per question
+(``exams.tasks.enqueue_grading``), so workers re-grade an exam in
+parallel. Questions graded manually keep the scores given in the admin;
+only grades written by this module (``Answer.graded_at``) are cleared
+when a question switches to manual grading.
+"""
+import json
+import logging
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from texts.cache import normalized
+from . import stats
+from .models import Answer, Question
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+_NUMBER = re.compile(r'[-+]?\d+(?:\.\d+)?')
+# Arabic decimal and thousands separators.
+_NUMBER_FOLD = str.maketrans({'٫': '.', '٬': None, ',': None})
+_KEYWORD_SEPARATORS = re.compile(r'[\n,،]')
+
+
+def _phrase(text):
+    return ' '.join(normalized(text).words)
+
+
+def _parse_number(text):
+    match = _NUMBER.search(normalized(text).text.translate(_NUMBER_FOLD))
+    return float(match.group()) if match else None
+
+
+def _exact(reference, options):
+    reference = reference.strip()
+    return lambda text: float(text.strip() == reference)
+
+
+def _normalized(reference, options):
+    reference = _phrase(reference)
+    return lambda text: float(_phrase(text) == reference)
+
+
+def _regex(reference, options):
+    try:
+        pattern = re.compile(reference, re.IGNORECASE)
+    except re.error as exc:
+        raise ValueError(f'Invalid regular expression: {exc}')
+    return lambda text: float(pattern.fullmatch(normalized(text).text.strip()) is not None)
+
+
+def _numeric(reference, options):
+    expected = _parse_number(reference)
+    if expected is None:
+        raise ValueError('The reference answer of a numeric question must be a number.')
+    tolerance = float(options.get('tolerance', 0))
+    if options.get('relative'):
+        tolerance *= abs(expected)
+
+    def grade(text):
+        value = _parse_number(text)
+        return float(value is not None and abs(value - expected) <= tolerance)
+    return grade
+
+
+def _keywords(reference, options):
+    keywords = {_phrase(keyword) for keyword in _KEYWORD_SEPARATORS.split(reference)} - {''}
+    if not keywords:
+        raise ValueError('A keywords question needs at least one keyword.')
+
+    def grade(text):
+        words = f' {_phrase(text)} '
+        return sum(f' {keyword} ' in words for keyword in keywords) / len(keywords)
+    return grade
+
+
+# Grading rule -> builder of a ``text -> fraction`` function from the reference and options.
+RULES = {
+    Question.EXACT: _exact,
+    Question.NORMALIZED: _normalized,
+    Question.REGEX: _regex,
+    Question.NUMERIC: _numeric,
+    Question.KEYWORDS: _keywords,
+}
+
+
+@lru_cache(maxsize=1024)
+def _compile(rule, reference, options, points):
+    options = json.loads(options)
+    fraction = RULES[rule](reference, options)
+    threshold = float(options.get('min_coverage', 1))
+    partial = bool(options.get('partial'))
+
+    def grade(text):
+        value = fraction(text)
+        if value >= threshold:
+            return True, points
+        return False, math.floor(points * value) if partial else 0
+    return grade
+
+
+def compile_rule(rule, reference, options, points):
+    """
+    The grader of a question: a function from answer text to
+    ``(is_correct, score)``, or ``None`` for manually graded questions.
+    Raises ``ValueError`` when the reference does not fit the rule.
+    """
+    if rule == Question.MANUAL:
+        return None
+    if rule not in RULES:
+        raise ValueError(f'Unknown grading rule {rule!r}.')
+    if not isinstance(options, dict):
+        raise ValueError('Grading options must be a JSON object.')
+    return _compile(rule, reference, json.dumps(options, sort_keys=True), points)
+
+
+def graders(questions):
+    """``{question_id: grader}`` for the automatically graded ``questions`` (a ``Question`` queryset)."""
+    compiled = {}
+    rows = questions.exclude(grading_rule=Question.MANUAL).values_list(
+        'id', 'grading_rule', 'reference_answer', 'grading_options', 'points',
+    )
+    for question_id, rule, reference, options, points in rows:
+        try:
+            compiled[question_id] = compile_rule(rule, reference, options, points)
+        except ValueError:
+            logger.warning('Question %s has an invalid grading rule, grading it manually', question_id, exc_info=True)
+    return compiled
+
+
+def compile_exam(exam):
+    """The graders of ``exam``'s questions."""
+    return graders(Question.objects.filter(exam=exam))
+
+
+def grade_rows(rows):
+    """
+    Grade ``rows`` (``{(user_id, question_id): answer_text}``) as
+    ``{(user_id, question_id): (is_correct, score)}``; manually graded
+    questions are left out.
+    """
+    compiled = graders(Question.objects.filter(id__in={question_id for _, question_id in rows}))
+    return {
+        (user_id, question_id): compiled[question_id](text)
+        for (user_id, question_id), text in rows.items() if question_id in compiled
+    }
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _clear(question_ids):
+    """Drop the automatic grades of manually graded questions. Returns the number of answers cleared."""
+    graded = Answer.objects.filter(question_id__in=question_ids, graded_at__isnull=False)
+    # Submissions to manually graded questions are not graded, so no rows appear meanwhile.
+    keys = list(graded.values_list('user_id', 'question_id'))
+    if not keys:
+        return 0
+    with transaction.atomic():
+        graded.update(is_correct=None, score=0, graded_at=None)
+        stats.answers_changed(keys)
+    return len(keys)
+
+
+def grade_questions(questions, regrade=False, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Grade the answers to ``questions`` (a ``Question`` queryset): only the
+    ones not graded yet, or all of them with ``regrade``. Answers are read
+    ``chunk_size`` at a time by primary key; per chunk, the changed grades
+    are written with one ``UPDATE`` per distinct grade. The statistics of
+    the touched students are refreshed at the end (also when the pass
+    fails midway). Answers resubmitted meanwhile are graded by their
+    submission and left alone. ``progress(done, total)`` is called after
+    every chunk. Returns the number of answers whose grade changed.
+    """
+    compiled = graders(questions)
+    changed = _clear(questions.filter(grading_rule=Question.MANUAL).values('id'))
+    if not compiled:
+        return changed
+    started = timezone.now()
+    current = Answer.objects.filter(submitted_at__lte=started)
+    answers = current.filter(question_id__in=list(compiled))
+    if not regrade:
+        answers = answers.filter(graded_at__isnull=True)
+    # The ids first, then the texts a chunk at a time: no read cursor stays
+    # open across the writes, which would deadlock parallel workers on SQLite.
+    answer_ids = list(answers.order_by('id').values_list('id', flat=True))
+    total = len(answer_ids)
+    done = 0
+    touched = set()
+    try:
+        for ids in _chunks(answer_ids, chunk_size):
+            chunk = current.filter(id__in=ids).values_list(
+                'id', 'user_id', 'question_id', 'answer_text', 'is_correct', 'score', 'graded_at',
+            )
+            regraded, stamped = defaultdict(list), []
+            for answer_id, user_id, question_id, text, is_correct, score, graded_at in chunk:
+                grade = compiled[question_id](text)
+                if grade != (is_correct, score):
+                    regraded[grade].append(answer_id)
+                    touched.add((user_id, question_id))
+                elif graded_at is None:
+                    stamped.append(answer_id)
+            with transaction.atomic():
+                for (is_correct, score), graded_ids in regraded.items():
+                    current.filter(id__in=graded_ids).update(is_correct=is_correct, score=score, graded_at=started)
+                if stamped:
+                    current.filter(id__in=stamped).update(graded_at=started)
+            done += len(ids)
+            if progress:
+                progress(done, total)
+    finally:
+        # Chunks in table order each touch most of the students, so their
+        # totals are refreshed once at the end, a batch of students at a time.
+        for keys in _chunks(sorted(touched), chunk_size):
+            stats.answers_changed(keys)
+    return changed + len(touched)
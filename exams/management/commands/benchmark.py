@@ -0,0 +1,246 @@
+import itertools
+import json
+import math
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from analysis.engine import analyze_exam
+from exams.models import Answer, Exam
+from exams.submissions import count_queries
+
+ADMIN_CHANGELISTS = (
+    'admin:exams_exam_changelist',
+    'admin:exams_question_changelist',
+    'admin:exams_answer_changelist',
+    'admin:responses_studentresponse_changelist',
+    'admin:analysis_analysisresult_changelist',
+    'admin:accounts_user_changelist',
+)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted ``values``: the smallest value with ``fraction`` of them at or below it."""
+    # Rounded first so that float error (0.07 * 100 = 7.000000000000001) does not move up a rank.
+    return values[min(len(values) - 1, max(0, math.ceil(round(fraction * len(values), 9)) - 1))]
+
+
+def answer_forms(question_ids):
+    """
+    Build a different exam form on every call: an unchanged resubmission is
+    a no-op for the answer upsert, so repeating one form would only measure
+    the comparison.
+    """
+    sequence = itertools.count()
+
+    def form():
+        number = next(sequence)
+        return {f'answer_{question_id}': f'پاسخ بنچمارک {number} {question_id}' for question_id in question_ids}
+    return form
+
+
+def summarize(timings, queries, statuses, wall_time=None):
+    timings = sorted(timings)
+    total = sum(timings)
+    wall_time = wall_time or total
+    return {
+        'requests': len(timings),
+        'throughput_per_second': round(len(timings) / wall_time, 2) if wall_time else None,
+        'latency_ms': {
+            name: round(value * 1000, 3) for name, value in (
+                ('mean', total / len(timings)),
+                ('p50', percentile(timings, 0.50)),
+                ('p95', percentile(timings, 0.95)),
+                ('p99', percentile(timings, 0.99)),
+                ('max', timings[-1]),
+            )
+        },
+        'queries_per_request': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+        'status_codes': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the exam views, the admin changelists and the analysis engine through the test client '
+        'and write throughput, p50/p95/p99 latency and queries per request to a JSON file. '
+        'The submission scenarios write answers; run it against a benchmark database '
+        '(see generate_exam_data).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--requests', type=int, default=100, help='Requests per view scenario.')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Concurrent clients per view scenario, each with its own database connection; '
+                                 'the exam views log every client in as a different student.')
+        parser.add_argument('--analysis-runs', type=int, default=3)
+        parser.add_argument('--admin', help='Superuser for the admin scenarios (default: any superuser).')
+        parser.add_argument('--only', nargs='+', help='Run only scenarios whose name starts with one of these.')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline', help='Earlier output to compare against.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests and --threads must be at least 1')
+        try:
+            exam = Exam.objects.select_related('created_by').get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist")
+        # One student per thread, so that concurrent submissions do not update the same rows.
+        students = list(get_user_model().objects.filter(
+            id__in=Answer.objects.filter(question__exam=exam).values('user_id'),
+        ).order_by('id')[:options['threads']])
+        if not students:
+            raise CommandError('The exam has no answers; generate data with generate_exam_data first')
+        if len(students) < options['threads']:
+            raise CommandError(f'The exam has answers from only {len(students)} students; use at most that many threads')
+        admins = get_user_model().objects.filter(is_superuser=True)
+        if options['admin']:
+            admins = admins.filter(username=options['admin'])
+        admin = admins.first()
+
+        self.only = options['only']
+        self.scenarios = {}
+        question_ids = list(exam.questions.values_list('id', flat=True))
+        form = answer_forms(question_ids)
+
+        self.run_view('questions_view GET', students, 'get', reverse('exams:exam_detail', args=[exam.id]), options)
+        self.run_view('questions_view POST', students, 'post', reverse('exams:exam_detail', args=[exam.id]), options,
+                      data=form)
+        self.run_view('take_exam GET', students, 'get', reverse('response:take_exam', args=[exam.id]), options)
+        self.run_view('take_exam POST', students, 'post', reverse('response:take_exam', args=[exam.id]), options,
+                      data=form)
+
+        self.run_view('exam_report GET', exam.created_by, 'get', reverse('exams:exam_report', args=[exam.id]), options)
+
+        if admin is None:
+            self.stderr.write('No superuser found; skipping the admin changelists')
+        else:
+            for name in ADMIN_CHANGELISTS:
+                self.run_view(f'admin {name.split(":")[1]}', admin, 'get', reverse(name), options)
+
+        self.run_analysis(exam, options['analysis_runs'])
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'database_profile': settings.DATABASE_PROFILE,
+                'cache': settings.CACHES['default']['BACKEND'],
+            },
+            'exam': {
+                'id': exam.id,
+                'questions': len(question_ids),
+                'answers': Answer.objects.filter(question__exam=exam).count(),
+            },
+            'scenarios': self.scenarios,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f"Wrote {options['output']}")
+        if options['baseline']:
+            self.compare(json.loads(Path(options['baseline']).read_text(encoding='utf-8')))
+
+    def selected(self, name):
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def run_view(self, name, users, method, url, options, data=None):
+        """
+        Request ``url`` from ``--threads`` clients, logged in as ``users``
+        (one user, or one per thread). ``data`` is a dict, or a callable
+        returning the data of each request.
+        """
+        if not self.selected(name):
+            return
+        threads = options['threads']
+        if not isinstance(users, list):
+            users = [users] * threads
+        shares = [options['requests'] // threads + (i < options['requests'] % threads) for i in range(threads)]
+        # Every thread gets a client logged in on its own: the test client's
+        # cookie jar is not safe to share between threads. Errors such as
+        # "database is locked" are counted as 500s.
+        clients = [Client(SERVER_NAME='localhost', raise_request_exception=False) for _ in range(threads)]
+        for client, user in zip(clients, users):
+            client.force_login(user)
+        request_data = data if callable(data) else lambda: data
+        getattr(clients[0], method)(url, request_data())  # warm caches
+        results = []
+
+        def worker(client, count):
+            try:
+                for _ in range(count):
+                    payload = request_data()
+                    with count_queries() as counter:
+                        started = time.perf_counter()
+                        response = getattr(client, method)(url, payload)
+                        elapsed = time.perf_counter() - started
+                    results.append((elapsed, counter['count'], response.status_code))
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(worker, clients, shares))
+        wall_time = time.perf_counter() - started
+        timings, queries, statuses = zip(*results)
+        summary = summarize(timings, queries, list(statuses), wall_time)
+        summary['threads'] = threads
+        self.record(name, summary)
+
+    def run_analysis(self, exam, runs):
+        name = 'analysis engine'
+        if not self.selected(name) or runs < 1:
+            return
+        timings, queries = [], []
+        for _ in range(runs):
+            with count_queries() as counter:
+                started = time.perf_counter()
+                analyze_exam(exam, save=False)
+                timings.append(time.perf_counter() - started)
+            queries.append(counter['count'])
+        self.record(name, summarize(timings, queries, []))
+
+    def record(self, name, summary):
+        self.scenarios[name] = summary
+        latency = summary['latency_ms']
+        self.stdout.write(
+            f"{name:45} {summary['throughput_per_second'] or 0:9.1f}/s  p50 {latency['p50']:9.2f} ms  "
+            f"p95 {latency['p95']:9.2f} ms  p99 {latency['p99']:9.2f} ms  "
+            f"{summary['queries_per_request']['mean']:6.1f} queries"
+        )
+
+    def compare(self, baseline):
+        self.stdout.write(f"\nCompared with {baseline.get('revision') or 'baseline'}:")
+        for name, summary in self.scenarios.items():
+            before = baseline.get('scenarios', {}).get(name)
+            if before is None:
+                continue
+            p50, old_p50 = summary['latency_ms']['p50'], before['latency_ms']['p50']
+            change = (p50 - old_p50) / old_p50 * 100 if old_p50 else 0
+            self.stdout.write(
+                f"{name:45} p50 {old_p50:9.2f} -> {p50:9.2f} ms ({change:+.1f}%)  queries "
+                f"{before['queries_per_request']['mean']} -> {summary['queries_per_request']['mean']}"
+            )
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams import submission_queue
+
+
+class Command(BaseCommand):
+    help = 'Write queued (write-behind) exam submissions to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep draining until interrupted.')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to sleep when the queue is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            applied = submission_queue.drain(options['batch_size'])
+            if applied:
+                self.stdout.write(f'Applied {applied} queued submissions')
+            elif not options['loop']:
+                break
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from exams import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic instructors, exams, questions, students and answers (with planted '
+        'near-duplicates) for load tests and benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instructors', type=int, default=2)
+        parser.add_argument('--exams', type=int, default=2, help='Exams per instructor.')
+        parser.add_argument('--questions', type=int, default=5, help='Questions per exam.')
+        parser.add_argument('--students', type=int, default=200, help='Students; each answers every question.')
+        parser.add_argument('--duplicate-rate', type=float, default=0.02,
+                            help='Fraction of answers copied from another student with a few words changed.')
+        parser.add_argument('--words', type=int, default=40, help='Mean answer length in words.')
+        parser.add_argument('--responses', action='store_true', help='Also create legacy StudentResponse rows (input for merge_responses).')
+        parser.add_argument('--prefix', default='bench', help='Username prefix of the generated users.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = synthetic.generate(
+                instructors=options['instructors'], exams=options['exams'], questions=options['questions'],
+                students=options['students'], duplicate_rate=options['duplicate_rate'], words=options['words'],
+                responses=options['responses'], prefix=options['prefix'], seed=options['seed'],
+                log=self.stdout.write,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created exams {created['exams']} with {created['planted_duplicates']} planted near-duplicates"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from exams import grading, tasks
+from exams.models import Exam, Question
+
+
+class Command(BaseCommand):
+    help = 'Grade the answers to automatically graded questions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int, help='Exams to grade (default: all).')
+        parser.add_argument('--regrade', action='store_true', help='Grade every answer again, not only ungraded ones.')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue one job per question for run_jobs workers instead of grading here.')
+        parser.add_argument('--chunk-size', type=int, default=grading.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.all()
+        if options['exam_ids']:
+            exams = exams.filter(id__in=options['exam_ids'])
+        for exam in exams.iterator():
+            questions = Question.objects.filter(exam=exam)
+            if options['background']:
+                jobs = tasks.enqueue_grading(questions.values_list('id', flat=True), regrade=options['regrade'])
+                self.stdout.write(f'Queued {len(jobs)} grading jobs for exam {exam.id} ({exam.title})')
+                continue
+            changed = grading.grade_questions(questions, regrade=options['regrade'], chunk_size=options['chunk_size'])
+            self.stdout.write(f'Graded exam {exam.id} ({exam.title}): {changed} grades changed')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from exams import stats
+from exams.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized per-student summaries and per-question statistics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int, help='Exams to rebuild (default: all).')
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.all()
+        if options['exam_ids']:
+            exams = exams.filter(id__in=options['exam_ids'])
+        for exam in exams.iterator():
+            stats.rebuild_exam(exam)
+            self.stdout.write(f'Rebuilt statistics for exam {exam.id} ({exam.title})')
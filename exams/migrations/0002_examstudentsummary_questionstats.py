@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+
+def populate_summaries(apps, schema_editor):
+    Answer = apps.get_model('exams', 'Answer')
+    Question = apps.get_model('exams', 'Question')
+    ExamStudentSummary = apps.get_model('exams', 'ExamStudentSummary')
+    QuestionStats = apps.get_model('exams', 'QuestionStats')
+
+    rows = (
+        Answer.objects.values('question__exam_id', 'user_id')
+        .annotate(total_score=Sum('score'), answered=Count('id'), last_submitted=Max('submitted_at'))
+        .order_by()
+    )
+    ExamStudentSummary.objects.bulk_create(
+        [
+            ExamStudentSummary(
+                exam_id=row['question__exam_id'], user_id=row['user_id'], total_score=row['total_score'] or 0,
+                answered=row['answered'], last_submitted=row['last_submitted'],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=500,
+    )
+    # Question statistics are computed lazily the first time a report reads them.
+    now = timezone.now()
+    QuestionStats.objects.bulk_create(
+        [
+            QuestionStats(question_id=question_id, exam_id=exam_id, dirty_at=now)
+            for question_id, exam_id in Question.objects.values_list('id', 'exam_id').iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamStudentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_score', models.IntegerField(default=0)),
+                ('answered', models.IntegerField(default=0)),
+                ('last_submitted', models.DateTimeField(blank=True, null=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_summaries', to='exams.exam')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['exam', '-total_score'], name='exams_exams_exam_id_269e3a_idx')],
+                'unique_together': {('exam', 'user')},
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submissions', models.IntegerField(default=0)),
+                ('graded', models.IntegerField(default=0)),
+                ('correct', models.IntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('length_histogram', models.JSONField(default=list)),
+                ('dirty_at', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='exams.exam')),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='exams.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['exam', 'dirty_at'], name='exams_quest_exam_id_8cc16c_idx')],
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
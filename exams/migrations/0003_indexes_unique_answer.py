@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+
+def remove_duplicate_answers(apps, schema_editor):
+    """Keep only the newest answer of each (user, question) before adding the unique constraint."""
+    Answer = apps.get_model('exams', 'Answer')
+    ExamStudentSummary = apps.get_model('exams', 'ExamStudentSummary')
+    QuestionStats = apps.get_model('exams', 'QuestionStats')
+
+    duplicates = (
+        Answer.objects.values('user_id', 'question_id', 'question__exam_id')
+        .annotate(count=Count('id'), newest=Max('id'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for row in duplicates.iterator():
+        Answer.objects.filter(
+            user_id=row['user_id'], question_id=row['question_id'], id__lt=row['newest'],
+        ).delete()
+        totals = Answer.objects.filter(
+            user_id=row['user_id'], question__exam_id=row['question__exam_id'],
+        ).aggregate(total_score=Sum('score'), answered=Count('id'), last_submitted=Max('submitted_at'))
+        ExamStudentSummary.objects.filter(
+            user_id=row['user_id'], exam_id=row['question__exam_id'],
+        ).update(total_score=totals['total_score'] or 0, answered=totals['answered'],
+                 last_submitted=totals['last_submitted'])
+        QuestionStats.objects.filter(question_id=row['question_id']).update(dirty_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0002_examstudentsummary_questionstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['created_by', 'start_time'], name='exams_exam_created_8ae3d9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['start_time', 'end_time'], name='exams_exam_start_t_495a08_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['exam', 'order'], name='exams_quest_exam_id_4ac027_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_answer_per_user_question'),
+        ),
+    ]
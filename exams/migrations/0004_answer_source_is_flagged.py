@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_indexes_unique_answer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='is_flagged',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='source',
+            field=models.CharField(choices=[('exam', 'Questions page'), ('response', 'Take exam')], default='exam', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'submitted_at'], name='exams_answe_questio_e8a5e0_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_answer_source_is_flagged'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='graded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='grading_options',
+            field=models.JSONField(blank=True, default=dict, help_text='مثلا {"tolerance": 0.5} یا {"min_coverage": 0.6, "partial": true}'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='grading_rule',
+            field=models.CharField(choices=[('manual', 'تصحیح دستی'), ('exact', 'برابری دقیق'), ('normalized', 'برابری پس از یکسان\u200cسازی متن'), ('regex', 'عبارت باقاعده'), ('numeric', 'عدد با خطای مجاز'), ('keywords', 'پوشش کلیدواژه\u200cها')], default='manual', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='reference_answer',
+            field=models.TextField(blank=True, help_text='پاسخ مرجع؛ برای قاعده\u200cی کلیدواژه\u200cها هر کلیدواژه در یک سطر.'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.conf import settings
 
@@ -14,31 +15,142 @@ class Exam(models.Model):
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'start_time']),
+            models.Index(fields=['start_time', 'end_time']),
+        ]
+
 
 class Question(models.Model):
+    """
+    A question of an exam. ``grading_rule`` and ``reference_answer`` (with
+    the rule's ``grading_options``) let ``exams.grading`` score answers
+    automatically; ``MANUAL`` questions are left to the instructor.
+    """
+    MANUAL = 'manual'
+    EXACT = 'exact'
+    NORMALIZED = 'normalized'
+    REGEX = 'regex'
+    NUMERIC = 'numeric'
+    KEYWORDS = 'keywords'
+    GRADING_RULES = [
+        (MANUAL, 'تصحیح دستی'),
+        (EXACT, 'برابری دقیق'),
+        (NORMALIZED, 'برابری پس از یکسان‌سازی متن'),
+        (REGEX, 'عبارت باقاعده'),
+        (NUMERIC, 'عدد با خطای مجاز'),
+        (KEYWORDS, 'پوشش کلیدواژه‌ها'),
+    ]
+
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='questions')
     text = models.TextField()
     points = models.IntegerField(default=1)
     order = models.IntegerField(default=0)
+    grading_rule = models.CharField(max_length=10, choices=GRADING_RULES, default=MANUAL)
+    reference_answer = models.TextField(
+        blank=True, help_text='پاسخ مرجع؛ برای قاعده‌ی کلیدواژه‌ها هر کلیدواژه در یک سطر.',
+    )
+    grading_options = models.JSONField(
+        default=dict, blank=True, help_text='مثلا {"tolerance": 0.5} یا {"min_coverage": 0.6, "partial": true}',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.exam.title} - Question {self.order}"
 
+    def clean(self):
+        from .grading import compile_rule
+
+        try:
+            compile_rule(self.grading_rule, self.reference_answer, self.grading_options, self.points)
+        except ValueError as exc:
+            raise ValidationError({'reference_answer': str(exc)})
+
     class Meta:
         ordering = ['order']
+        indexes = [models.Index(fields=['exam', 'order'])]
 
 
 class Answer(models.Model):
+    """
+    A student's answer to a question, whichever view it was submitted
+    through (``source``). Also holds the rows merged from the legacy
+    ``responses.StudentResponse`` table.
+    """
+    EXAM = 'exam'
+    RESPONSE = 'response'
+    SOURCES = [
+        (EXAM, 'Questions page'),
+        (RESPONSE, 'Take exam'),
+    ]
+
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     answer_text = models.TextField()
     submitted_at = models.DateTimeField(auto_now_add=True)
+    source = models.CharField(max_length=10, choices=SOURCES, default=EXAM)
+    is_flagged = models.BooleanField(default=False)
 
     # فیلدهای اضافه شده برای ارزیابی و تشخیص تقلب
     is_correct = models.BooleanField(null=True, blank=True)
     score = models.IntegerField(default=0)
+    # When ``exams.grading`` last scored the answer; older than ``submitted_at`` means not graded yet.
+    graded_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.question.exam.title} - Q{self.question.order}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='unique_answer_per_user_question'),
+        ]
+        # Incremental analysis reads the answers of an exam's questions submitted since its last run.
+        indexes = [models.Index(fields=['question', 'submitted_at'])]
+
+
+class ExamStudentSummary(models.Model):
+    """Materialized per-(exam, student) totals, maintained by ``exams.stats``."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='student_summaries')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    total_score = models.IntegerField(default=0)
+    answered = models.IntegerField(default=0)
+    last_submitted = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.exam_id}: {self.total_score}"
+
+    class Meta:
+        unique_together = ['exam', 'user']
+        indexes = [models.Index(fields=['exam', '-total_score'])]
+
+
+class QuestionStats(models.Model):
+    """
+    Materialized per-question statistics, maintained by ``exams.stats``.
+    ``dirty_at`` is set when answers change and cleared on recomputation.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='stats')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='question_stats')
+    submissions = models.IntegerField(default=0)
+    graded = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    length_histogram = models.JSONField(default=list)
+    dirty_at = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Stats for question {self.question_id}"
+
+    @property
+    def mean_score(self):
+        return self.total_score / self.submissions if self.submissions else None
+
+    @property
+    def correct_rate(self):
+        return self.correct / self.graded if self.graded else None
+
+    class Meta:
+        indexes = [models.Index(fields=['exam', 'dirty_at'])]
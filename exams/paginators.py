@@ -0,0 +1,41 @@
+"""
+Paginator for admin changelists of large tables.
+
+Counting every row of a large table on each changelist page is the slowest
+query of the page. For an unfiltered queryset the paginator reports the
+database's row estimate instead (``pg_class.reltuples`` on PostgreSQL, the
+highest primary key on SQLite) once it exceeds ``ESTIMATE_THRESHOLD``;
+filtered querysets and small tables are counted exactly.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = 10_000
+
+
+def estimated_row_count(model, using='default'):
+    """Cheap estimate of the number of rows of ``model``'s table, or ``None``."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 for tables that were never analyzed.
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
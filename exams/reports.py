@@ -0,0 +1,127 @@
+"""
+Exam report queries.
+
+Summaries come from the materialized tables kept by ``exams.stats``,
+answer listings use keyset pagination on ``Answer.id`` (or the full-text
+index, for searches) and exports stream
+rows with server-side chunked iteration, so no report needs all answers of
+an exam in memory.
+"""
+import csv
+import json
+
+from search.models import SearchDocument
+from search.query import search
+
+from . import stats
+from .models import Answer, ExamStudentSummary
+
+REPORT_PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = (
+    'answer_id', 'user_id', 'username', 'question_id', 'question_order',
+    'answer_text', 'is_correct', 'score', 'submitted_at',
+)
+
+
+def exam_answers(exam):
+    return Answer.objects.filter(question__exam=exam)
+
+
+def student_totals(exam):
+    """Per-student total score, answered count and last submission time."""
+    return (
+        ExamStudentSummary.objects.filter(exam=exam)
+        .select_related('user')
+        .only('total_score', 'answered', 'last_submitted', 'user__username')
+        .order_by('-total_score', 'user__username')
+    )
+
+
+def question_stats(exam):
+    """Per-question submission count, mean score, correctness rate and answer length histogram."""
+    return stats.question_stats(exam)
+
+
+def answer_page(exam, after=0, page_size=REPORT_PAGE_SIZE):
+    """
+    Return ``(answers, next_after)`` for the page of answers with ids above
+    ``after``; ``next_after`` is ``None`` on the last page.
+    """
+    answers = list(
+        exam_answers(exam)
+        .filter(id__gt=after)
+        .select_related('user', 'question')
+        .only('id', 'answer_text', 'is_correct', 'score', 'user__username', 'question__text')
+        .order_by('id')[:page_size + 1]
+    )
+    next_after = answers[page_size - 1].id if len(answers) > page_size else None
+    return answers[:page_size], next_after
+
+
+def search_answers(exam, query, limit=REPORT_PAGE_SIZE):
+    """The ``limit`` answers of ``exam`` that best match the full-text ``query``, best first."""
+    hits = search(query, kinds=[SearchDocument.ANSWER], exam_id=exam.id, limit=limit)
+    answers = (
+        exam_answers(exam)
+        .filter(id__in=[hit.object_id for hit in hits])
+        .select_related('user', 'question')
+        .only('id', 'answer_text', 'is_correct', 'score', 'user__username', 'question__text')
+        .in_bulk()
+    )
+    return [answers[hit.object_id] for hit in hits if hit.object_id in answers]
+
+
+async def aanswer_page(exam, after=0, page_size=REPORT_PAGE_SIZE):
+    """Async version of ``answer_page``."""
+    answers = [
+        answer async for answer in
+        exam_answers(exam)
+        .filter(id__gt=after)
+        .select_related('user', 'question')
+        .only('id', 'answer_text', 'is_correct', 'score', 'user__username', 'question__text')
+        .order_by('id')[:page_size + 1]
+    ]
+    next_after = answers[page_size - 1].id if len(answers) > page_size else None
+    return answers[:page_size], next_after
+
+
+def export_rows(exam):
+    rows = (
+        exam_answers(exam)
+        .order_by('id')
+        .values_list(
+            'id', 'user_id', 'user__username', 'question_id', 'question__order',
+            'answer_text', 'is_correct', 'score', 'submitted_at',
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for row in rows:
+        yield row[:-1] + (row[-1].isoformat(),)
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(exam):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in export_rows(exam):
+        yield writer.writerow(row)
+
+
+def export_jsonl(exam):
+    for row in export_rows(exam):
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+
+
+# Format -> (row generator, content type)
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (export_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, stats, tasks
+from .models import Answer, Exam, Question
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, **kwargs):
+    stats.answers_changed([(instance.user_id, instance.question_id)])
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    # Deferred to commit: when the question itself is being deleted in the
+    # same transaction there is nothing left to refresh.
+    key = (instance.user_id, instance.question_id)
+    transaction.on_commit(lambda: stats.answers_changed([key]))
+
+
+# The version token is replaced once the change is committed: replaced
+# before, a concurrent reader could cache the old rows under the new token.
+@receiver(post_save, sender=Exam)
+@receiver(post_delete, sender=Exam)
+def exam_changed(sender, instance, **kwargs):
+    exam_id = instance.id
+    transaction.on_commit(lambda: cache.invalidate_exam(exam_id))
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    exam_id = instance.exam_id
+    transaction.on_commit(lambda: cache.invalidate_exam(exam_id))
+
+
+# Fields whose change calls for re-grading the question's answers.
+GRADING_FIELDS = ('grading_rule', 'reference_answer', 'grading_options', 'points')
+
+
+@receiver(pre_save, sender=Question)
+def question_grading_changing(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and not set(GRADING_FIELDS) & set(update_fields)):
+        instance._grading_changed = False
+        return
+    old = Question.objects.filter(pk=instance.pk).values(*GRADING_FIELDS).first()
+    instance._grading_changed = old is not None and any(
+        old[field] != getattr(instance, field) for field in GRADING_FIELDS
+    )
+
+
+@receiver(post_save, sender=Question)
+def question_grading_changed(sender, instance, **kwargs):
+    if getattr(instance, '_grading_changed', False):
+        question_id = instance.id
+        transaction.on_commit(lambda: tasks.enqueue_grading([question_id]))
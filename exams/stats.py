@@ -0,0 +1,190 @@
+"""
+Maintenance of the materialized ``ExamStudentSummary`` and ``QuestionStats``
+tables.
+
+Writers call ``answers_changed`` with the (user, question) pairs they
+touched (signals cover single ``Answer`` saves and deletes; bulk writers
+call it explicitly). Student summaries are recomputed immediately for the
+affected (exam, student) pairs, which only reads that student's answers.
+Question statistics are only marked dirty, because recomputing them reads
+every answer of the question; ``question_stats`` recomputes dirty rows
+when a report asks for them.
+
+At a deadline every student of an exam writes to the same questions, so
+marking must not queue the submissions on the ``QuestionStats`` rows: it
+runs after the writer's transaction commits and only writes rows that
+are still clean. A recomputation clears the mark before it reads the
+answers, so an answer committed meanwhile marks the row dirty again.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import Answer, ExamStudentSummary, Question, QuestionStats
+
+# Upper bounds (in characters) of the answer length histogram buckets; a
+# final bucket holds everything longer.
+LENGTH_BUCKETS = (50, 100, 200, 500, 1000, 2000)
+
+
+def answers_changed(keys):
+    """Record that the answers for ``keys`` (``(user_id, question_id)`` pairs) changed."""
+    keys = set(keys)
+    if not keys:
+        return
+    question_exams = dict(
+        Question.objects.filter(id__in={question_id for _, question_id in keys}).values_list('id', 'exam_id')
+    )
+    mark_questions_dirty(question_exams)
+    refresh_student_summaries({
+        (question_exams[question_id], user_id)
+        for user_id, question_id in keys if question_id in question_exams
+    })
+
+
+def mark_questions_dirty(question_exams):
+    """
+    Flag the stats of ``question_exams`` (``{question_id: exam_id}``) for
+    recomputation once the current transaction commits.
+    """
+    question_exams = dict(question_exams)
+    if question_exams:
+        transaction.on_commit(lambda: _mark_dirty(question_exams))
+
+
+def _mark_dirty(question_exams):
+    now = timezone.now()
+    QuestionStats.objects.bulk_create(
+        [
+            QuestionStats(question_id=question_id, exam_id=exam_id, dirty_at=now)
+            for question_id, exam_id in question_exams.items()
+        ],
+        ignore_conflicts=True,
+    )
+    QuestionStats.objects.filter(question_id__in=question_exams, dirty_at__isnull=True).update(dirty_at=now)
+
+
+def refresh_student_summaries(exam_users):
+    """Recompute the summaries of ``exam_users`` (``(exam_id, user_id)`` pairs)."""
+    exam_users = set(exam_users)
+    if not exam_users:
+        return
+    rows = (
+        Answer.objects.filter(
+            question__exam_id__in={exam_id for exam_id, _ in exam_users},
+            user_id__in={user_id for _, user_id in exam_users},
+        )
+        .values('question__exam_id', 'user_id')
+        .annotate(total_score=Sum('score'), answered=Count('id'), last_submitted=Max('submitted_at'))
+        .order_by()
+    )
+    summaries = [
+        ExamStudentSummary(
+            exam_id=row['question__exam_id'], user_id=row['user_id'], total_score=row['total_score'] or 0,
+            answered=row['answered'], last_submitted=row['last_submitted'],
+        )
+        for row in rows if (row['question__exam_id'], row['user_id']) in exam_users
+    ]
+    ExamStudentSummary.objects.bulk_create(
+        summaries,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['exam', 'user'],
+        update_fields=['total_score', 'answered', 'last_submitted'],
+    )
+    emptied = exam_users - {(summary.exam_id, summary.user_id) for summary in summaries}
+    if emptied:
+        condition = Q()
+        for exam_id, user_id in emptied:
+            condition |= Q(exam_id=exam_id, user_id=user_id)
+        ExamStudentSummary.objects.filter(condition).delete()
+
+
+def _length_bucket_aggregates():
+    aggregates = {}
+    lower = None
+    for index, upper in enumerate(LENGTH_BUCKETS + (None,)):
+        condition = Q()
+        if lower is not None:
+            condition &= Q(length__gt=lower)
+        if upper is not None:
+            condition &= Q(length__lte=upper)
+        aggregates[f'length_{index}'] = Count('id', filter=condition)
+        lower = upper
+    return aggregates
+
+
+def refresh_question_stats(questions):
+    """Recompute the stats of ``questions`` (``{question_id: exam_id}``)."""
+    if not questions:
+        return
+    started = timezone.now()
+    QuestionStats.objects.filter(question_id__in=questions, dirty_at__isnull=False).update(dirty_at=None)
+    try:
+        _write_question_stats(questions, started)
+    except Exception:
+        # Inside a transaction the cleared marks are rolled back with it.
+        if not transaction.get_connection().in_atomic_block:
+            _mark_dirty(questions)
+        raise
+
+
+def _write_question_stats(questions, started):
+    rows = {
+        row['question_id']: row
+        for row in Answer.objects.filter(question_id__in=questions)
+        .alias(length=Length('answer_text'))
+        .values('question_id')
+        .annotate(
+            submissions=Count('id'),
+            graded=Count('id', filter=Q(is_correct__isnull=False)),
+            correct=Count('id', filter=Q(is_correct=True)),
+            total_score=Sum('score'),
+            **_length_bucket_aggregates(),
+        )
+        .order_by()
+    }
+    stats = []
+    for question_id, exam_id in questions.items():
+        row = rows.get(question_id, {})
+        stats.append(QuestionStats(
+            question_id=question_id,
+            exam_id=exam_id,
+            submissions=row.get('submissions', 0),
+            graded=row.get('graded', 0),
+            correct=row.get('correct', 0),
+            total_score=row.get('total_score') or 0,
+            length_histogram=[row.get(f'length_{i}', 0) for i in range(len(LENGTH_BUCKETS) + 1)],
+            computed_at=started,
+        ))
+    QuestionStats.objects.bulk_create(
+        stats,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['question'],
+        update_fields=['exam', 'submissions', 'graded', 'correct', 'total_score', 'length_histogram', 'computed_at'],
+    )
+
+
+def question_stats(exam):
+    """Up-to-date ``QuestionStats`` of every question of ``exam``, in question order."""
+    stale = dict(
+        exam.questions.filter(Q(stats__isnull=True) | Q(stats__dirty_at__isnull=False))
+        .values_list('id', 'exam_id')
+    )
+    refresh_question_stats(stale)
+    return list(
+        QuestionStats.objects.filter(exam=exam).select_related('question')
+        .order_by('question__order', 'question_id')
+    )
+
+
+def rebuild_exam(exam):
+    """Recompute every summary and statistic of ``exam`` from its answers."""
+    ExamStudentSummary.objects.filter(exam=exam).delete()
+    refresh_student_summaries(
+        (exam.id, user_id)
+        for user_id in Answer.objects.filter(question__exam=exam).values_list('user_id', flat=True).distinct()
+    )
+    refresh_question_stats(dict(exam.questions.values_list('id', 'exam_id')))
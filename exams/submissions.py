@@ -0,0 +1,240 @@
+"""
+Bulk answer submission.
+
+A submitted exam form is written with a constant number of queries,
+whatever the number of questions: one ``INSERT ... ON CONFLICT`` upsert
+per 500 answers plus the statistics and search index refresh, inside a
+single transaction. A resubmitted answer whose text is unchanged is not
+written: it keeps its ``submitted_at`` (the time of the submission that
+last changed it) and its grade. Statistics and search documents are
+refreshed only for the answers that changed, and incremental analysis
+and the fingerprint index, which pick up answers by ``submitted_at``, do
+not process the unchanged ones again. Answers to automatically graded
+questions are graded as they are written (``exams.grading``);
+answers to manually graded questions keep the grade the instructor gave.
+``asubmit_answers`` is the same write for async views. With
+``SUBMISSION_WRITE_BEHIND`` the same writes are deferred to
+``exams.submission_queue``.
+
+Both ``questions_view`` and ``take_exam`` store ``Answer`` rows, told apart
+by ``Answer.source``. While legacy ``StudentResponse`` rows still exist
+(see ``responses.merge``), ``saved_answers`` reads them too.
+"""
+import logging
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from responses.models import StudentResponse
+from search import index as search_index
+from . import grading, stats, submission_queue
+from .models import Answer
+
+logger = logging.getLogger(__name__)
+
+
+def collect_answers(question_ids, data):
+    """Map each question id to its non-blank ``answer_<id>`` value in ``data``."""
+    answers = {}
+    for question_id in question_ids:
+        answer_text = data.get(f'answer_{question_id}')
+        if answer_text and not answer_text.isspace():
+            answers[question_id] = answer_text
+    return answers
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the SQL statements executed inside the block. Yields a dict whose
+    ``count`` is filled in as queries run.
+    """
+    counter = {'count': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['count'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def submit_answers(user, answers):
+    """
+    Store a submitted form: queued for the write-behind worker when
+    ``SUBMISSION_WRITE_BEHIND`` is on, written immediately otherwise.
+    """
+    if submission_queue.is_enabled():
+        submission_queue.enqueue('answer', user.pk, answers)
+    else:
+        save_answers(user, answers)
+
+
+def save_answers(user, answers):
+    """
+    Upsert ``answers`` (``{question_id: answer_text}``) for ``user`` as
+    ``Answer`` rows. Returns the number of rows written.
+    """
+    return save_answer_rows({(user.pk, question_id): text for question_id, text in answers.items()})
+
+
+# A new text is graded again when the question has an automatic grader
+# (``excluded.graded_at`` is set); a grade entered by the instructor is kept.
+# ``answer_text`` is NOT NULL, so ``<>`` is ``IS DISTINCT FROM`` (which SQLite only has since 3.39).
+_UPSERT = (
+    'INSERT INTO {table} (user_id, question_id, answer_text, submitted_at, source, is_flagged, is_correct, score, '
+    'graded_at) VALUES {values} '
+    'ON CONFLICT (user_id, question_id) DO UPDATE SET answer_text = excluded.answer_text, '
+    'submitted_at = excluded.submitted_at, source = excluded.source, '
+    + ', '.join(
+        f'{field} = CASE WHEN excluded.graded_at IS NULL THEN {{table}}.{field} ELSE excluded.{field} END'
+        for field in ('is_correct', 'score', 'graded_at')
+    )
+    + ' WHERE {table}.answer_text <> excluded.answer_text '
+    'RETURNING id, user_id, question_id'
+)
+BATCH_SIZE = 500
+
+
+def _upsert(rows, source, grades, submitted_at=None):
+    """
+    Upsert ``rows`` ``BATCH_SIZE`` at a time; returns the ``Answer``
+    instances (with their primary keys) of the rows inserted or changed.
+    """
+    adapt = connection.ops.adapt_datetimefield_value
+    now = adapt(timezone.now())
+    submitted_at = {key: adapt(value) for key, value in (submitted_at or {}).items()}
+    items = list(rows.items())
+    written = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            params = []
+            for key, answer_text in batch:
+                is_correct, score = grades.get(key, (None, 0))
+                params += [
+                    *key, answer_text, submitted_at.get(key, now), source, False, is_correct, score,
+                    now if key in grades else None,
+                ]
+            cursor.execute(
+                _UPSERT.format(
+                    table=connection.ops.quote_name(Answer._meta.db_table),
+                    values=', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(batch)),
+                ),
+                params,
+            )
+            written += [
+                Answer(pk=answer_id, user_id=user_id, question_id=question_id,
+                       answer_text=rows[user_id, question_id])
+                for answer_id, user_id, question_id in cursor.fetchall()
+            ]
+    return written
+
+
+def save_answer_rows(rows, source=Answer.EXAM, submitted_at=None):
+    """
+    Upsert ``rows`` (``{(user_id, question_id): answer_text}``) as ``Answer``
+    rows from ``source``, possibly for many users at once, with
+    ``INSERT ... ON CONFLICT`` on the (user, question) unique constraint.
+    ``submitted_at`` maps keys of ``rows`` to the time the student submitted
+    them (the write-behind queue); other rows are stamped now. Rows whose
+    text is unchanged keep their ``submitted_at``. Returns the number of
+    rows inserted or changed.
+    """
+    if not rows:
+        return 0
+    return _save_graded_rows(rows, source, grading.grade_rows(rows), submitted_at)
+
+
+@transaction.atomic
+def _save_graded_rows(rows, source, grades, submitted_at=None):
+    answers = _upsert(rows, source, grades, submitted_at)
+    # Bulk writes bypass the Answer signals.
+    stats.answers_changed((answer.user_id, answer.question_id) for answer in answers)
+    search_index.index_answers(answers)
+    return len(answers)
+
+
+async def asubmit_answers(user, answers):
+    """Async version of ``submit_answers``."""
+    if submission_queue.is_enabled():
+        await sync_to_async(submission_queue.enqueue)('answer', user.pk, answers)
+    else:
+        await asave_answer_rows({(user.pk, question_id): text for question_id, text in answers.items()})
+
+
+async def asave_answer_rows(rows, source=Answer.EXAM):
+    """
+    Async version of ``save_answer_rows``. The upsert and the refresh of
+    the derived data run in one transaction on the ORM's worker thread: a
+    form of more than ``BATCH_SIZE`` answers takes several statements.
+    """
+    if not rows:
+        return 0
+    grades = await sync_to_async(grading.grade_rows)(rows)
+    return await sync_to_async(_save_graded_rows)(rows, source, grades)
+
+
+def _legacy_reads():
+    return getattr(settings, 'SUBMISSIONS_LEGACY_READS', True)
+
+
+def _legacy_responses(user_id, question_ids):
+    return StudentResponse.objects.filter(student_id=user_id, question_id__in=question_ids).values_list(
+        'question_id', 'answer_text', 'last_modified',
+    )
+
+
+def _newest(answers, legacy):
+    """Merge ``(question_id, text, time)`` rows, keeping the newest text per question."""
+    texts, times = {}, {}
+    for question_id, text, time in (*answers, *legacy):
+        if question_id not in times or time > times[question_id]:
+            texts[question_id], times[question_id] = text, time
+    return texts
+
+
+def saved_answers(user_id, question_ids):
+    """
+    The stored text of ``user_id``'s answers to ``question_ids`` as
+    ``{question_id: answer_text}``. With ``SUBMISSIONS_LEGACY_READS`` the
+    legacy ``StudentResponse`` rows not merged yet are read as well, and
+    the newer text wins.
+    """
+    answers = Answer.objects.filter(user_id=user_id, question_id__in=question_ids).values_list(
+        'question_id', 'answer_text', 'submitted_at',
+    )
+    if not _legacy_reads():
+        return {question_id: text for question_id, text, _ in answers}
+    return _newest(answers, _legacy_responses(user_id, question_ids))
+
+
+async def asaved_answers(user_id, question_ids):
+    """Async version of ``saved_answers``."""
+    answers = [
+        row async for row in Answer.objects.filter(user_id=user_id, question_id__in=question_ids).values_list(
+            'question_id', 'answer_text', 'submitted_at',
+        )
+    ]
+    if not _legacy_reads():
+        return {question_id: text for question_id, text, _ in answers}
+    return _newest(answers, [row async for row in _legacy_responses(user_id, question_ids)])
+
+
+def prefill(questions, answers):
+    """Pair every question payload with the saved text of its answer (``''`` if none)."""
+    return [(question, answers.get(question['id'], '')) for question in questions]
+
+
+def log_submission(view_name, user, answers, queries=None):
+    if queries is None:
+        # Async views: the queries run on the ORM's worker thread, out of reach of count_queries().
+        logger.info('%s: user %s submitted %d answers', view_name, user.pk, len(answers))
+        return
+    logger.info(
+        '%s: user %s submitted %d answers with %d queries',
+        view_name, user.pk, len(answers), queries['count'],
+    )
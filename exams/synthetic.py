@@ -0,0 +1,124 @@
+"""
+Synthetic exam data for load tests and benchmarks.
+
+Answer texts are Persian-looking word sequences drawn from a per-question
+topic vocabulary with a Zipf-like word distribution, so answers to the same
+question share common words the way real answers do. A fraction of the
+students copy an earlier student's answer with a few words changed; these
+planted near-duplicates are what the analysis engine should find. The same
+seed always produces the same data.
+"""
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from responses.models import StudentResponse
+from search import index as search_index
+from . import stats
+from .models import Answer, Exam, Question
+
+LETTERS = 'ابپتثجچحخدذرزسشصضطظعغفقکگلمنوهی'
+VOCABULARY_SIZE = 5000
+TOPIC_SIZE = 400
+BATCH_SIZE = 1000
+
+
+class AnswerWriter:
+    """Draws answer texts for one question."""
+
+    def __init__(self, rng, vocabulary, words):
+        self.rng = rng
+        self.words = words
+        self.topic = rng.sample(vocabulary, TOPIC_SIZE)
+        self.weights = list(accumulate(1 / rank for rank in range(1, TOPIC_SIZE + 1)))
+
+    def answer(self):
+        length = max(5, int(self.rng.gauss(self.words, self.words / 4)))
+        return ' '.join(self.rng.choices(self.topic, cum_weights=self.weights, k=length))
+
+    def near_duplicate(self, text, changes):
+        words = text.split()
+        for _ in range(changes):
+            words[self.rng.randrange(len(words))] = self.rng.choice(self.topic)
+        return ' '.join(words)
+
+
+def generate(instructors=2, exams=2, questions=5, students=200, duplicate_rate=0.02, words=40,
+             responses=False, prefix='bench', seed=1, log=None):
+    """
+    Create ``instructors`` instructors with ``exams`` exams each, every exam
+    with ``questions`` questions answered by all ``students`` students, plus
+    a ``<prefix>-admin`` superuser for the admin. Returns a dict with the
+    created exam ids and the number of planted near-duplicate answers.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    vocabulary = [
+        ''.join(rng.choice(LETTERS) for _ in range(rng.randint(2, 7))) for _ in range(VOCABULARY_SIZE)
+    ]
+    User = get_user_model()
+
+    def make_user(username, **flags):
+        user = User(username=username, **flags)
+        # Hashing real passwords would dominate generation time.
+        user.set_unusable_password()
+        return user
+
+    User.objects.bulk_create(
+        [make_user(f'{prefix}-admin', is_staff=True, is_superuser=True)]
+        + [make_user(f'{prefix}-instructor-{i}', is_instructor=True) for i in range(instructors)]
+        + [make_user(f'{prefix}-student-{i}', is_student=True) for i in range(students)],
+        batch_size=BATCH_SIZE,
+    )
+    teachers = list(User.objects.filter(username__startswith=f'{prefix}-instructor-').order_by('id'))
+    pupils = list(
+        User.objects.filter(username__startswith=f'{prefix}-student-').order_by('id').values_list('id', flat=True)
+    )
+    log(f'Created {len(teachers)} instructors and {len(pupils)} students')
+
+    now = timezone.now()
+    exam_ids = []
+    planted = 0
+    for teacher in teachers:
+        for number in range(exams):
+            exam = Exam.objects.create(
+                title=f'{prefix} آزمون {teacher.id}-{number}', description='داده‌ی ساختگی',
+                start_time=now, end_time=now + timedelta(hours=2), created_by=teacher,
+            )
+            search_index.index_questions(Question.objects.bulk_create([
+                Question(exam=exam, text=f'سوال {order + 1} آزمون {exam.id}', order=order)
+                for order in range(questions)
+            ]))
+            rows = []
+            for question_id in exam.questions.values_list('id', flat=True):
+                writer = AnswerWriter(rng, vocabulary, words)
+                texts = []
+                for _ in pupils:
+                    if texts and rng.random() < duplicate_rate:
+                        texts.append(writer.near_duplicate(rng.choice(texts), changes=rng.randint(1, 3)))
+                        planted += 1
+                    else:
+                        texts.append(writer.answer())
+                rows += [(user_id, question_id, text) for user_id, text in zip(pupils, texts)]
+            search_index.index_answers(Answer.objects.bulk_create(
+                [
+                    Answer(user_id=user_id, question_id=question_id, answer_text=text)
+                    for user_id, question_id, text in rows
+                ],
+                batch_size=BATCH_SIZE,
+            ))
+            if responses:
+                search_index.index_responses(StudentResponse.objects.bulk_create(
+                    [
+                        StudentResponse(student_id=user_id, question_id=question_id, answer_text=text)
+                        for user_id, question_id, text in rows
+                    ],
+                    batch_size=BATCH_SIZE,
+                ))
+            stats.rebuild_exam(exam)
+            exam_ids.append(exam.id)
+            log(f'Exam {exam.id}: {questions} questions, {len(rows)} answers')
+    return {'exams': exam_ids, 'planted_duplicates': planted}
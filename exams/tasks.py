@@ -0,0 +1,62 @@
+"""Background report exports and re-grading (``jobs`` app, ``manage.py run_jobs``)."""
+from django.conf import settings
+
+from jobs.queue import enqueue
+from jobs.registry import task
+from . import grading, reports
+from .models import Exam, Question
+
+EXPORT_REPORT = 'exams.export_report'
+GRADE_QUESTION = 'exams.grade_question'
+
+
+def enqueue_export(exam, fmt, user):
+    """Queue an export of ``exam``'s answers in ``fmt``, or return the one already queued or running."""
+    return enqueue(EXPORT_REPORT, {'exam_id': exam.id, 'fmt': fmt}, user=user, unique=True)
+
+
+@task(EXPORT_REPORT, priority=10)
+def export_report(job, exam_id, fmt):
+    """
+    Write the answer export of the exam to ``JOBS_OUTPUT_DIR``. The file
+    only gets its final name once complete; the result names it for
+    ``jobs.views.job_download``.
+    """
+    exam = Exam.objects.get(id=exam_id)
+    rows, content_type = reports.EXPORT_FORMATS[fmt]
+    total = reports.exam_answers(exam).count()
+    filename = f'exam-{exam.id}-answers.{fmt}'
+    settings.JOBS_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    path = settings.JOBS_OUTPUT_DIR / f'job-{job.id}-{filename}'
+    partial = path.with_name(path.name + '.part')
+    try:
+        with open(partial, 'w', encoding='utf-8', newline='') as output:
+            for done, chunk in enumerate(rows(exam)):
+                output.write(chunk)
+                job.report_progress(done, total, 'answers')
+        job.report_progress(total, total, 'answers')
+        partial.replace(path)
+    finally:
+        partial.unlink(missing_ok=True)
+    return {'file': path.name, 'filename': filename, 'content_type': content_type, 'rows': total}
+
+
+def enqueue_grading(question_ids, user=None, regrade=True):
+    """
+    Queue one grading job per question, so that several workers grade an
+    exam in parallel. Returns the jobs.
+    """
+    return [
+        enqueue(GRADE_QUESTION, {'question_id': question_id, 'regrade': regrade}, user=user, unique=True)
+        for question_id in question_ids
+    ]
+
+
+@task(GRADE_QUESTION, priority=5)
+def grade_question(job, question_id, regrade):
+    """Grade the answers to the question (see ``exams.grading.grade_questions``)."""
+    changed = grading.grade_questions(
+        Question.objects.filter(id=question_id), regrade=regrade,
+        progress=lambda done, total: job.report_progress(done, total, 'answers'),
+    )
+    return {'changed': changed}
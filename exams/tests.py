@@ -1,3 +1,771 @@
-from django.test import TestCase
+import json
+import re
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from jobs import queue
+from jobs.models import Job
+from responses.submissions import save_responses
+from . import cache as exam_cache, events, grading, reports, stats, submission_queue, submissions, synthetic
+from .cache import exam_version
+from .management.commands.benchmark import percentile
+from .submissions import asave_answer_rows, save_answer_rows
+from .models import Answer, Exam, ExamStudentSummary, Question, QuestionStats
+
+# Tables that grow with the number of students; reading them must never
+# fall back to a full table scan.
+LARGE_TABLES = ('exams_answer', 'exams_question', 'responses_studentresponse', 'exams_examstudentsummary')
+FULL_SCAN = re.compile(r'^SCAN (%s)(?! USING)' % '|'.join(LARGE_TABLES))
+
+
+class QueryPlanMixin:
+    """Assertions on the SQLite query plans of the statements a block runs."""
+
+    def query_plans(self, queries):
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+        return plans
+
+    def assertNoFullScans(self, queries):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are written for SQLite')
+        for sql, plan in self.query_plans(queries):
+            scans = [step for step in plan if FULL_SCAN.match(step)]
+            self.assertFalse(scans, f'Full table scan {scans} in: {sql}')
+
+    def get_with_plan_check(self, url, num_queries):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(len(context.captured_queries), num_queries, [q['sql'] for q in context.captured_queries])
+        self.assertNoFullScans(context.captured_queries)
+        return response
+
+
+def create_exam(instructor, questions=3):
+    now = timezone.now()
+    exam = Exam.objects.create(
+        title='آزمون', description='توضیحات', start_time=now, end_time=now + timedelta(hours=1),
+        created_by=instructor,
+    )
+    for order in range(questions):
+        Question.objects.create(exam=exam, text=f'سوال {order}', order=order)
+    return exam
+
+
+class ExamViewsTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.other = User.objects.create_user('other', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor)
+        cls.questions = list(cls.exam.questions.order_by('id'))
+        for user in (cls.student, cls.other):
+            for question in cls.questions:
+                Answer.objects.create(user=user, question=question, answer_text=f'پاسخ {user.username}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_answer_is_unique_per_user_and_question(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Answer.objects.create(user=self.student, question=self.questions[0], answer_text='دوباره')
+
+    def test_my_exams(self):
+        self.client.force_login(self.instructor)
+        response = self.get_with_plan_check(reverse('exams:my_exams'), 3)
+        self.assertContains(response, self.exam.title)
+
+    def test_exam_report(self):
+        self.client.force_login(self.instructor)
+        self.get_with_plan_check(reverse('exams:exam_report', args=[self.exam.id]), 10)
+        # Question statistics are now fresh, so the second render reads less.
+        response = self.get_with_plan_check(reverse('exams:exam_report', args=[self.exam.id]), 7)
+        self.assertContains(response, 'student')
+
+    def test_exam_report_is_instructor_only(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exams:exam_report', args=[self.exam.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_exam_report_export(self):
+        self.client.force_login(self.instructor)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('exams:exam_report_export', args=[self.exam.id, 'csv']))
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(body.strip().splitlines()), 1 + 2 * len(self.questions))
+
+    def test_answer_pages_cover_every_answer_once(self):
+        ids = list(Answer.objects.order_by('id').values_list('id', flat=True))
+        for page_size in (1, 3, 4, 6, 10):
+            seen, after = [], 0
+            while after is not None:
+                answers, after = reports.answer_page(self.exam, after, page_size=page_size)
+                self.assertLessEqual(len(answers), page_size)
+                seen += [answer.id for answer in answers]
+            self.assertEqual(seen, ids)
+
+        self.client.force_login(self.instructor)
+        url = reverse('exams:exam_report', args=[self.exam.id])
+        response = self.client.get(url, {'after': ids[3]})
+        self.assertEqual([answer.id for answer in response.context['answers']], ids[4:])
+        self.assertIsNone(response.context['next_after'])
+        self.assertEqual(len(self.client.get(url, {'after': 'x'}).context['answers']), len(ids))
+
+    def test_exam_report_export_jsonl(self):
+        self.client.force_login(self.instructor)
+        with mock.patch.object(reports, 'EXPORT_CHUNK_SIZE', 2):
+            response = self.client.get(reverse('exams:exam_report_export', args=[self.exam.id, 'jsonl']))
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Disposition'], f'attachment; filename="exam-{self.exam.id}-answers.jsonl"',
+        )
+        self.assertEqual(
+            [row['answer_id'] for row in rows], list(Answer.objects.order_by('id').values_list('id', flat=True)),
+        )
+        self.assertEqual(rows[0]['username'], 'student')
+        response = self.client.get(reverse('exams:exam_report_export', args=[self.exam.id, 'xml']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_add_question(self):
+        self.client.force_login(self.instructor)
+        self.get_with_plan_check(reverse('exams:add_question', args=[self.exam.id]), 4)
+        with self.assertNumQueries(5):
+            response = self.client.post(
+                reverse('exams:add_question', args=[self.exam.id]),
+                {'text': 'جدید', 'points': 1, 'order': 9, 'grading_rule': Question.NUMERIC, 'reference_answer': '۴٫۵'},
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Question.objects.get(text='جدید').grading_rule, Question.NUMERIC)
+
+        response = self.client.post(
+            reverse('exams:add_question', args=[self.exam.id]),
+            {'text': 'جدید', 'points': 1, 'order': 9, 'grading_rule': Question.REGEX, 'reference_answer': '(a'},
+        )
+        self.assertFormError(response.context['form'], 'reference_answer', 'Invalid regular expression: missing ), unterminated subpattern at position 0')
+
+    def test_questions_view_get(self):
+        self.client.force_login(self.student)
+        url = reverse('exams:exam_detail', args=[self.exam.id])
+        self.get_with_plan_check(url, 6)
+        # Warm cache: only the session, the user, the student's answers and legacy responses.
+        self.get_with_plan_check(url, 4)
+
+    def test_questions_view_prefills_saved_answers(self):
+        url = reverse('exams:exam_detail', args=[self.exam.id])
+        for user in (self.student, self.other):
+            self.client.force_login(user)
+            response = self.client.get(url)
+            for question in self.questions:
+                self.assertContains(
+                    response,
+                    f'<textarea name="answer_{question.id}" class="form-control" rows="3">پاسخ {user.username}'
+                    '</textarea>',
+                    html=True,
+                )
+        self.assertNotContains(response, 'پاسخ student')
+
+    def test_questions_view_post_is_constant_queries(self):
+        self.client.force_login(self.student)
+        url = reverse('exams:exam_detail', args=[self.exam.id])
+        self.client.get(url)
+        data = {f'answer_{question.id}': 'پاسخ جدید' for question in self.questions}
+        # Including the question statistics marked dirty after the commit.
+        with self.assertNumQueries(12), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertRedirects(response, reverse('exams:thank_you'))
+        self.assertEqual(Answer.objects.filter(user=self.student, answer_text='پاسخ جدید').count(), 3)
+        self.assertEqual(ExamStudentSummary.objects.get(exam=self.exam, user=self.student).answered, 3)
+
+    def test_questions_view_post_updates_submitted_at(self):
+        answer = Answer.objects.get(user=self.student, question=self.questions[0])
+        Answer.objects.filter(pk=answer.pk).update(submitted_at=timezone.now() - timedelta(days=1))
+        self.client.force_login(self.student)
+        self.client.post(
+            reverse('exams:exam_detail', args=[self.exam.id]), {f'answer_{self.questions[0].id}': 'تغییر'},
+        )
+        answer.refresh_from_db()
+        self.assertEqual(answer.answer_text, 'تغییر')
+        self.assertGreater(answer.submitted_at, timezone.now() - timedelta(minutes=1))
+
+    def test_submission_queries_do_not_grow_with_the_form(self):
+        large = create_exam(self.instructor, questions=30)
+
+        def queries(exam):
+            with CaptureQueriesContext(connection) as captured:
+                submissions.save_answers(self.other, {question.id: 'پاسخ' for question in exam.questions.all()})
+            return len(captured) - 1  # the question list
+
+        self.assertEqual(queries(large), queries(create_exam(self.instructor, questions=2)))
+        self.assertEqual(Answer.objects.filter(user=self.other, question__exam=large).count(), 30)
+
+    def test_failed_take_exam_submission_writes_nothing(self):
+        answers = {question.id: 'پاسخ جدید' for question in self.questions}
+        answers[self.questions[-1].id] = None
+        with mock.patch.object(submissions, 'BATCH_SIZE', 2), self.assertRaises(IntegrityError):
+            save_responses(self.student, answers)
+        self.assertFalse(Answer.objects.filter(answer_text='پاسخ جدید').exists())
+
+    def test_unchanged_answers_keep_submitted_at(self):
+        submitted_at = timezone.now() - timedelta(days=1)
+        Answer.objects.filter(user=self.student).update(submitted_at=submitted_at)
+        rows = {(self.student.id, question.id): f'پاسخ {self.student.username}' for question in self.questions}
+        rows[self.student.id, self.questions[0].id] = 'تغییر'
+        self.assertEqual(save_answer_rows(rows), 1)
+        times = dict(Answer.objects.filter(user=self.student).values_list('question_id', 'submitted_at'))
+        self.assertGreater(times.pop(self.questions[0].id), submitted_at)
+        self.assertEqual(set(times.values()), {submitted_at})
+
+    def test_question_change_invalidates_cache(self):
+        self.client.force_login(self.student)
+        url = reverse('exams:exam_detail', args=[self.exam.id])
+        self.client.get(url)
+        version = exam_version(self.exam.id)
+        self.questions[0].text = 'متن ویرایش‌شده'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0].save()
+            # Until the change commits, readers keep the old token.
+            self.assertEqual(exam_version(self.exam.id), version)
+        self.assertNotEqual(exam_version(self.exam.id), version)
+        self.assertContains(self.client.get(url), 'متن ویرایش‌شده')
+
+
+class ExamCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.exam = create_exam(cls.instructor)
+
+    def setUp(self):
+        cache.clear()
+
+    def question_texts(self):
+        return [question['text'] for question in exam_cache.exam_payload(self.exam.id)['questions']]
+
+    def test_payload_is_read_from_the_cache(self):
+        with self.assertNumQueries(2):
+            payload = exam_cache.exam_payload(self.exam.id)
+        self.assertEqual(payload['title'], self.exam.title)
+        self.assertEqual(self.question_texts(), ['سوال 0', 'سوال 1', 'سوال 2'])
+        with self.assertNumQueries(0):
+            self.assertEqual(exam_cache.exam_payload(self.exam.id), payload)
+
+        self.assertIsNone(exam_cache.exam_payload(0))
+        with self.assertRaises(Http404):
+            exam_cache.get_exam_payload_or_404(0)
+
+    def test_writes_replace_the_payload_after_commit(self):
+        self.question_texts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam.questions.get(order=0).delete()
+        self.assertEqual(self.question_texts(), ['سوال 1', 'سوال 2'])
+
+        version = exam_version(self.exam.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Exam.objects.get(id=self.exam.id).save()
+        self.assertNotEqual(exam_version(self.exam.id), version)
+        self.assertEqual(self.question_texts(), ['سوال 1', 'سوال 2'])
+
+        # Bulk writes bypass the signals until the exam is invalidated.
+        Question.objects.bulk_create([Question(exam=self.exam, text='سوال 3', order=3)])
+        self.assertEqual(self.question_texts(), ['سوال 1', 'سوال 2'])
+        exam_cache.invalidate_exam(self.exam.id)
+        self.assertEqual(self.question_texts(), ['سوال 1', 'سوال 2', 'سوال 3'])
+
+
+class StatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.students = [User.objects.create_user(f'student{i}', password='pass', is_student=True) for i in range(2)]
+        cls.exam = create_exam(cls.instructor, questions=2)
+        cls.first, cls.second = cls.exam.questions.order_by('id')
+
+    def save(self, rows):
+        with self.captureOnCommitCallbacks(execute=True):
+            save_answer_rows({(student.id, question.id): text for (student, question), text in rows.items()})
+
+    def dirty(self):
+        return dict(QuestionStats.objects.filter(dirty_at__isnull=False).values_list('question_id', 'dirty_at'))
+
+    def test_summaries_and_question_stats(self):
+        self.save({
+            (self.students[0], self.first): 'x' * 60, (self.students[1], self.first): 'y',
+            (self.students[0], self.second): 'z',
+        })
+        summary = ExamStudentSummary.objects.get(exam=self.exam, user=self.students[0])
+        self.assertEqual(summary.answered, 2)
+        self.assertEqual(self.dirty().keys(), {self.first.id, self.second.id})
+
+        first, second = stats.question_stats(self.exam)
+        self.assertEqual((first.submissions, second.submissions), (2, 1))
+        self.assertEqual(first.length_histogram[:2], [1, 1])
+        self.assertEqual(self.dirty(), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.filter(user=self.students[1]).delete()
+            Answer.objects.get(user=self.students[0], question=self.second).delete()
+        self.assertFalse(ExamStudentSummary.objects.filter(user=self.students[1]).exists())
+        self.assertEqual(stats.question_stats(self.exam)[0].submissions, 1)
+
+    def test_dirty_rows_are_not_written_again(self):
+        self.save({(self.students[0], self.first): 'یک'})
+        dirty = self.dirty()
+        with self.assertNumQueries(2), self.captureOnCommitCallbacks(execute=True):
+            stats.mark_questions_dirty({self.first.id: self.exam.id})
+        self.assertEqual(self.dirty(), dirty)
+        # Not marked until the writer commits.
+        with self.captureOnCommitCallbacks() as callbacks:
+            stats.mark_questions_dirty({self.second.id: self.exam.id})
+        self.assertEqual(self.dirty(), dirty)
+        callbacks[0]()
+        self.assertEqual(self.dirty().keys(), {self.first.id, self.second.id})
+
+
+@override_settings(AUTOSAVE_MIN_INTERVAL=30, AUTOSAVE_MAX_WRITES_PER_MINUTE=2)
+class AutosaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor)
+        cls.questions = list(cls.exam.questions.order_by('id'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+        self.url = reverse('exams:autosave', args=[self.exam.id])
+
+    def autosave(self, question, text, **extra):
+        response = self.client.post(self.url, {'question_id': question.id, 'answer_text': text, **extra})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['status']
+
+    def answer_text(self, question):
+        return Answer.objects.get(user=self.student, question=question).answer_text
+
+    def test_rapid_saves_are_coalesced(self):
+        question = self.questions[0]
+        self.assertEqual(self.autosave(question, 'یک'), 'saved')
+        self.assertEqual(self.autosave(question, 'یک'), 'unchanged')
+        self.assertEqual(self.autosave(question, 'یک دو'), 'pending')
+        self.assertEqual(self.autosave(question, 'یک دو سه'), 'pending')
+        self.assertEqual(self.answer_text(question), 'یک')
+        # Reloading the exam page writes the newest pending text.
+        self.client.get(reverse('exams:exam_detail', args=[self.exam.id]))
+        self.assertEqual(self.answer_text(question), 'یک دو سه')
+
+    def test_blank_text_is_ignored(self):
+        question = self.questions[0]
+        self.assertEqual(self.autosave(question, 'یک'), 'saved')
+        for text in ('', ' \n\t'):
+            self.assertEqual(self.autosave(question, text, flush='1'), 'unchanged')
+        self.assertEqual(self.autosave(self.questions[1], '  '), 'unchanged')
+        self.assertEqual(self.answer_text(question), 'یک')
+        self.assertFalse(Answer.objects.filter(question=self.questions[1]).exists())
+
+    def test_writes_per_minute_are_bounded(self):
+        for question in self.questions:
+            self.autosave(question, 'پاسخ')
+        self.assertEqual(Answer.objects.filter(user=self.student).count(), 2)
+        self.assertEqual(self.autosave(self.questions[2], 'پاسخ', flush='1'), 'saved')
+        self.assertEqual(self.answer_text(self.questions[2]), 'پاسخ')
+
+    def test_pending_answers_are_written_together(self):
+        self.assertEqual(self.autosave(self.questions[0], 'یک'), 'saved')
+        self.assertEqual(self.autosave(self.questions[0], 'یک دو'), 'pending')
+        self.assertEqual(self.autosave(self.questions[1], 'دو'), 'saved')
+        self.assertEqual(self.answer_text(self.questions[0]), 'یک دو')
+
+    def test_flush_writes_the_text_it_carries(self):
+        self.autosave(self.questions[0], 'یک')
+        self.autosave(self.questions[1], 'دو')
+        self.assertEqual(self.autosave(self.questions[2], 'سه'), 'pending')
+        # The pagehide flush reaches a process whose cache never saw the pending text.
+        cache.clear()
+        self.assertEqual(self.autosave(self.questions[2], 'سه', flush='1'), 'saved')
+        self.assertEqual(self.answer_text(self.questions[2]), 'سه')
+
+    def test_unknown_question_is_rejected(self):
+        other = create_exam(self.instructor, questions=1).questions.get()
+        response = self.client.post(self.url, {'question_id': other.id, 'answer_text': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='algoproject.asgi_urls', EXAM_EVENTS=True, EXAM_EVENTS_POLL_INTERVAL=0.01)
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor)
+        cls.questions = list(cls.exam.questions.order_by('id'))
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_questions_view(self):
+        await self.async_client.aforce_login(self.student)
+        url = reverse('exams:exam_detail', args=[self.exam.id])
+        response = await self.async_client.get(url)
+        self.assertContains(response, reverse('exams:exam_events', args=[self.exam.id]))
+        data = {f'answer_{question.id}': 'پاسخ ناهمگام' for question in self.questions}
+        response = await self.async_client.post(url, data)
+        self.assertRedirects(response, reverse('exams:thank_you'), fetch_redirect_response=False)
+        self.assertEqual(await Answer.objects.filter(user=self.student, answer_text='پاسخ ناهمگام').acount(), 3)
+        summary = await ExamStudentSummary.objects.aget(exam=self.exam, user=self.student)
+        self.assertEqual(summary.answered, 3)
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'پاسخ ناهمگام</textarea>', count=3)
+
+    async def test_failed_submission_writes_nothing(self):
+        rows = {(self.student.id, question.id): 'پاسخ' for question in self.questions}
+        # NOT NULL violation in the second upsert statement.
+        rows[self.student.id, self.questions[-1].id] = None
+        with mock.patch.object(submissions, 'BATCH_SIZE', 2), self.assertRaises(IntegrityError):
+            await asave_answer_rows(rows)
+        self.assertFalse(await Answer.objects.filter(user=self.student).aexists())
+
+    async def test_exam_report(self):
+        await Answer.objects.acreate(user=self.student, question=self.questions[0], answer_text='پاسخ')
+        await self.async_client.aforce_login(self.instructor)
+        response = await self.async_client.get(reverse('exams:exam_report', args=[self.exam.id]))
+        self.assertContains(response, 'student')
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('exams:exam_report', args=[self.exam.id]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_event_stream(self):
+        await self.async_client.aforce_login(self.instructor)
+        response = await self.async_client.get(reverse('exams:exam_events', args=[self.exam.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'event: exam-state\n'))
+        await Exam.objects.filter(id=self.exam.id).aupdate(end_time=timezone.now())
+        self.assertTrue((await anext(events)).startswith(b'event: exam-end\n'))
+        await events.aclose()
+
+    async def test_event_stream_survives_failed_polls(self):
+        poll = events.ExamChannel.poll
+        polls = []
+
+        async def flaky(channel):
+            polls.append(channel)
+            if len(polls) == 1:
+                raise RuntimeError('database unavailable')
+            return await poll(channel)
+
+        await self.async_client.aforce_login(self.instructor)
+        with mock.patch.object(events.ExamChannel, 'poll', flaky), self.assertLogs('exams.events', 'ERROR') as logs:
+            response = await self.async_client.get(reverse('exams:exam_events', args=[self.exam.id]))
+            stream = aiter(response.streaming_content)
+            self.assertTrue((await anext(stream)).startswith(b'event: exam-state\n'))
+            await Exam.objects.filter(id=self.exam.id).aupdate(end_time=timezone.now())
+            self.assertTrue((await anext(stream)).startswith(b'event: exam-end\n'))
+            await stream.aclose()
+        self.assertEqual(len(logs.records), 1)
+
+    async def test_stopped_watcher_is_restarted(self):
+        channel = events.ExamChannel(self.exam.id, events.exam_state(timezone.now(), timezone.now()))
+        # A watcher stops when its poll reports the exam gone.
+        with mock.patch.object(channel, 'poll', return_value=False) as poll:
+            first = channel.subscribe()
+            await channel.task
+            second = channel.subscribe()
+            await channel.task
+        self.assertEqual(poll.await_count, 2)
+        channel.unsubscribe(first)
+        channel.unsubscribe(second)
+
+
+class CrashBeforeDelete:
+    """A queue connection that dies after the batch committed, before the entries are deleted."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, *args):
+        if sql.startswith('DELETE'):
+            raise RuntimeError('worker killed')
+        return self.connection.execute(sql, *args)
+
+
+class SubmissionQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor)
+        cls.questions = list(cls.exam.questions.order_by('id'))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(
+            SUBMISSION_WRITE_BEHIND=True, SUBMISSION_QUEUE_PATH=Path(directory.name) / 'queue.sqlite3',
+        ))
+        self.addCleanup(lambda: submission_queue._connection().close())
+        self.addCleanup(setattr, submission_queue._local, 'connection', None)
+
+    def answers(self):
+        return dict(Answer.objects.filter(user=self.student).values_list('question_id', 'answer_text'))
+
+    def test_replay_after_a_crash_is_idempotent(self):
+        self.client.force_login(self.student)
+        url = reverse('exams:exam_detail', args=[self.exam.id])
+        self.client.post(url, {f'answer_{question.id}': 'اول' for question in self.questions})
+        submission_queue.enqueue('response', self.student.id, {self.questions[0].id: 'دوم'})
+        self.assertEqual((submission_queue.pending_count(), self.answers()), (2, {}))
+
+        connection = submission_queue._connection()
+        with mock.patch.object(submission_queue, '_connection', return_value=CrashBeforeDelete(connection)):
+            with self.assertRaisesMessage(RuntimeError, 'worker killed'):
+                submission_queue.drain()
+        written = dict(Answer.objects.filter(user=self.student).values_list('question_id', 'submitted_at'))
+        self.assertEqual(submission_queue.pending_count(), 2)
+
+        # The restarted worker applies the same entries again, in queue order.
+        self.assertEqual(submission_queue.drain(), 2)
+        self.assertEqual(submission_queue.pending_count(), 0)
+        self.assertEqual(self.answers(), {
+            self.questions[0].id: 'دوم', self.questions[1].id: 'اول', self.questions[2].id: 'اول',
+        })
+        self.assertEqual(Answer.objects.get(user=self.student, question=self.questions[0]).source, Answer.RESPONSE)
+        self.assertEqual(
+            dict(Answer.objects.filter(user=self.student).values_list('question_id', 'submitted_at')), written,
+        )
+        self.assertEqual(ExamStudentSummary.objects.get(exam=self.exam, user=self.student).answered, 3)
+
+    def test_answers_keep_the_time_they_were_enqueued(self):
+        started = timezone.now() - timedelta(minutes=30)
+        for minutes, question in ((0, self.questions[0]), (10, self.questions[1]), (20, self.questions[0])):
+            enqueued_at = (started + timedelta(minutes=minutes)).timestamp()
+            with mock.patch.object(submission_queue.time, 'time', return_value=enqueued_at):
+                submission_queue.enqueue('answer', self.student.id, {question.id: f'پاسخ {minutes}'})
+        self.assertEqual(submission_queue.drain(), 3)
+        times = dict(Answer.objects.filter(user=self.student).values_list('question_id', 'submitted_at'))
+        self.assertEqual(times, {
+            self.questions[0].id: started + timedelta(minutes=20),
+            self.questions[1].id: started + timedelta(minutes=10),
+        })
+        self.assertEqual(
+            ExamStudentSummary.objects.get(exam=self.exam, user=self.student).last_submitted,
+            started + timedelta(minutes=20),
+        )
+
+    def test_entries_of_deleted_questions_are_dropped(self):
+        submission_queue.enqueue('answer', self.student.id, {question.id: 'پاسخ' for question in self.questions})
+        self.questions[2].delete()
+        self.assertEqual(submission_queue.drain(), 1)
+        self.assertEqual(self.answers(), {self.questions[0].id: 'پاسخ', self.questions[1].id: 'پاسخ'})
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate_is_reproducible(self):
+        created = synthetic.generate(instructors=1, exams=1, questions=2, students=30, duplicate_rate=0.2, seed=7)
+        exam = Exam.objects.get(id=created['exams'][0])
+        self.assertEqual(Answer.objects.filter(question__exam=exam).count(), 60)
+        self.assertEqual(ExamStudentSummary.objects.filter(exam=exam).count(), 30)
+        self.assertGreater(created['planted_duplicates'], 0)
+        texts = list(Answer.objects.order_by('id').values_list('answer_text', flat=True))
+
+        Answer.objects.all().delete()
+        synthetic.generate(instructors=1, exams=1, questions=2, students=30, duplicate_rate=0.2, seed=7, prefix='again')
+        self.assertEqual(list(Answer.objects.order_by('id').values_list('answer_text', flat=True)), texts)
+
+
+class GradingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.students = [User.objects.create_user(f'student{i}', password='pass', is_student=True) for i in range(3)]
+        cls.exam = create_exam(cls.instructor, questions=0)
+        cls.numeric = Question.objects.create(
+            exam=cls.exam, text='حاصل', points=2, grading_rule=Question.NUMERIC, reference_answer='3.5',
+            grading_options={'tolerance': 0.1},
+        )
+        cls.essay = Question.objects.create(exam=cls.exam, text='توضیح دهید', points=4, order=1)
+
+    def test_rules(self):
+        cases = [
+            (Question.EXACT, 'O(n log n)', {}, [('  O(n log n) ', True), ('o(n log n)', False)]),
+            (Question.NORMALIZED, 'مرتب‌سازی ادغامی', {}, [('مرتبسازي  ادغامی!', True), ('ادغامی', False)]),
+            (Question.REGEX, r'o\(n\^?2\)', {}, [('O(n^2)', True), ('O(n۲)', True), ('O(n)', False)]),
+            (Question.NUMERIC, '۳٫۵', {'tolerance': 0.1}, [('جواب ۳٫۴۵ است', True), ('3.7', False), ('سه', False)]),
+            (Question.NUMERIC, '200', {'tolerance': 0.05, 'relative': True}, [('1,205', False), ('209', True)]),
+        ]
+        for rule, reference, options, answers in cases:
+            grader = grading.compile_rule(rule, reference, options, 2)
+            for text, correct in answers:
+                with self.subTest(rule=rule, text=text):
+                    self.assertEqual(grader(text), (True, 2) if correct else (False, 0))
+
+        keywords = grading.compile_rule(
+            Question.KEYWORDS, 'پشته\nصف، درخت دودویی', {'min_coverage': 0.6, 'partial': True}, 6,
+        )
+        self.assertEqual(keywords('از پشته و درخت دودویی استفاده می‌شود'), (True, 6))
+        self.assertEqual(keywords('پشته و درخت'), (False, 2))
+        self.assertIsNone(grading.compile_rule(Question.MANUAL, '', {}, 1))
+        with self.assertRaises(ValueError):
+            grading.compile_rule(Question.NUMERIC, 'نامعلوم', {}, 1)
+
+    def test_submissions_are_graded(self):
+        student = self.students[0]
+        save_answer_rows({(student.id, self.numeric.id): '3.52', (student.id, self.essay.id): 'متن'})
+        answers = {answer.question_id: answer for answer in Answer.objects.filter(user=student)}
+        self.assertEqual((answers[self.numeric.id].is_correct, answers[self.numeric.id].score), (True, 2))
+        self.assertIsNotNone(answers[self.numeric.id].graded_at)
+        self.assertEqual((answers[self.essay.id].is_correct, answers[self.essay.id].graded_at), (None, None))
+        self.assertEqual(ExamStudentSummary.objects.get(exam=self.exam, user=student).total_score, 2)
+
+        save_answer_rows({(student.id, self.numeric.id): '4'})
+        self.assertEqual(Answer.objects.get(user=student, question=self.numeric).score, 0)
+
+    def test_resubmission_keeps_manual_grade(self):
+        student = self.students[0]
+        save_answer_rows({(student.id, self.essay.id): 'متن'})
+        Answer.objects.filter(user=student, question=self.essay).update(is_correct=True, score=4)
+        for text in ('متن', 'متن کامل‌تر'):
+            save_answer_rows({(student.id, self.essay.id): text})
+            answer = Answer.objects.get(user=student, question=self.essay)
+            self.assertEqual((answer.answer_text, answer.is_correct, answer.score), (text, True, 4))
+
+    def test_bulk_grading_and_rule_change(self):
+        Answer.objects.bulk_create([
+            Answer(user=student, question=self.numeric, answer_text=text)
+            for student, text in zip(self.students, ['3.5', '3.6', '7'])
+        ])
+        self.assertEqual(grading.grade_questions(Question.objects.filter(exam=self.exam)), 3)
+        self.assertFalse(Answer.objects.filter(question=self.numeric, graded_at__isnull=True).exists())
+        # Already graded: nothing to read.
+        with self.assertNumQueries(3):
+            self.assertEqual(grading.grade_questions(Question.objects.filter(exam=self.exam)), 0)
+
+        self.numeric.reference_answer = '7'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.numeric.save()
+        job = Job.objects.get()
+        self.assertEqual(job.arguments, {'question_id': self.numeric.id, 'regrade': True})
+        queue.run(queue.claim('test'))
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'changed': 2})
+        scores = dict(Answer.objects.filter(question=self.numeric).values_list('user__username', 'score'))
+        self.assertEqual(scores, {'student0': 0, 'student1': 0, 'student2': 2})
+        self.assertEqual(ExamStudentSummary.objects.get(exam=self.exam, user=self.students[2]).total_score, 2)
+
+        self.numeric.grading_rule = Question.MANUAL
+        self.numeric.save()
+        self.assertEqual(grading.grade_questions(Question.objects.filter(id=self.numeric.id)), 3)
+        self.assertFalse(Answer.objects.filter(question=self.numeric, graded_at__isnull=False).exists())
+
+
+@override_settings(ALLOWED_HOSTS=['localhost'])
+class BenchmarkCommandTests(TransactionTestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        self.students = [User.objects.create_user(f's{i}', password='pass', is_student=True) for i in range(3)]
+        self.exam = create_exam(self.instructor)
+        save_answer_rows({
+            (student.id, question.id): 'پاسخ' for student in self.students for question in self.exam.questions.all()
+        })
+
+    def benchmark(self, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'benchmark.json'
+            call_command('benchmark', self.exam.id, *args, '--output', str(output), stdout=StringIO())
+            return json.loads(output.read_text(encoding='utf-8'))['scenarios']
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(
+            [percentile(values, fraction) for fraction in (0.5, 0.95, 0.99, 0.07, 1.0)], [50, 95, 99, 7, 100],
+        )
+        # Banker's rounding of 0.5 * 5 = 2.5 would give the second value.
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.5), 3)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.95), 5)
+
+    def test_requests_must_be_positive(self):
+        with self.assertRaisesMessage(CommandError, '--requests and --threads must be at least 1'):
+            call_command('benchmark', self.exam.id, '--requests', '0', stdout=StringIO())
+
+    def test_threads_log_in_their_own_clients(self):
+        scenarios = self.benchmark('--requests', '6', '--threads', '3', '--only', 'questions_view GET')
+        self.assertEqual(scenarios['questions_view GET']['status_codes'], {'200': 6})
+
+    def test_every_submission_writes(self):
+        written = []
+        save_answer_rows = submissions.save_answer_rows
+
+        def save(rows, *args, **kwargs):
+            written.append(save_answer_rows(rows, *args, **kwargs))
+            return written[-1]
+
+        # One thread: the in-memory test database does not take concurrent writers.
+        with mock.patch.object(submissions, 'save_answer_rows', save):
+            scenarios = self.benchmark('--requests', '3', '--only', 'questions_view POST')
+        self.assertEqual(scenarios['questions_view POST']['status_codes'], {'302': 3})
+        # The warm-up request and every measured one change all three answers.
+        self.assertEqual(written, [3, 3, 3, 3])
+
+    def test_one_student_per_thread(self):
+        with self.assertRaisesMessage(CommandError, 'answers from only 3 students'):
+            self.benchmark('--threads', '4')
+
+
+class StatsBackfillMigrationTests(TransactionTestCase):
+    migrate_from = [('exams', '0001_initial')]
+    migrate_to = [('exams', '0002_examstudentsummary_questionstats')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.addCleanup(lambda: MigrationExecutor(connection).migrate(executor.loader.graph.leaf_nodes()))
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def test_summaries_are_backfilled(self):
+        Exam = self.apps.get_model('exams', 'Exam')
+        Question = self.apps.get_model('exams', 'Question')
+        Answer = self.apps.get_model('exams', 'Answer')
+        User = self.apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+        instructor, first, second = (User.objects.create(username=name) for name in ('instructor', 'first', 'second'))
+        now = timezone.now()
+        exam = Exam.objects.create(
+            title='آزمون', description='', start_time=now, end_time=now, created_by_id=instructor.id,
+        )
+        questions = [Question.objects.create(exam=exam, text=f'سوال {i}', order=i) for i in range(2)]
+        Answer.objects.create(user_id=first.id, question=questions[0], answer_text='a', score=2)
+        Answer.objects.create(user_id=first.id, question=questions[1], answer_text='b', score=3)
+        Answer.objects.create(user_id=second.id, question=questions[0], answer_text='c', score=1)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        summaries = apps.get_model('exams', 'ExamStudentSummary').objects.filter(exam_id=exam.id)
+        self.assertEqual(
+            sorted(summaries.values_list('user_id', 'total_score', 'answered')), [(first.id, 5, 2), (second.id, 1, 1)],
+        )
+        question_stats = apps.get_model('exams', 'QuestionStats').objects.filter(exam_id=exam.id)
+        self.assertEqual(question_stats.count(), 2)
+        self.assertFalse(question_stats.filter(dirty_at__isnull=True).exists())
@@ -6,6 +6,10 @@ urlpatterns = [
     path('my/', views.my_exams, name='my_exams'),
     path('exam/<int:exam_id>/add_question/', views.add_question, name='add_question'),
     path('exam/<int:exam_id>/report/', views.exam_report, name='exam_report'),
+    path('exam/<int:exam_id>/report/export/<str:fmt>/', views.exam_report_export, name='exam_report_export'),
+    path('exam/<int:exam_id>/report/export/<str:fmt>/job/', views.exam_export_job, name='exam_export_job'),
+    path('exam/<int:exam_id>/report/analysis/', views.exam_analysis_job, name='exam_analysis_job'),
     path('exam/<int:exam_id>/questions/', views.questions_view, name='exam_detail'),
+    path('exam/<int:exam_id>/autosave/', views.autosave_view, name='autosave'),
     path('thank-you/', views.thank_you_view, name='thank_you'),
 ]
@@ -1,11 +1,19 @@
 from datetime import timedelta
+from operator import itemgetter
 
-from django.http import HttpResponseForbidden
+from django.db.models import Avg, Count
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 
+from analysis.tasks import enqueue_analysis
+from . import autosave, reports
+from .cache import get_exam_payload_or_404
 from .forms import ExamForm, QuestionForm
-from .models import Question, Answer, Exam
+from .models import Question, Exam
+from .submissions import collect_answers, count_queries, log_submission, prefill, saved_answers, submit_answers
+from .tasks import enqueue_export
 from django.contrib.auth.decorators import login_required
 
 
@@ -37,15 +45,61 @@ def create_exam(request):
 
 @login_required
 def my_exams(request):
-    exams = Exam.objects.filter(created_by=request.user)
+    exams = Exam.objects.filter(created_by=request.user).annotate(
+        student_count=Count('student_summaries'),
+        mean_total_score=Avg('student_summaries__total_score'),
+    )
     return render(request, 'exams/my_exams.html', {'exams': exams})
 
 
 @login_required
 def exam_report(request, exam_id):
     exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
-    answers = Answer.objects.filter(question__exam=exam).select_related('user', 'question')
-    return render(request, 'exams/exam_report.html', {'exam': exam, 'answers': answers})
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+    query = request.GET.get('q', '').strip()
+    if query:
+        answers, next_after = reports.search_answers(exam, query), None
+    else:
+        answers, next_after = reports.answer_page(exam, after)
+    return render(request, 'exams/exam_report.html', {
+        'exam': exam,
+        'query': query,
+        'answers': answers,
+        'next_after': next_after,
+        'question_stats': reports.question_stats(exam),
+        'student_totals': reports.student_totals(exam),
+    })
+
+
+@login_required
+def exam_report_export(request, exam_id, fmt):
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    if fmt not in reports.EXPORT_FORMATS:
+        raise Http404
+    rows, content_type = reports.EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(rows(exam), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="exam-{exam.id}-answers.{fmt}"'
+    return response
+
+
+@login_required
+@require_POST
+def exam_export_job(request, exam_id, fmt):
+    """Queue the export for ``run_jobs`` instead of streaming it from this request."""
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    if fmt not in reports.EXPORT_FORMATS:
+        raise Http404
+    return redirect('jobs:detail', job_id=enqueue_export(exam, fmt, request.user).id)
+
+
+@login_required
+@require_POST
+def exam_analysis_job(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id, created_by=request.user)
+    return redirect('jobs:detail', job_id=enqueue_analysis(exam, request.user).id)
 
 
 @login_required
@@ -88,34 +142,47 @@ def add_question(request, exam_id):
 
 @login_required
 def questions_view(request, exam_id):
-    exam = get_object_or_404(Exam, id=exam_id)
-    questions = exam.questions.all().order_by('id')
+    exam = get_exam_payload_or_404(exam_id)
+    questions = sorted(exam['questions'], key=itemgetter('id'))
+    question_ids = [question['id'] for question in questions]
 
     if request.method == 'POST':
-        for question in questions:
-            answer_text = request.POST.get(f'answer_{question.id}')
-            if answer_text:
-                Answer.objects.update_or_create(
-                    user=request.user,
-                    question=question,
-                    defaults={
-                        'answer_text': answer_text,
-                        'submitted_at': timezone.now()
-                    }
-                )
+        with count_queries() as queries:
+            answers = collect_answers(question_ids, request.POST)
+            submit_answers(request.user, answers)
+        autosave.mark_saved('answer', request.user.pk, answers)
+        log_submission('questions_view', request.user, answers, queries)
         return redirect('exams:thank_you')
-    user_answers = Answer.objects.filter(
-        user=request.user,
-        question__in=questions
-    )
-    answered_questions = {answer.question.id: answer.answer_text for answer in user_answers}
+    autosave.flush_pending(request.user, question_ids, 'answer')
+    answered_questions = saved_answers(request.user.pk, question_ids)
     return render(request, 'exams/questions.html', {
         'exam': exam,
-        'questions': questions,
-        'answered_questions': answered_questions,
+        'questions': prefill(questions, answered_questions),
     })
 
 
+def autosave_response(request, exam, target):
+    """Handle an autosave POST (``question_id``, ``answer_text``, optional ``flush``) for ``exam``."""
+    try:
+        question_id = int(request.POST.get('question_id', ''))
+    except ValueError:
+        return HttpResponseBadRequest('question_id is required')
+    question_ids = [question['id'] for question in exam['questions']]
+    if question_id not in question_ids:
+        return HttpResponseBadRequest('Unknown question')
+    status = autosave.autosave(
+        request.user, question_id, request.POST.get('answer_text', ''),
+        target=target, flush=bool(request.POST.get('flush')), question_ids=question_ids,
+    )
+    return JsonResponse({'status': status})
+
+
+@login_required
+@require_POST
+def autosave_view(request, exam_id):
+    return autosave_response(request, get_exam_payload_or_404(exam_id), 'answer')
+
+
 @login_required
 def thank_you_view(request):
     return render(request, 'responses/ending.html')
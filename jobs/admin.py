@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from . import queue
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'priority', 'attempts', 'progress_done', 'progress_total',
+                    'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    list_select_related = ('created_by',)
+    raw_id_fields = ('created_by',)
+    readonly_fields = ('worker', 'started_at', 'heartbeat_at', 'finished_at', 'result', 'error')
+    actions = ['cancel_jobs']
+
+    @admin.action(description='لغو کارهای انتخاب‌شده')
+    def cancel_jobs(self, request, queryset):
+        cancelled = sum(queue.cancel(job) for job in queryset)
+        self.message_user(request, f'{cancelled} کار لغو شد.')
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,56 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (analysis, exports). Start as many workers as needed; '
+        'SIGTERM or Ctrl-C stops a worker after its current job.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument('--max-jobs', type=int, help='Exit after running this many jobs.')
+        parser.add_argument('--interval', type=float, help='Seconds to sleep when the queue is empty.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.work(options['burst'], options['max_jobs'], options['interval'] or settings.JOBS_POLL_INTERVAL)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def work(self, burst, max_jobs, interval):
+        worker = queue.worker_name()
+        ran = 0
+        last_stale_check = None
+        while not self.stopping:
+            close_old_connections()
+            if last_stale_check is None or time.monotonic() - last_stale_check >= settings.JOBS_STALE_AFTER / 2:
+                queue.requeue_stale()
+                last_stale_check = time.monotonic()
+            job = queue.claim(worker)
+            if job is None:
+                if burst:
+                    break
+                time.sleep(interval)
+                continue
+            self.stdout.write(f'Running job {job.id} ({job.name}), attempt {job.attempts}')
+            status = queue.run(job)
+            self.stdout.write(f'Job {job.id}: {status or "handed to another worker"}')
+            ran += 1
+            if max_jobs and ran >= max_jobs:
+                break
+        close_old_connections()
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after the current job')
+        self.stopping = True
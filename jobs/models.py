@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by ``manage.py run_jobs`` (see
+    ``jobs.queue``). ``name`` selects the task registered with
+    ``jobs.registry.task``; ``arguments`` are its keyword arguments.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+    name = models.CharField(max_length=100)
+    arguments = models.JSONField(default=dict)
+    # Higher runs first.
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField()
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(null=True, blank=True)
+    progress_message = models.CharField(max_length=200, blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED
+
+    @property
+    def percent(self):
+        if self.status == self.SUCCEEDED:
+            return 100
+        if not self.progress_total:
+            return None
+        return min(100, round(100 * self.progress_done / self.progress_total))
+
+    def report_progress(self, done, total=None, message=''):
+        """
+        Record the progress of the running job; see ``jobs.queue.report_progress``.
+        Raises ``jobs.registry.Cancelled`` once cancellation was requested.
+        """
+        from .queue import report_progress
+
+        report_progress(self, done, total, message)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The workers' claim query only looks at queued jobs.
+            models.Index(fields=['-priority', 'id'], condition=Q(status='queued'), name='jobs_job_queued_idx'),
+            models.Index(fields=['created_by', '-created_at']),
+        ]
@@ -0,0 +1,185 @@
+"""
+Database-backed job queue.
+
+``enqueue`` inserts a ``Job`` row; ``manage.py run_jobs`` workers poll for
+queued jobs, highest ``priority`` first and oldest first within a priority,
+and run them. A worker claims a job with a conditional ``UPDATE`` (only
+succeeds while the job is still queued), so any number of workers can
+share the table on SQLite and PostgreSQL alike without a broker or row
+locks.
+
+A task that raises is retried after ``JOBS_RETRY_DELAY`` seconds, doubled
+on every further attempt, until ``max_attempts`` is used up. A queued job
+is cancelled at once; a running one at its next ``report_progress``. Jobs
+whose worker stopped reporting for ``JOBS_STALE_AFTER`` seconds (killed,
+machine lost) are handed to another worker by ``requeue_stale``. Every
+write of a running job is conditional on the claim (``worker`` and
+``attempts``), so a worker that was only slow cannot overwrite the run
+of the worker it was handed to: it stops at its next progress report,
+and its outcome is dropped.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .registry import Cancelled, get_task
+
+logger = logging.getLogger(__name__)
+
+# Queued jobs looked at per claim attempt; more than one so that workers
+# racing for the head of the queue fall through to the next jobs.
+CLAIM_CANDIDATES = 5
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(name, arguments=None, user=None, priority=None, max_attempts=None, unique=False):
+    """
+    Queue the task ``name`` with keyword ``arguments``. With ``unique``, an
+    unfinished job of the same task and arguments is returned instead of
+    queueing another one.
+    """
+    task = get_task(name)
+    arguments = arguments or {}
+    if unique:
+        existing = Job.objects.filter(
+            name=name, arguments=arguments, status__in=[Job.QUEUED, Job.RUNNING], cancel_requested=False,
+        ).order_by('id').first()
+        if existing is not None:
+            return existing
+    return Job.objects.create(
+        name=name,
+        arguments=arguments,
+        created_by=user,
+        priority=task.priority if priority is None else priority,
+        max_attempts=task.max_attempts if max_attempts is None else max_attempts,
+        run_after=timezone.now(),
+    )
+
+
+def claim(worker=None):
+    """Mark the next runnable job as running for ``worker`` and return it, or ``None``."""
+    while True:
+        now = timezone.now()
+        candidates = list(
+            Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('-priority', 'id').values_list('id', flat=True)[:CLAIM_CANDIDATES]
+        )
+        if not candidates:
+            return None
+        for job_id in candidates:
+            claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker or worker_name(), attempts=F('attempts') + 1,
+                started_at=now, heartbeat_at=now,
+            )
+            if claimed:
+                return Job.objects.get(id=job_id)
+
+
+def _claimed(job):
+    """The row of ``job`` while it is still running under the claim ``job`` was read with."""
+    return Job.objects.filter(id=job.id, status=Job.RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+def report_progress(job, done, total=None, message=''):
+    """
+    Store the progress of the running ``job`` and refresh its heartbeat.
+    Writes at most once per ``JOBS_PROGRESS_INTERVAL`` seconds (and always
+    when ``done`` reaches ``total``). Raises ``Cancelled`` once
+    cancellation was requested or the job was handed to another worker.
+    """
+    now = time.monotonic()
+    last = getattr(job, '_progress_written', None)
+    finished = total is not None and done >= total
+    if last is not None and not finished and now - last < settings.JOBS_PROGRESS_INTERVAL:
+        return
+    job._progress_written = now
+    job.progress_done, job.progress_total, job.progress_message = done, total, message[:200]
+    updated = _claimed(job).filter(cancel_requested=False).update(
+        progress_done=done, progress_total=total, progress_message=job.progress_message,
+        heartbeat_at=timezone.now(),
+    )
+    if not updated:
+        raise Cancelled
+
+
+def _finish(job, status, **fields):
+    """Record the outcome of ``job``; returns ``status``, or ``None`` when another worker holds the job."""
+    if _claimed(job).update(status=status, finished_at=timezone.now(), **fields):
+        return status
+    logger.warning('Job %s (%s) was handed to another worker, dropping its %s outcome', job.id, job.name, status)
+    return None
+
+
+def run(job):
+    """
+    Run a claimed ``job`` and record its outcome. Returns the new status,
+    or ``None`` when the job was handed to another worker meanwhile.
+    """
+    try:
+        task = get_task(job.name)
+    except ValueError as exc:
+        return _finish(job, Job.FAILED, error=str(exc))
+    started = time.perf_counter()
+    try:
+        result = task.func(job, **job.arguments)
+    except Cancelled:
+        status = _finish(job, Job.CANCELLED)
+        if status:
+            logger.info('Job %s (%s) cancelled', job.id, job.name)
+        return status
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            requeued = _claimed(job).filter(cancel_requested=False).update(
+                status=Job.QUEUED, error=error, run_after=timezone.now() + timedelta(seconds=delay),
+            )
+            if requeued:
+                logger.warning('Job %s (%s) failed, retrying in %ss', job.id, job.name, delay, exc_info=True)
+                return Job.QUEUED
+            return _finish(job, Job.CANCELLED, error=error)
+        logger.error('Job %s (%s) failed', job.id, job.name, exc_info=True)
+        return _finish(job, Job.FAILED, error=error)
+    logger.info('Job %s (%s) finished in %.1fs', job.id, job.name, time.perf_counter() - started)
+    return _finish(job, Job.SUCCEEDED, result=result, error='')
+
+
+def cancel(job):
+    """
+    Cancel ``job``: a queued job does not run; a running job stops at its
+    next progress report. Returns ``False`` if the job had finished.
+    """
+    now = timezone.now()
+    if Job.objects.filter(id=job.id, status=Job.QUEUED).update(status=Job.CANCELLED, finished_at=now):
+        return True
+    return bool(Job.objects.filter(id=job.id, status=Job.RUNNING).update(cancel_requested=True))
+
+
+def requeue_stale():
+    """
+    Give the jobs of workers that stopped reporting back to the queue (or
+    fail them when out of attempts). Returns the number of jobs affected.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=settings.JOBS_STALE_AFTER),
+    )
+    cancelled = stale.filter(cancel_requested=True).update(status=Job.CANCELLED, finished_at=now)
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.QUEUED, run_after=now, error='The worker stopped responding',
+    )
+    failed = stale.update(status=Job.FAILED, finished_at=now, error='The worker stopped responding')
+    if requeued or failed:
+        logger.warning('Requeued %d and failed %d stale jobs', requeued, failed)
+    return cancelled + requeued + failed
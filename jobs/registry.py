@@ -0,0 +1,40 @@
+"""
+Registry of background tasks.
+
+A task is a function taking the running ``Job`` and its keyword arguments
+and returning a JSON-serializable result::
+
+    @task('exams.export_report', priority=10)
+    def export_report(job, exam_id, fmt):
+        ...
+
+Tasks live in the ``tasks`` module of their app, which ``JobsConfig``
+imports at startup. Long tasks should call ``job.report_progress``
+regularly: it keeps the job's heartbeat fresh and is where cancellation
+takes effect.
+"""
+from collections import namedtuple
+
+Task = namedtuple('Task', 'name func priority max_attempts')
+
+# Task name -> Task
+TASKS = {}
+
+
+class Cancelled(Exception):
+    """Raised inside a task whose job was cancelled."""
+
+
+def task(name, priority=0, max_attempts=3):
+    """Register the decorated function as the task ``name`` with default priority and attempts."""
+    def register(func):
+        TASKS[name] = Task(name, func, priority, max_attempts)
+        return func
+    return register
+
+
+def get_task(name):
+    try:
+        return TASKS[name]
+    except KeyError:
+        raise ValueError(f'Unknown task {name!r}') from None
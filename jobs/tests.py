@@ -0,0 +1,226 @@
+import json
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from analysis.models import AnalysisResult
+from analysis.tasks import enqueue_analysis
+from exams.submissions import save_answer_rows
+from exams.tests import create_exam
+from . import queue
+from .models import Job
+from .registry import Cancelled, task
+
+calls = []
+
+
+@task('jobs.tests.record')
+def record(job, value):
+    calls.append(value)
+    return {'value': value}
+
+
+@task('jobs.tests.fail', max_attempts=2)
+def fail(job):
+    raise RuntimeError('boom')
+
+
+@task('jobs.tests.count')
+def count(job, steps):
+    for step in range(steps):
+        job.report_progress(step, steps)
+    return steps
+
+
+@override_settings(JOBS_RETRY_DELAY=60, JOBS_STALE_AFTER=600)
+class QueueTests(TestCase):
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            queue.enqueue('jobs.tests.missing')
+
+    def test_claims_by_priority_then_age(self):
+        low = queue.enqueue('jobs.tests.record', {'value': 1})
+        high = queue.enqueue('jobs.tests.record', {'value': 2}, priority=5)
+        later = queue.enqueue('jobs.tests.record', {'value': 3})
+        self.assertEqual([queue.claim('w').id for _ in range(3)], [high.id, low.id, later.id])
+        self.assertIsNone(queue.claim('w'))
+
+    def test_run_stores_result(self):
+        job = queue.enqueue('jobs.tests.record', {'value': 'x'})
+        self.assertEqual(queue.run(queue.claim('w')), Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts, job.percent), (Job.SUCCEEDED, {'value': 'x'}, 1, 100))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_unique_returns_unfinished_job(self):
+        job = queue.enqueue('jobs.tests.record', {'value': 1}, unique=True)
+        self.assertEqual(queue.enqueue('jobs.tests.record', {'value': 1}, unique=True), job)
+        self.assertNotEqual(queue.enqueue('jobs.tests.record', {'value': 2}, unique=True), job)
+        queue.run(queue.claim('w'))
+        self.assertNotEqual(queue.enqueue('jobs.tests.record', {'value': 1}, unique=True), job)
+
+    def test_retries_with_backoff_then_fails(self):
+        job = queue.enqueue('jobs.tests.fail')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertEqual(queue.run(queue.claim('w')), Job.QUEUED)
+        job.refresh_from_db()
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=50))
+        self.assertIn('RuntimeError: boom', job.error)
+        # Not due yet.
+        self.assertIsNone(queue.claim('w'))
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(queue.run(queue.claim('w')), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_cancel_queued_job(self):
+        job = queue.enqueue('jobs.tests.record', {'value': 1})
+        self.assertTrue(queue.cancel(job))
+        self.assertIsNone(queue.claim('w'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.CANCELLED)
+        self.assertFalse(queue.cancel(job))
+
+    def test_cancel_running_job_at_next_progress_report(self):
+        job = queue.enqueue('jobs.tests.count', {'steps': 3})
+        claimed = queue.claim('w')
+        self.assertTrue(queue.cancel(job))
+        self.assertEqual(queue.run(claimed), Job.CANCELLED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.CANCELLED)
+
+    def test_progress_writes_are_throttled(self):
+        job = queue.enqueue('jobs.tests.count', {'steps': 50})
+        claimed = queue.claim('w')
+        # The first report, then the final one.
+        with self.assertNumQueries(2):
+            queue.report_progress(claimed, 0, 50)
+            for step in range(1, 51):
+                queue.report_progress(claimed, step, 50)
+        job.refresh_from_db()
+        self.assertEqual((job.progress_done, job.percent), (50, 100))
+
+    def test_outcome_of_a_requeued_run_is_dropped(self):
+        job = queue.enqueue('jobs.tests.record', {'value': 1})
+        slow = queue.claim('w1')
+        Job.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            queue.requeue_stale()
+        current = queue.claim('w2')
+        # The slow worker stops at its next progress report, or loses its outcome.
+        with self.assertRaises(Cancelled):
+            queue.report_progress(slow, 0, 1)
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertIsNone(queue.run(slow))
+        self.assertEqual(queue.run(current), Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), (Job.SUCCEEDED, 'w2', 2))
+
+    def test_requeue_stale(self):
+        stale = queue.enqueue('jobs.tests.record', {'value': 1}, max_attempts=1)
+        retried = queue.enqueue('jobs.tests.record', {'value': 2})
+        fresh = queue.enqueue('jobs.tests.record', {'value': 3})
+        for _ in range(3):
+            queue.claim('w')
+        Job.objects.exclude(id=fresh.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertEqual(queue.requeue_stale(), 2)
+        statuses = dict(Job.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[stale.id], statuses[retried.id], statuses[fresh.id]], [Job.FAILED, Job.QUEUED, Job.RUNNING],
+        )
+
+
+class JobViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.other = User.objects.create_user('other', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor, questions=2)
+        save_answer_rows({
+            (cls.student.id, question.id): f'پاسخ {question.id}' for question in cls.exam.questions.all()
+        })
+
+    def setUp(self):
+        output = tempfile.TemporaryDirectory()
+        self.addCleanup(output.cleanup)
+        self.enterContext(override_settings(JOBS_OUTPUT_DIR=Path(output.name)))
+        self.client.force_login(self.instructor)
+
+    def run_queued(self):
+        while (job := queue.claim('test')) is not None:
+            queue.run(job)
+
+    def test_background_export(self):
+        response = self.client.post(reverse('exams:exam_export_job', args=[self.exam.id, 'csv']))
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('jobs:detail', args=[job.id]))
+        self.assertEqual((job.name, job.priority, job.created_by), ('exams.export_report', 10, self.instructor))
+
+        self.run_queued()
+        response = self.client.get(reverse('jobs:download', args=[job.id]))
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="exam-{self.exam.id}-answers.csv"')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 3)
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse('jobs:detail', args=[job.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('jobs:download', args=[job.id])).status_code, 404)
+
+    def test_background_analysis(self):
+        response = self.client.post(reverse('exams:exam_analysis_job', args=[self.exam.id]))
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('jobs:detail', args=[job.id]))
+        self.assertContains(self.client.get(reverse('jobs:detail', args=[job.id])), reverse('api:job', args=[job.id]))
+
+        self.run_queued()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result['analysis_result'], AnalysisResult.objects.get(exam=self.exam).id)
+        self.assertEqual((job.progress_done, job.progress_total), (2, 2))
+
+        incremental = enqueue_analysis(self.exam, self.instructor, incremental=True)
+        self.run_queued()
+        incremental.refresh_from_db()
+        self.assertEqual(
+            (incremental.status, incremental.progress_done, incremental.progress_total), (Job.SUCCEEDED, 2, 2),
+        )
+
+    def test_api_start_poll_and_cancel(self):
+        response = self.client.post(
+            reverse('api:start_export', args=[self.exam.id]), json.dumps({'format': 'jsonl'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 202)
+        status_url = response['Location']
+        self.assertEqual(self.client.get(status_url).json()['status'], Job.QUEUED)
+
+        response = self.client.post(reverse('api:cancel_job', args=[response.json()['id']]))
+        self.assertEqual(response.json()['status'], Job.CANCELLED)
+        self.assertTrue(self.client.get(status_url).json()['finished'])
+
+        response = self.client.post(
+            reverse('api:start_analysis', args=[self.exam.id]), json.dumps({'backend': 'tfidf', 'incremental': True}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    def test_burst_runs_queued_jobs(self):
+        calls.clear()
+        for value in range(3):
+            queue.enqueue('jobs.tests.record', {'value': value})
+        call_command('run_jobs', '--burst', stdout=StringIO())
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertFalse(Job.objects.exclude(status=Job.SUCCEEDED).exists())
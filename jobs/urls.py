@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'jobs'
+
+urlpatterns = [
+    path('<int:job_id>/', views.job_detail, name='detail'),
+    path('<int:job_id>/cancel/', views.job_cancel, name='cancel'),
+    path('<int:job_id>/download/', views.job_download, name='download'),
+]
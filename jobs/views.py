@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from . import queue
+from .models import Job
+
+
+def get_user_job_or_404(user, job_id):
+    """The job ``job_id`` if ``user`` queued it (staff see every job)."""
+    jobs = Job.objects.all() if user.is_staff else Job.objects.filter(created_by=user)
+    return get_object_or_404(jobs, id=job_id)
+
+
+@login_required
+def job_detail(request, job_id):
+    job = get_user_job_or_404(request.user, job_id)
+    return render(request, 'jobs/job_detail.html', {
+        'job': job,
+        'status_url': reverse('api:job', args=[job.id]),
+    })
+
+
+@login_required
+@require_POST
+def job_cancel(request, job_id):
+    queue.cancel(get_user_job_or_404(request.user, job_id))
+    return redirect('jobs:detail', job_id=job_id)
+
+
+@login_required
+def job_download(request, job_id):
+    job = get_user_job_or_404(request.user, job_id)
+    result = job.result or {}
+    if job.status != Job.SUCCEEDED or 'file' not in result:
+        raise Http404('This job has no file')
+    path = settings.JOBS_OUTPUT_DIR / Path(result['file']).name
+    if not path.is_file():
+        raise Http404('The file of this job was removed')
+    return FileResponse(
+        open(path, 'rb'), as_attachment=True, filename=result['filename'], content_type=result['content_type'],
+    )
@@ -1,10 +1,29 @@
 from django.contrib import admin
+
+from exams.paginators import EstimatedCountPaginator
+from search.models import SearchDocument
+from search.query import matching_ids
 from .models import StudentResponse, Note
 
+
+# جدول قدیمی پاسخ‌ها؛ پاسخ‌های جدید صفحه‌ی آزمون در exams.Answer ذخیره می‌شوند.
 class StudentResponseAdmin(admin.ModelAdmin):
     list_display = ('student', 'question', 'is_flagged', 'last_modified')
     list_filter = ('is_flagged', 'last_modified')
-    search_fields = ('student__username', 'question__text', 'answer_text')
+    list_select_related = ('student', 'question__exam')
+    search_fields = ('^student__username', 'question__text')
+    search_help_text = 'نام کاربری دانشجو، متن سوال یا متن پاسخ'
+    raw_id_fields = ('student', 'question')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            # پاسخ‌ها با جستجوی متن کامل پیدا می‌شوند، نه LIKE روی کل جدول.
+            results |= queryset.filter(pk__in=matching_ids(search_term, SearchDocument.RESPONSE))
+        return results, may_have_duplicates
+
 
 admin.site.register(StudentResponse, StudentResponseAdmin)
 admin.site.register(Note)
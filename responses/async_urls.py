@@ -0,0 +1,17 @@
+"""``responses.urls`` with the async views of the ASGI profile."""
+from django.urls import path
+
+from . import async_views, urls
+
+app_name = 'response'
+
+ASYNC_VIEWS = {
+    'take_exam': async_views.take_exam,
+    'autosave': async_views.autosave_view,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS
+    else pattern
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,39 @@
+"""Async versions of the ``responses`` views, routed by the ASGI profile."""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+from django.views.decorators.http import require_POST
+
+from exams import autosave
+from exams.async_views import arender, autosave_response, events_url, request_user
+from exams.cache import aget_exam_payload_or_404
+from exams.submissions import asaved_answers, collect_answers, log_submission, prefill
+from .submissions import asubmit_responses
+
+
+@login_required
+async def take_exam(request, exam_id):
+    user = await request_user(request)
+    exam = await aget_exam_payload_or_404(exam_id)
+    questions = exam['questions']
+    question_ids = [question['id'] for question in questions]
+
+    if request.method == 'POST':
+        answers = collect_answers(question_ids, request.POST)
+        await asubmit_responses(user, answers)
+        await sync_to_async(autosave.mark_saved)('response', user.pk, answers)
+        log_submission('take_exam', user, answers)
+        return redirect('response:thank_you')
+    await sync_to_async(autosave.flush_pending)(user, question_ids, 'response')
+    answered_questions = await asaved_answers(user.pk, question_ids)
+    return await arender(request, 'responses/take_exam.html', {
+        'exam': exam,
+        'questions': prefill(questions, answered_questions),
+        'events_url': events_url(exam['id']),
+    })
+
+
+@login_required
+@require_POST
+async def autosave_view(request, exam_id):
+    return await autosave_response(request, await aget_exam_payload_or_404(exam_id), 'response')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from responses.merge import BATCH_SIZE, merge_responses
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge legacy StudentResponse rows into the answers table in batches. '
+        'Safe to re-run: rows merged before are merged again only if they are newer than the answer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after', type=int, default=0, help='Resume after this StudentResponse id.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        merged, last_id = merge_responses(options['after'], options['batch_size'], log=self.stdout.write)
+        self.stdout.write(f'Merged {merged} responses; last id {last_id}')
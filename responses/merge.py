@@ -0,0 +1,127 @@
+"""
+Merging of the legacy ``StudentResponse`` table into ``exams.Answer``.
+
+``take_exam`` used to write ``StudentResponse`` rows while ``questions_view``
+wrote ``Answer`` rows; both views now write ``Answer`` (with ``source`` set
+to the view). Existing responses are copied over in primary key order,
+``batch_size`` rows per transaction, by ``manage.py merge_responses``
+(which picks up rows written by processes still running the old code
+during a deploy). When a student has both an answer and a response to the
+same question, the newer text wins; a flagged response flags the answer
+either way. The derived data of the touched rows (student summaries,
+question statistics, search documents) is refreshed batch by batch.
+Merged answers are left ungraded for ``manage.py grade_answers``.
+
+``responses.0002`` runs a copy of the same merge against its historical
+models. ``StudentResponse`` rows are left in place; until they are
+dropped, ``exams.submissions.saved_answers`` also reads them
+(``SUBMISSIONS_LEGACY_READS``).
+"""
+from django.apps import apps as global_apps
+from django.db import connections, transaction
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+# ``Answer.RESPONSE``; historical models have no class attributes.
+RESPONSE_SOURCE = 'response'
+
+
+def _has_field(model, name):
+    return any(field.name == name for field in model._meta.get_fields())
+
+
+def merge_batch(first_id, last_id, apps=global_apps, using='default'):
+    """Merge the ``StudentResponse`` rows with primary keys from ``first_id`` to ``last_id`` into ``Answer``."""
+    from texts.normalization import normalize
+
+    Answer = apps.get_model('exams', 'Answer')
+    Question = apps.get_model('exams', 'Question')
+    ExamStudentSummary = apps.get_model('exams', 'ExamStudentSummary')
+    QuestionStats = apps.get_model('exams', 'QuestionStats')
+    StudentResponse = apps.get_model('responses', 'StudentResponse')
+    SearchDocument = apps.get_model('search', 'SearchDocument')
+    tables = {
+        'answer': Answer._meta.db_table,
+        'question': Question._meta.db_table,
+        'summary': ExamStudentSummary._meta.db_table,
+        'stats': QuestionStats._meta.db_table,
+        'response': StudentResponse._meta.db_table,
+    }
+    batch = 'r.id >= %s AND r.id <= %s'
+    # Historical models from before ``exams.0005`` have no grades to reset.
+    ungrade = ', is_correct = NULL, score = 0, graded_at = NULL' if _has_field(Answer, 'graded_at') else ''
+    bounds = [first_id, last_id]
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {answer} (user_id, question_id, answer_text, submitted_at, score, source, is_flagged) '
+            'SELECT r.student_id, r.question_id, r.answer_text, r.last_modified, 0, %s, r.is_flagged '
+            'FROM {response} r WHERE {batch} '
+            'ON CONFLICT (user_id, question_id) DO UPDATE SET answer_text = excluded.answer_text, '
+            'submitted_at = excluded.submitted_at, source = excluded.source{ungrade} '
+            'WHERE excluded.submitted_at > {answer}.submitted_at'.format(batch=batch, ungrade=ungrade, **tables),
+            [RESPONSE_SOURCE] + bounds,
+        )
+        cursor.execute(
+            'UPDATE {answer} SET is_flagged = %s WHERE EXISTS (SELECT 1 FROM {response} r WHERE {batch} '
+            'AND r.is_flagged AND r.student_id = {answer}.user_id AND r.question_id = {answer}.question_id)'
+            .format(batch=batch, **tables),
+            [True] + bounds,
+        )
+        # Totals of every exam the batch's students answered; a superset of the touched pairs.
+        cursor.execute(
+            'INSERT INTO {summary} (exam_id, user_id, total_score, answered, last_submitted) '
+            'SELECT q.exam_id, a.user_id, COALESCE(SUM(a.score), 0), COUNT(*), MAX(a.submitted_at) '
+            'FROM {answer} a INNER JOIN {question} q ON q.id = a.question_id '
+            'WHERE a.user_id IN (SELECT r.student_id FROM {response} r WHERE {batch}) '
+            'GROUP BY q.exam_id, a.user_id '
+            'ON CONFLICT (exam_id, user_id) DO UPDATE SET total_score = excluded.total_score, '
+            'answered = excluded.answered, last_submitted = excluded.last_submitted'.format(batch=batch, **tables),
+            bounds,
+        )
+        # Questions without a stats row are computed on first use anyway.
+        cursor.execute(
+            'UPDATE {stats} SET dirty_at = %s '
+            'WHERE question_id IN (SELECT r.question_id FROM {response} r WHERE {batch})'.format(batch=batch, **tables),
+            [timezone.now()] + bounds,
+        )
+        cursor.execute(
+            'SELECT a.id, a.question_id, a.user_id, a.answer_text FROM {answer} a '
+            'INNER JOIN {response} r ON r.student_id = a.user_id AND r.question_id = a.question_id '
+            'WHERE {batch}'.format(batch=batch, **tables),
+            bounds,
+        )
+        SearchDocument.objects.using(using).bulk_create(
+            [
+                SearchDocument(kind='answer', object_id=answer_id, question_id=question_id, user_id=user_id,
+                               text=normalize(text))
+                for answer_id, question_id, user_id, text in cursor.fetchall()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['kind', 'object_id'],
+            update_fields=['question', 'user', 'text'],
+        )
+
+
+def merge_responses(after_id=0, batch_size=BATCH_SIZE, apps=global_apps, using='default', log=None):
+    """
+    Merge every ``StudentResponse`` with a primary key above ``after_id``,
+    one transaction per ``batch_size`` rows. Returns the number of rows
+    merged and the last primary key, from which an interrupted run can
+    be resumed.
+    """
+    StudentResponse = apps.get_model('responses', 'StudentResponse')
+    merged = 0
+    while True:
+        ids = list(
+            StudentResponse.objects.using(using).filter(id__gt=after_id).order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return merged, after_id
+        merge_batch(ids[0], ids[-1], apps=apps, using=using)
+        merged += len(ids)
+        after_id = ids[-1]
+        if log:
+            log(f'Merged {merged} responses (up to id {after_id})')
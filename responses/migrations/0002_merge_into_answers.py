@@ -0,0 +1,127 @@
+from django.db import connections, migrations, transaction
+from django.utils import timezone
+
+# A copy of ``responses.merge`` and of the search normalization as of this
+# migration, so that later changes to the application code do not change
+# what it writes. ``manage.py merge_responses`` uses ``responses.merge``.
+BATCH_SIZE = 2000
+# ``Answer.RESPONSE``; historical models have no class attributes.
+RESPONSE_SOURCE = 'response'
+
+FOLD = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    # Diacritics (fathatan .. sukun, superscript alef), tatweel, ZWNJ and ZWJ.
+    **{chr(code): None for code in range(0x064B, 0x0653)},
+    '\u0670': None, '\u0640': None, '\u200c': None, '\u200d': None,
+})
+
+
+def normalize(text):
+    return (text or '').translate(FOLD).casefold()
+
+
+def merge_batch(apps, using, first_id, last_id):
+    Answer = apps.get_model('exams', 'Answer')
+    Question = apps.get_model('exams', 'Question')
+    ExamStudentSummary = apps.get_model('exams', 'ExamStudentSummary')
+    QuestionStats = apps.get_model('exams', 'QuestionStats')
+    StudentResponse = apps.get_model('responses', 'StudentResponse')
+    SearchDocument = apps.get_model('search', 'SearchDocument')
+    tables = {
+        'answer': Answer._meta.db_table,
+        'question': Question._meta.db_table,
+        'summary': ExamStudentSummary._meta.db_table,
+        'stats': QuestionStats._meta.db_table,
+        'response': StudentResponse._meta.db_table,
+    }
+    batch = 'r.id >= %s AND r.id <= %s'
+    # The grades of ``exams.0005`` exist only if it was applied first.
+    graded = any(field.name == 'graded_at' for field in Answer._meta.get_fields())
+    ungrade = ', is_correct = NULL, score = 0, graded_at = NULL' if graded else ''
+    bounds = [first_id, last_id]
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {answer} (user_id, question_id, answer_text, submitted_at, score, source, is_flagged) '
+            'SELECT r.student_id, r.question_id, r.answer_text, r.last_modified, 0, %s, r.is_flagged '
+            'FROM {response} r WHERE {batch} '
+            'ON CONFLICT (user_id, question_id) DO UPDATE SET answer_text = excluded.answer_text, '
+            'submitted_at = excluded.submitted_at, source = excluded.source{ungrade} '
+            'WHERE excluded.submitted_at > {answer}.submitted_at'.format(batch=batch, ungrade=ungrade, **tables),
+            [RESPONSE_SOURCE] + bounds,
+        )
+        cursor.execute(
+            'UPDATE {answer} SET is_flagged = %s WHERE EXISTS (SELECT 1 FROM {response} r WHERE {batch} '
+            'AND r.is_flagged AND r.student_id = {answer}.user_id AND r.question_id = {answer}.question_id)'
+            .format(batch=batch, **tables),
+            [True] + bounds,
+        )
+        cursor.execute(
+            'INSERT INTO {summary} (exam_id, user_id, total_score, answered, last_submitted) '
+            'SELECT q.exam_id, a.user_id, COALESCE(SUM(a.score), 0), COUNT(*), MAX(a.submitted_at) '
+            'FROM {answer} a INNER JOIN {question} q ON q.id = a.question_id '
+            'WHERE a.user_id IN (SELECT r.student_id FROM {response} r WHERE {batch}) '
+            'GROUP BY q.exam_id, a.user_id '
+            'ON CONFLICT (exam_id, user_id) DO UPDATE SET total_score = excluded.total_score, '
+            'answered = excluded.answered, last_submitted = excluded.last_submitted'.format(batch=batch, **tables),
+            bounds,
+        )
+        cursor.execute(
+            'UPDATE {stats} SET dirty_at = %s '
+            'WHERE question_id IN (SELECT r.question_id FROM {response} r WHERE {batch})'.format(batch=batch, **tables),
+            [timezone.now()] + bounds,
+        )
+        cursor.execute(
+            'SELECT a.id, a.question_id, a.user_id, a.answer_text FROM {answer} a '
+            'INNER JOIN {response} r ON r.student_id = a.user_id AND r.question_id = a.question_id '
+            'WHERE {batch}'.format(batch=batch, **tables),
+            bounds,
+        )
+        SearchDocument.objects.using(using).bulk_create(
+            [
+                SearchDocument(kind='answer', object_id=answer_id, question_id=question_id, user_id=user_id,
+                               text=normalize(text))
+                for answer_id, question_id, user_id, text in cursor.fetchall()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['kind', 'object_id'],
+            update_fields=['question', 'user', 'text'],
+        )
+
+
+def merge(apps, schema_editor):
+    using = schema_editor.connection.alias
+    StudentResponse = apps.get_model('responses', 'StudentResponse')
+    after_id = 0
+    while True:
+        ids = list(
+            StudentResponse.objects.using(using).filter(id__gt=after_id).order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            return
+        merge_batch(apps, using, ids[0], ids[-1])
+        after_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Every batch commits on its own, so a large table is not merged in one transaction.
+    atomic = False
+
+    dependencies = [
+        ('responses', '0001_initial'),
+        ('exams', '0004_answer_source_is_flagged'),
+        ('search', '0002_fulltext_index'),
+    ]
+
+    operations = [
+        # The StudentResponse rows stay until the table is dropped, so there is nothing to undo.
+        migrations.RunPython(merge, migrations.RunPython.noop),
+    ]
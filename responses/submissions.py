@@ -0,0 +1,39 @@
+"""
+Submissions of the ``take_exam`` view. They are stored as ``exams.Answer``
+rows with ``source=Answer.RESPONSE`` through the same bulk upserts as
+``questions_view``; ``StudentResponse`` only holds legacy rows (see
+``responses.merge``).
+"""
+from asgiref.sync import sync_to_async
+
+from exams import submission_queue
+from exams.models import Answer
+from exams.submissions import asave_answer_rows, save_answer_rows
+
+
+def submit_responses(student, answers):
+    """Queue ``answers`` for the write-behind worker or write them immediately."""
+    if submission_queue.is_enabled():
+        submission_queue.enqueue('response', student.pk, answers)
+    else:
+        save_responses(student, answers)
+
+
+def save_responses(student, answers):
+    """Upsert ``answers`` (``{question_id: answer_text}``) for ``student``."""
+    return save_response_rows({(student.pk, question_id): text for question_id, text in answers.items()})
+
+
+def save_response_rows(rows, submitted_at=None):
+    """Upsert ``rows`` (``{(student_id, question_id): answer_text}``) as ``take_exam`` answers."""
+    return save_answer_rows(rows, source=Answer.RESPONSE, submitted_at=submitted_at)
+
+
+async def asubmit_responses(student, answers):
+    """Async version of ``submit_responses``."""
+    if submission_queue.is_enabled():
+        await sync_to_async(submission_queue.enqueue)('response', student.pk, answers)
+    else:
+        await asave_answer_rows(
+            {(student.pk, question_id): text for question_id, text in answers.items()}, source=Answer.RESPONSE,
+        )
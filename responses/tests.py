@@ -1,3 +1,160 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from exams.models import Answer, ExamStudentSummary
+from exams.submissions import saved_answers
+from exams.tests import QueryPlanMixin, create_exam
+from search.models import SearchDocument
+from .merge import merge_responses
+from .models import StudentResponse
+
+
+class TakeExamTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor, questions=5)
+        cls.questions = list(cls.exam.questions.all())
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def test_take_exam_get(self):
+        url = reverse('response:take_exam', args=[self.exam.id])
+        response = self.get_with_plan_check(url, 6)
+        self.assertContains(response, self.questions[0].text)
+        # Warm cache: the questions come from the cache; the student's answers and legacy responses are read.
+        self.get_with_plan_check(url, 4)
+
+    def test_take_exam_prefills_saved_answers(self):
+        Answer.objects.create(user=self.student, question=self.questions[0], answer_text='پاسخ ذخیره‌شده')
+        StudentResponse.objects.create(student=self.student, question=self.questions[1], answer_text='پاسخ قدیمی')
+        response = self.client.get(reverse('response:take_exam', args=[self.exam.id]))
+        for question, text in ((self.questions[0], 'پاسخ ذخیره‌شده'), (self.questions[1], 'پاسخ قدیمی'),
+                               (self.questions[2], '')):
+            self.assertContains(
+                response,
+                f'<textarea id="answer_{question.id}" name="answer_{question.id}" class="form-control" rows="4">'
+                f'{text}</textarea>',
+                html=True,
+            )
+
+    def test_take_exam_missing_exam(self):
+        response = self.client.get(reverse('response:take_exam', args=[self.exam.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_take_exam_post_is_constant_queries(self):
+        url = reverse('response:take_exam', args=[self.exam.id])
+        self.client.get(url)
+        data = {f'answer_{question.id}': 'پاسخ' for question in self.questions}
+        # Including the question statistics marked dirty after the commit.
+        with self.assertNumQueries(12), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertRedirects(response, reverse('response:thank_you'))
+
+        data[f'answer_{self.questions[0].id}'] = 'ویرایش'
+        with self.assertNumQueries(12), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, data)
+        answers = Answer.objects.filter(user=self.student)
+        self.assertEqual(answers.filter(source=Answer.RESPONSE).count(), 5)
+        self.assertEqual(answers.get(question=self.questions[0]).answer_text, 'ویرایش')
+        self.assertFalse(StudentResponse.objects.exists())
+
+    def test_thank_you(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse('response:thank_you'))
+
+
+class MergeResponsesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor, questions=3)
+        cls.questions = list(cls.exam.questions.all())
+
+    def setUp(self):
+        now = timezone.now()
+        first, second, third = self.questions
+        # An older answer superseded by a response, a newer answer kept over a flagged response,
+        # and a response without an answer.
+        Answer.objects.create(user=self.student, question=first, answer_text='پاسخ قدیمی')
+        Answer.objects.filter(question=first).update(submitted_at=now - timedelta(hours=2))
+        Answer.objects.create(user=self.student, question=second, answer_text='پاسخ جدید', score=2)
+        for question, text, flagged in ((first, 'پاسخ تازه', False), (second, 'پاسخ کهنه', True),
+                                        (third, 'فقط پاسخ', False)):
+            StudentResponse.objects.create(student=self.student, question=question, answer_text=text,
+                                           is_flagged=flagged)
+        StudentResponse.objects.filter(question=second).update(last_modified=now - timedelta(hours=1))
+
+    def test_saved_answers_read_legacy_responses(self):
+        question_ids = [question.id for question in self.questions]
+        self.assertEqual(saved_answers(self.student.pk, question_ids), {
+            self.questions[0].id: 'پاسخ تازه', self.questions[1].id: 'پاسخ جدید', self.questions[2].id: 'فقط پاسخ',
+        })
+        with self.settings(SUBMISSIONS_LEGACY_READS=False):
+            self.assertEqual(saved_answers(self.student.pk, question_ids), {
+                self.questions[0].id: 'پاسخ قدیمی', self.questions[1].id: 'پاسخ جدید',
+            })
+
+    def test_merge(self):
+        question_ids = [question.id for question in self.questions]
+        expected = saved_answers(self.student.pk, question_ids)
+        self.assertEqual(merge_responses(batch_size=2), (3, StudentResponse.objects.order_by('id').last().id))
+
+        answers = {answer.question_id: answer for answer in Answer.objects.filter(user=self.student)}
+        self.assertEqual({question_id: answer.answer_text for question_id, answer in answers.items()}, expected)
+        self.assertEqual(answers[self.questions[0].id].source, Answer.RESPONSE)
+        self.assertEqual(answers[self.questions[1].id].source, Answer.EXAM)
+        self.assertTrue(answers[self.questions[1].id].is_flagged)
+        summary = ExamStudentSummary.objects.get(exam=self.exam, user=self.student)
+        self.assertEqual((summary.answered, summary.total_score), (3, 2))
+        self.assertEqual(
+            SearchDocument.objects.get(kind=SearchDocument.ANSWER, object_id=answers[self.questions[2].id].id).text,
+            'فقط پاسخ',
+        )
+        with self.settings(SUBMISSIONS_LEGACY_READS=False):
+            self.assertEqual(saved_answers(self.student.pk, question_ids), expected)
+
+        # Merging again changes nothing.
+        merge_responses()
+        self.assertEqual(
+            {answer.question_id: answer.answer_text for answer in Answer.objects.filter(user=self.student)}, expected,
+        )
+
+
+class ResponseAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='pass')
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.exam = create_exam(cls.instructor, questions=5)
+        students = [User.objects.create_user(f'student{i}', password='pass', is_student=True) for i in range(4)]
+        for student in students:
+            for question in cls.exam.questions.all():
+                StudentResponse.objects.create(student=student, question=question, answer_text=f'پاسخ {student.username}')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelists_do_not_query_per_row(self):
+        for name, queries in (
+            ('admin:responses_studentresponse_changelist', 5),
+            ('admin:exams_exam_changelist', 5),
+            ('admin:exams_question_changelist', 5),
+        ):
+            with self.subTest(name), self.assertNumQueries(queries):
+                self.client.get(reverse(name))
 
-# Create your tests here.
+    def test_search_matches_answer_text(self):
+        response = self.client.get(reverse('admin:responses_studentresponse_changelist'), {'q': 'student2'})
+        self.assertEqual(response.context['cl'].result_count, 5)
+        response = self.client.get(reverse('admin:responses_studentresponse_changelist'), {'q': 'پاسخ'})
+        self.assertEqual(response.context['cl'].result_count, 20)
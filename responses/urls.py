@@ -5,5 +5,6 @@ app_name = 'response'
 
 urlpatterns = [
     path('take_exam/<int:exam_id>/', views.take_exam, name='take_exam'),
+    path('take_exam/<int:exam_id>/autosave/', views.autosave_view, name='autosave'),
     path('thank_you/', views.thank_you, name='thank_you'),
 ]
\ No newline at end of file
@@ -1,25 +1,36 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from exams.models import Exam
-from .models import StudentResponse
+from django.views.decorators.http import require_POST
+from exams import autosave
+from exams.cache import get_exam_payload_or_404
+from exams.submissions import collect_answers, count_queries, log_submission, prefill, saved_answers
+from exams.views import autosave_response
+from .submissions import submit_responses
 
 @login_required
 def take_exam(request, exam_id):
-    exam = get_object_or_404(Exam, id=exam_id)
-    questions = exam.questions.all()
+    exam = get_exam_payload_or_404(exam_id)
+    questions = exam['questions']
+    question_ids = [question['id'] for question in questions]
 
     if request.method == 'POST':
-        for question in questions:
-            answer_text = request.POST.get(f'answer_{question.id}')
-            if answer_text:
-                StudentResponse.objects.update_or_create(
-                    student=request.user,
-                    question=question,
-                    defaults={'answer_text': answer_text}
-                )
+        with count_queries() as queries:
+            answers = collect_answers(question_ids, request.POST)
+            submit_responses(request.user, answers)
+        autosave.mark_saved('response', request.user.pk, answers)
+        log_submission('take_exam', request.user, answers, queries)
         return redirect('response:thank_you')
+    autosave.flush_pending(request.user, question_ids, 'response')
+    answered_questions = saved_answers(request.user.pk, question_ids)
+    return render(request, 'responses/take_exam.html', {
+        'exam': exam,
+        'questions': prefill(questions, answered_questions),
+    })
 
-    return render(request, 'responses/take_exam.html', {'exam': exam, 'questions': questions})
+@login_required
+@require_POST
+def autosave_view(request, exam_id):
+    return autosave_response(request, get_exam_payload_or_404(exam_id), 'response')
 
 @login_required
 def thank_you(request):
@@ -0,0 +1,76 @@
+"""
+Maintenance of the ``SearchDocument`` table.
+
+``post_save``/``post_delete`` signals (``search.signals``) keep single
+objects in sync; the bulk writer in ``exams.submissions`` calls
+``index_answers`` with the rows it upserted, ``responses.merge`` indexes the
+answers it merges from legacy responses. The database-side full-text index follows the
+table through triggers (SQLite FTS5) or a generated column (PostgreSQL).
+Texts are normalized through ``texts.cache``, so a submitted answer is
+normalized once for grading and indexing.
+"""
+from exams.models import Answer, Question
+from responses.models import StudentResponse
+from texts.cache import normalized
+from .models import SearchDocument
+
+BATCH_SIZE = 500
+
+SOURCES = {
+    SearchDocument.ANSWER: (Answer, ('id', 'question_id', 'user_id', 'answer_text')),
+    SearchDocument.RESPONSE: (StudentResponse, ('id', 'question_id', 'student_id', 'answer_text')),
+    SearchDocument.QUESTION: (Question, ('id', 'id', 'id', 'text')),
+}
+
+
+def _upsert(kind, rows):
+    """Index ``rows`` of ``(object_id, question_id, user_id, text)``."""
+    SearchDocument.objects.bulk_create(
+        [
+            SearchDocument(kind=kind, object_id=object_id, question_id=question_id, user_id=user_id,
+                           text=normalized(text).text)
+            for object_id, question_id, user_id, text in rows
+        ],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['question', 'user', 'text'],
+    )
+
+
+def index_answers(answers):
+    """Index saved ``Answer`` instances (their primary keys must be set)."""
+    _upsert(SearchDocument.ANSWER, [(a.pk, a.question_id, a.user_id, a.answer_text) for a in answers])
+
+
+def index_responses(responses):
+    """Index saved ``StudentResponse`` instances (their primary keys must be set)."""
+    _upsert(SearchDocument.RESPONSE, [(r.pk, r.question_id, r.student_id, r.answer_text) for r in responses])
+
+
+def index_questions(questions):
+    _upsert(SearchDocument.QUESTION, [(q.pk, q.pk, None, q.text) for q in questions])
+
+
+def remove(kind, object_ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=object_ids).delete()
+
+
+def rebuild(kinds=None, chunk_size=2000):
+    """Re-index every object of ``kinds`` (default: all). Returns the number of documents."""
+    total = 0
+    for kind in kinds or SOURCES:
+        model, fields = SOURCES[kind]
+        SearchDocument.objects.filter(kind=kind).delete()
+        rows = []
+        for object_id, question_id, user_id, text in model.objects.order_by().values_list(*fields).iterator(
+            chunk_size=chunk_size,
+        ):
+            rows.append((object_id, question_id, None if kind == SearchDocument.QUESTION else user_id, text))
+            if len(rows) >= chunk_size:
+                _upsert(kind, rows)
+                total += len(rows)
+                rows = []
+        _upsert(kind, rows)
+        total += len(rows)
+    return total
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from search import index
+from search.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the answers, responses and questions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=[kind for kind, _ in SearchDocument.KINDS],
+                            help='Only rebuild documents of this kind (repeatable).')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = index.rebuild(options['kind'])
+        self.stdout.write(f'Indexed {total} documents')
@@ -0,0 +1,93 @@
+from django.db import migrations
+
+# A copy of the search normalization as of this migration, so that later
+# changes to the application code do not change what it writes.
+FOLD = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    # Diacritics (fathatan .. sukun, superscript alef), tatweel, ZWNJ and ZWJ.
+    **{chr(code): None for code in range(0x064B, 0x0653)},
+    '\u0670': None, '\u0640': None, '\u200c': None, '\u200d': None,
+})
+
+
+def normalize(text):
+    return (text or '').translate(FOLD).casefold()
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE search_fts USING fts5("
+    "text, content='search_searchdocument', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER search_fts_insert AFTER INSERT ON search_searchdocument BEGIN "
+    "INSERT INTO search_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER search_fts_delete AFTER DELETE ON search_searchdocument BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER search_fts_update AFTER UPDATE OF text ON search_searchdocument BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO search_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER search_fts_update',
+    'DROP TRIGGER search_fts_delete',
+    'DROP TRIGGER search_fts_insert',
+    'DROP TABLE search_fts',
+]
+
+POSTGRESQL_FORWARD = [
+    "ALTER TABLE search_searchdocument ADD COLUMN document tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED",
+    'CREATE INDEX search_searchdocument_document ON search_searchdocument USING GIN (document)',
+]
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX search_searchdocument_document',
+    'ALTER TABLE search_searchdocument DROP COLUMN document',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+def index_existing(apps, schema_editor):
+    SearchDocument = apps.get_model('search', 'SearchDocument')
+    sources = [
+        ('answer', apps.get_model('exams', 'Answer'), ('id', 'question_id', 'user_id', 'answer_text')),
+        ('response', apps.get_model('responses', 'StudentResponse'), ('id', 'question_id', 'student_id', 'answer_text')),
+        ('question', apps.get_model('exams', 'Question'), ('id', 'id', 'id', 'text')),
+    ]
+    for kind, model, fields in sources:
+        documents = []
+        for object_id, question_id, user_id, text in model.objects.values_list(*fields).iterator(chunk_size=2000):
+            documents.append(SearchDocument(
+                kind=kind, object_id=object_id, question_id=question_id,
+                user_id=None if kind == 'question' else user_id, text=normalize(text),
+            ))
+            if len(documents) >= 2000:
+                SearchDocument.objects.bulk_create(documents)
+                documents = []
+        SearchDocument.objects.bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('exams', '0003_indexes_unique_answer'),
+        ('responses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import models
+
+from exams.models import Question
+
+
+class SearchDocument(models.Model):
+    """
+    Normalized text of one searchable object, maintained by ``search.index``.
+    The full-text index over ``text`` is database specific and created by
+    the migrations: an FTS5 table on SQLite, a ``tsvector`` column with a
+    GIN index on PostgreSQL.
+    """
+    ANSWER = 'answer'
+    RESPONSE = 'response'
+    QUESTION = 'question'
+    KINDS = [
+        (ANSWER, 'Answer'),
+        (RESPONSE, 'Student response'),
+        (QUESTION, 'Question'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField()
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
+    text = models.TextField()
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
@@ -0,0 +1,118 @@
+"""
+Ranked full-text queries over the search index.
+
+A query is a list of words and ``"quoted phrases"``; a document matches
+when it contains every word and every phrase, after the same Persian
+normalization as the indexed text. Results are ordered by relevance (BM25
+on SQLite, ``ts_rank`` on PostgreSQL).
+"""
+import re
+from collections import namedtuple
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from texts.normalization import tokens
+from .models import SearchDocument
+
+Hit = namedtuple('Hit', 'kind object_id question_id user_id rank')
+
+_PHRASE = re.compile(r'"([^"]*)"')
+
+DEFAULT_LIMIT = 100
+
+
+def parse(query):
+    """Split ``query`` into a list of phrases, each a list of normalized words."""
+    phrases = [tokens(phrase) for phrase in _PHRASE.findall(query)]
+    phrases += [[word] for word in tokens(_PHRASE.sub(' ', query))]
+    return [phrase for phrase in phrases if phrase]
+
+
+def fts5_query(phrases):
+    # Every word is quoted, so FTS5 operators in user input are plain text.
+    return ' AND '.join('"%s"' % ' '.join(phrase) for phrase in phrases)
+
+
+def tsquery(phrases):
+    return ' & '.join('(%s)' % ' <-> '.join(phrase) for phrase in phrases)
+
+
+def search(query, kinds=None, exam_id=None, limit=DEFAULT_LIMIT, using='default'):
+    """Return up to ``limit`` ``Hit``s for ``query``, best first."""
+    phrases = parse(query)
+    if not phrases:
+        return []
+    connection = connections[using]
+    table = SearchDocument._meta.db_table
+    conditions, params = [], []
+    if kinds:
+        conditions.append('d.kind IN (%s)' % ', '.join(['%s'] * len(kinds)))
+        params += list(kinds)
+    if exam_id is not None:
+        conditions.append('d.question_id IN (SELECT id FROM exams_question WHERE exam_id = %s)')
+        params.append(exam_id)
+    where = ''.join(f' AND {condition}' for condition in conditions)
+
+    if connection.vendor == 'sqlite':
+        sql = (
+            f'SELECT d.kind, d.object_id, d.question_id, d.user_id, bm25(search_fts) AS rank '
+            f'FROM search_fts JOIN {table} d ON d.id = search_fts.rowid '
+            f'WHERE search_fts MATCH %s{where} ORDER BY rank LIMIT %s'
+        )
+        params = [fts5_query(phrases)] + params + [limit]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT d.kind, d.object_id, d.question_id, d.user_id, ts_rank(d.document, q) AS rank "
+            f"FROM {table} d, to_tsquery('simple', %s) q "
+            f"WHERE d.document @@ q{where} ORDER BY rank DESC LIMIT %s"
+        )
+        params = [tsquery(phrases)] + params + [limit]
+    else:
+        return _fallback_search(phrases, kinds, exam_id, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [Hit(*row) for row in cursor.fetchall()]
+
+
+def _fallback_search(phrases, kinds, exam_id, limit):
+    """Unranked substring match for databases without a full-text index."""
+    documents = SearchDocument.objects.all()
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    if exam_id is not None:
+        documents = documents.filter(question__exam_id=exam_id)
+    return [
+        Hit(*row, 0.0)
+        for row in _containing(documents, phrases).values_list('kind', 'object_id', 'question_id', 'user_id')[:limit]
+    ]
+
+
+def _containing(documents, phrases):
+    for phrase in phrases:
+        documents = documents.filter(text__contains=' '.join(phrase))
+    return documents
+
+
+def matching_ids(query, kind, using='default'):
+    """
+    Ids of the objects of ``kind`` matching ``query``, unranked and
+    unlimited, as a subquery for ``pk__in`` filters (the admin search).
+    """
+    phrases = parse(query)
+    documents = SearchDocument.objects.using(using).filter(kind=kind)
+    if not phrases:
+        return documents.none().values_list('object_id', flat=True)
+    vendor = connections[using].vendor
+    table = SearchDocument._meta.db_table
+    if vendor == 'sqlite':
+        documents = documents.filter(
+            id__in=RawSQL('SELECT rowid FROM search_fts WHERE search_fts MATCH %s', [fts5_query(phrases)]),
+        )
+    elif vendor == 'postgresql':
+        documents = documents.filter(
+            id__in=RawSQL(f"SELECT id FROM {table} WHERE document @@ to_tsquery('simple', %s)", [tsquery(phrases)]),
+        )
+    else:
+        documents = _containing(documents, phrases)
+    return documents.values_list('object_id', flat=True)
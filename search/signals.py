@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from exams.models import Answer, Question
+from responses.models import StudentResponse
+from . import index
+from .models import SearchDocument
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, **kwargs):
+    index.index_answers([instance])
+
+
+@receiver(post_save, sender=StudentResponse)
+def response_saved(sender, instance, **kwargs):
+    index.index_responses([instance])
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    index.index_questions([instance])
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    index.remove(SearchDocument.ANSWER, [instance.pk])
+
+
+@receiver(post_delete, sender=StudentResponse)
+def response_deleted(sender, instance, **kwargs):
+    index.remove(SearchDocument.RESPONSE, [instance.pk])
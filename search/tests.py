@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from exams.models import Answer
+from exams.submissions import save_answers
+from exams.tests import create_exam
+from . import index, query
+from .models import SearchDocument
+from .query import matching_ids, parse, search
+
+
+class QueryParseTests(TestCase):
+    def test_parse_phrases(self):
+        self.assertEqual(parse('"کتاب خوب" قلم'), [['کتاب', 'خوب'], ['قلم']])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pass', is_instructor=True)
+        cls.student = User.objects.create_user('student', password='pass', is_student=True)
+        cls.other = User.objects.create_user('other', password='pass', is_student=True)
+        cls.exam = create_exam(cls.instructor, questions=2)
+        cls.questions = list(cls.exam.questions.order_by('id'))
+        save_answers(cls.student, {
+            cls.questions[0].id: 'الگوریتم مرتب‌سازی سریع بهترین است',
+            cls.questions[1].id: 'سریع بودن مرتب سازی مهم است',
+        })
+        Answer.objects.create(user=cls.other, question=cls.questions[0], answer_text='الگوريتم جستجوی دودویی')
+
+    def setUp(self):
+        cache.clear()
+
+    def answer_ids(self, query, **kwargs):
+        return [hit.object_id for hit in search(query, kinds=[SearchDocument.ANSWER], **kwargs)]
+
+    def test_bulk_and_single_writes_are_indexed(self):
+        self.assertEqual(SearchDocument.objects.filter(kind=SearchDocument.ANSWER).count(), 3)
+        other = Answer.objects.get(user=self.other)
+        self.assertEqual(self.answer_ids('الگوریتم دودویی'), [other.id])
+
+    def test_phrase_search(self):
+        first = Answer.objects.get(user=self.student, question=self.questions[0])
+        second = Answer.objects.get(user=self.student, question=self.questions[1])
+        self.assertCountEqual(self.answer_ids('سریع است'), [first.id, second.id])
+        self.assertEqual(self.answer_ids('"مرتبسازی سریع"'), [first.id])
+        self.assertEqual(self.answer_ids('"سریع است"'), [])
+
+    def test_updates_and_deletes_follow(self):
+        answer = Answer.objects.get(user=self.other)
+        answer.answer_text = 'درخت دودویی'
+        answer.save()
+        self.assertEqual(self.answer_ids('الگوریتم', exam_id=self.exam.id), [
+            Answer.objects.get(user=self.student, question=self.questions[0]).id,
+        ])
+        answer.delete()
+        self.assertEqual(self.answer_ids('درخت'), [])
+
+    def test_rebuild(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(index.rebuild(), 3 + 2)
+        self.assertEqual(len(self.answer_ids('سریع')), 2)
+
+    def test_exam_report_search(self):
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('exams:exam_report', args=[self.exam.id]), {'q': 'دودویی'})
+        self.assertEqual([answer.user_id for answer in response.context['answers']], [self.other.id])
+
+    def test_admin_search_is_not_capped(self):
+        first = Answer.objects.get(user=self.student, question=self.questions[0])
+        second = Answer.objects.get(user=self.student, question=self.questions[1])
+        self.assertCountEqual(matching_ids('سریع', SearchDocument.ANSWER), [first.id, second.id])
+        self.assertCountEqual(matching_ids('', SearchDocument.ANSWER), [])
+
+        admin = User.objects.create_superuser('admin', password='pass')
+        self.client.force_login(admin)
+        with mock.patch.object(query, 'search', side_effect=AssertionError('ranked search is capped')):
+            response = self.client.get(reverse('admin:exams_answer_changelist'), {'q': 'سريع'})
+        self.assertCountEqual([answer.id for answer in response.context['cl'].result_list], [first.id, second.id])
@@ -0,0 +1,73 @@
+"""
+Normalized texts cached by content.
+
+Search indexing, grading and the similarity backends need the
+normalization of the same answer texts (``texts.normalization``);
+``normalized`` computes it once per distinct text and process and hands
+every consumer the same ``Normalized`` (normalized text and words). A
+submitted answer is thus normalized once for grading and indexing,
+re-grading an exam normalizes each distinct answer text once, however
+many rules read it, and an analysis normalizes identical answers once.
+
+The cache is an LRU of ``TEXTS_CACHE_SIZE`` entries keyed by a 16-byte
+BLAKE2b digest of the text, so it does not keep the original answers
+alive next to their normalizations. It is local to each process:
+normalizing is a pure function that costs microseconds, so a shared
+cache (or storing the normalizations in the database, which was measured
+and rejected with ``manage.py benchmark_normalization``) would cost more
+per lookup than it saves. The size is read from the settings on first
+use, or set with ``configure`` in processes that do not load Django's
+settings (the analysis workers, see ``analysis.parallel``).
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .normalization import normalize, words
+
+Normalized = namedtuple('Normalized', ['text', 'words'])
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_max_size = None
+
+
+def configure(max_size):
+    """Set the number of cached texts instead of reading ``TEXTS_CACHE_SIZE``."""
+    global _max_size
+    _max_size = max_size
+
+
+def max_size():
+    return settings.TEXTS_CACHE_SIZE if _max_size is None else _max_size
+
+
+def _key(text):
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def normalized(text):
+    """The ``Normalized`` form of ``text``."""
+    text = text or ''
+    key = _key(text)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            return entry
+    normalized_text = normalize(text)
+    entry = Normalized(normalized_text, tuple(words(normalized_text)))
+    with _lock:
+        # Another thread may have stored it meanwhile; keep the first one.
+        entry = _entries.setdefault(key, entry)
+        _entries.move_to_end(key)
+        while len(_entries) > max_size():
+            _entries.popitem(last=False)
+    return entry
+
+
+def clear():
+    with _lock:
+        _entries.clear()
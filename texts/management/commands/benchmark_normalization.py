@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import Answer
+from texts import cache, normalization
+
+LEGACY_TABLE = str.maketrans({char: folded or None for char, folded in normalization.FOLD.items()})
+
+
+def legacy_normalize(text):
+    """The previous implementation: ``str.translate`` over the folding table."""
+    return (text or '').translate(LEGACY_TABLE).casefold()
+
+
+class Command(BaseCommand):
+    help = 'Time text normalization, tokenization and the normalization cache on stored answers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=20000, help='Number of stored answers to use.')
+
+    def time(self, label, texts, func):
+        started = time.perf_counter()
+        for text in texts:
+            func(text)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label:28} {elapsed * 1e6 / len(texts):8.2f} us/text {elapsed:8.3f} s')
+
+    def handle(self, *args, **options):
+        texts = list(Answer.objects.order_by('-id').values_list('answer_text', flat=True)[:options['answers']])
+        if not texts:
+            raise CommandError('No answers to normalize; see manage.py generate_exam_data.')
+        mean = sum(map(len, texts)) / len(texts)
+        self.stdout.write(f'{len(texts)} answers ({len(set(texts))} distinct), {mean:.0f} characters on average')
+
+        self.time('str.translate (previous)', texts, legacy_normalize)
+        self.time('normalize', texts, normalization.normalize)
+        self.time('tokens', texts, normalization.tokens)
+        cache.clear()
+        self.time('normalized (first use)', texts, cache.normalized)
+        self.time('normalized (cached)', texts, cache.normalized)
+        cache.clear()
@@ -0,0 +1,51 @@
+from django.test import SimpleTestCase
+
+from . import cache
+from .management.commands.benchmark_normalization import legacy_normalize
+from .normalization import normalize, tokens, words
+
+
+class NormalizationTests(SimpleTestCase):
+    def test_folds_persian_variants(self):
+        self.assertEqual(normalize('مي‌روم به كتابخانه ۱۲'), normalize('میروم به کتابخانه 12'))
+        self.assertEqual(normalize('عِلْم'), 'علم')
+        self.assertEqual(normalize('Sorting'), 'sorting')
+        self.assertEqual(normalize(None), '')
+
+    def test_matches_translate_table(self):
+        text = 'الگوريتمِ مرتب‌سازيِ سريع (Quick-Sort) در O(n log n) اجرا مي‌شود؛ ۱۲٫۵ ثانيه ـــ آزمون ٣'
+        self.assertEqual(normalize(text), legacy_normalize(text))
+
+    def test_tokens(self):
+        self.assertEqual(tokens('کتاب‌ها، كتاب!'), ['کتابها', 'کتاب'])
+
+    def test_cache_shares_normalization(self):
+        cache.clear()
+        first = cache.normalized('مي‌روم')
+        self.assertIs(cache.normalized('مي‌روم'), first)
+        self.assertEqual(first.words, ('میروم',))
+
+    def test_cache_hits_equal_normalize(self):
+        cache.clear()
+        texts = ['مي‌روم به كتابخانه ۱۲', 'میروم به کتابخانه 12', 'عِلْم', '', None, 'Sorting ۴۲']
+        misses = [cache.normalized(text) for text in texts]
+        for text, miss in zip(texts, misses):
+            expected = normalize(text)
+            hit = cache.normalized(text)
+            self.assertIs(hit, miss)
+            self.assertEqual(hit, (expected, tuple(words(expected))))
+
+    def test_cache_keeps_the_most_recently_used_texts(self):
+        cache.clear()
+        self.addCleanup(cache.configure, None)
+        cache.configure(2)
+        first = cache.normalized('الف')
+        cache.normalized('ب')
+        self.assertIs(cache.normalized('الف'), first)
+        cache.normalized('پ')
+        # Reading 'الف' again made 'ب' the one to evict.
+        self.assertIs(cache.normalized('الف'), first)
+        cache.normalized('ت')
+        cache.normalized('ث')
+        self.assertIsNot(cache.normalized('الف'), first)
+        self.assertEqual(cache.normalized('الف'), first)